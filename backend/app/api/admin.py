@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from app.api.dependencies import get_admin_user
+from app.core.profiling import get_profile_store
+
+router = APIRouter()
+
+
+@router.get("/admin/profiles")
+async def list_profiles(
+    current_user: dict = Depends(get_admin_user)
+):
+    """Recent request profiles, newest first (without per-stage records)."""
+    return {"profiles": get_profile_store().list()}
+
+
+@router.get("/admin/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    current_user: dict = Depends(get_admin_user)
+):
+    """Stage timings of one profile."""
+    profile = get_profile_store().get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return profile
+
+
+@router.get("/admin/profiles/{profile_id}/folded")
+async def download_profile(
+    profile_id: str,
+    current_user: dict = Depends(get_admin_user)
+):
+    """Folded stack samples (flamegraph.pl / speedscope / inferno input)."""
+    path = get_profile_store().folded_path(profile_id)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return FileResponse(path, media_type="text/plain", filename=path.name)
@@ -1,7 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.api.dependencies import get_current_user
-from app.models.schemas import ChatQuery, ChatResponse, Citation
-from app.services.rag import rag_service
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+from app.api.dependencies import get_current_user, get_profile_flag
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.profiling import maybe_profiled
+from app.models.schemas import ChatPrefetch, ChatPrefetchResponse, ChatQuery, ChatResponse, ChatSessionResponse, Citation
+from app.services.admission import AdmissionRejected, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from app.services.deadline import MODE_FULL
+from app.services.rag import get_rag_service
+from app.services.sessions import get_session_store
+import time
 
 router = APIRouter()
 
@@ -9,33 +18,145 @@ router = APIRouter()
 @router.post("/chat/query", response_model=ChatResponse)
 async def chat_query(
     query: ChatQuery,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    profile: bool = Depends(get_profile_flag),
+    x_priority: Optional[str] = Header(None),
+    x_deadline_ms: Optional[int] = Header(None)
 ):
-    """Process a chat query using RAG."""
+    """
+    Process a chat query using RAG (stateless, or as a turn of a chat session).
+    
+    Optional headers: `X-Priority: interactive|batch` (batch/audit jobs queue
+    behind interactive chat) and `X-Deadline-Ms` (how long the client will wait,
+    also accepted as `latency_budget_ms`). When generation cannot finish in
+    time the answer is degraded instead of late: `mode` is `truncated` or
+    `extractive`. Returns 429 with Retry-After when the LLM queue is full.
+    Admins can send `X-Profile: 1` to record a profile (id in `X-Profile-Id`).
+    """
     if not query.query.strip():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Query cannot be empty"
         )
     
-    try:
-        result = rag_service.query(
-            user_query=query.query,
-            top_k=query.top_k or 5
+    priority = (x_priority or PRIORITY_INTERACTIVE).lower()
+    if priority not in (PRIORITY_INTERACTIVE, PRIORITY_BATCH):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"X-Priority must be '{PRIORITY_INTERACTIVE}' or '{PRIORITY_BATCH}'"
+        )
+    budgets = [ms for ms in (x_deadline_ms, query.latency_budget_ms) if ms is not None]
+    if any(ms <= 0 for ms in budgets):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="X-Deadline-Ms and latency_budget_ms must be positive"
         )
+    budget = min(budgets) / 1000 if budgets else settings.LLM_DEFAULT_DEADLINE_SECONDS
+    deadline = time.monotonic() + budget
+    
+    session = None
+    if query.session_id:
+        session = get_session_store().get(query.session_id, current_user["id"])
+        if session is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat session not found or expired"
+            )
+    
+    with maybe_profiled(profile, "POST /chat/query", current_user["email"]) as prof:
+        if prof:
+            response.headers["X-Profile-Id"] = prof.id
+        try:
+            if session is not None:
+                result = await run_in_threadpool(
+                    get_rag_service().query_session,
+                    session,
+                    user_query=query.query,
+                    top_k=query.top_k or 5,
+                    priority=priority,
+                    deadline=deadline
+                )
+                get_session_store().touch(session)
+            else:
+                # Runs in the threadpool so concurrent requests overlap and identical
+                # in-flight questions can be coalesced by RAGService.query.
+                result = await run_in_threadpool(
+                    get_rag_service().query,
+                    user_query=query.query,
+                    top_k=query.top_k or 5,
+                    priority=priority,
+                    deadline=deadline,
+                    user_id=current_user["id"]
+                )
         
-        # Convert citations to response model
-        citations = [
-            Citation(**citation) for citation in result["citations"]
-        ]
+            # Convert citations to response model
+            citations = [
+                Citation(**citation) for citation in result["citations"]
+            ]
+            mode = result.get("mode", MODE_FULL)
+            metrics.inc("chat_answer_mode_total", mode=mode)
+            if time.monotonic() > deadline:
+                metrics.inc("chat_deadline_missed_total")
         
-        return ChatResponse(
-            answer=result["answer"],
-            citations=citations,
-            sources_count=result["sources_count"]
-        )
-    except Exception as e:
+            return ChatResponse(
+                answer=result["answer"],
+                citations=citations,
+                sources_count=result["sources_count"],
+                session_id=result.get("session_id"),
+                mode=mode
+            )
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error processing query: {str(e)}"
+            )
+
+
+@router.post("/chat/prefetch", response_model=ChatPrefetchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def chat_prefetch(
+    query: ChatPrefetch,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Speculatively embed and retrieve for the question being typed (call it debounced).
+    
+    A /chat/query from the same user within PREFETCH_TTL_SECONDS whose text
+    (nearly) matches skips the embedding and vector search.
+    """
+    result = await run_in_threadpool(
+        get_rag_service().prefetch,
+        current_user["id"],
+        query.query,
+        query.top_k or 5
+    )
+    return ChatPrefetchResponse(status=result, ttl_seconds=settings.PREFETCH_TTL_SECONDS)
+
+
+@router.post("/chat/sessions", response_model=ChatSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_chat_session(
+    current_user: dict = Depends(get_current_user)
+):
+    """Start a multi-turn chat session; pass its id as `session_id` in /chat/query."""
+    session = get_session_store().create(current_user["id"])
+    return ChatSessionResponse(session_id=session.id)
+
+
+@router.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(
+    session_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """End a chat session and free its memory."""
+    if not get_session_store().delete(session_id, current_user["id"]):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing query: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat session not found or expired"
         )
+    return {"status": "deleted", "session_id": session_id}
@@ -0,0 +1,46 @@
+"""
+Conditional GET for endpoints whose answer only depends on the corpus.
+
+    return conditional_json(request, "documents_list", build_listing)
+
+The ETag and Last-Modified headers come from the corpus version
+(app/services/corpus.py). A matching If-None-Match (or an If-Modified-Since
+no older than the last change) gets a 304 without calling build(). Otherwise
+the JSON body serialised for the current version is reused, and build() only
+runs once per corpus change.
+"""
+import json
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable
+from fastapi import Request, Response
+from app.services.corpus import get_corpus_version
+
+
+def _not_modified(request: Request, etag: str, updated_at: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= int(updated_at)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_json(request: Request, name: str, build: Callable[[], Any]) -> Response:
+    """Serve build()'s JSON with validators, a 304, or the cached body."""
+    corpus = get_corpus_version()
+    version = corpus.current()
+    headers = {
+        "ETag": f'"{name}-{version}"',
+        "Last-Modified": formatdate(corpus.updated_at, usegmt=True),
+        "Cache-Control": "private, no-cache",  # Always revalidate; 304s are cheap
+    }
+    if _not_modified(request, headers["ETag"], corpus.updated_at):
+        return Response(status_code=304, headers=headers)
+
+    body = corpus.cached(name, version, lambda: json.dumps(build()).encode())
+    return Response(content=body, media_type="application/json", headers=headers)
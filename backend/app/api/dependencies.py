@@ -1,5 +1,6 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from app.core.config import settings
 from app.core.security import decode_access_token
 
 security = HTTPBearer()
@@ -32,3 +33,30 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         "email": email,
         "username": username
     }
+
+
+def is_admin(user: dict) -> bool:
+    return user["email"].lower() in {email.lower() for email in settings.ADMIN_EMAILS}
+
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
+    """Current user, who must be listed in ADMIN_EMAILS."""
+    if not is_admin(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required",
+        )
+    return current_user
+
+
+async def get_profile_flag(request: Request, current_user: dict = Depends(get_current_user)) -> bool:
+    """True if the request asks to be profiled (`X-Profile: 1` or `?profile=1`); admins only."""
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    if not flag or flag.lower() in ("0", "false", "no", "off"):
+        return False
+    if not is_admin(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Profiling is restricted to administrators",
+        )
+    return True
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
-from typing import List
-from app.api.dependencies import get_current_user
-from app.services.rag import rag_service
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request, Response, status
+from typing import List, Optional
+from app.api.conditional import conditional_json
+from app.api.dependencies import get_admin_user, get_current_user, get_profile_flag
+from app.core.profiling import maybe_profiled
+from app.models.schemas import ReindexRequest
+from app.services.rag import get_rag_service
 from app.core.config import settings
 from pathlib import Path
 import os
@@ -11,10 +14,12 @@ router = APIRouter()
 
 @router.post("/documents/upload")
 async def upload_document(
+    response: Response,
     file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    profile: bool = Depends(get_profile_flag)
 ):
-    """Upload and process a document (PDF or Excel)."""
+    """Upload and process a document (PDF or Excel); admins can profile it with `X-Profile: 1`."""
     # Validate file extension
     file_ext = Path(file.filename).suffix.lower()
     if file_ext not in settings.ALLOWED_EXTENSIONS:
@@ -41,17 +46,22 @@ async def upload_document(
     
     try:
         # Save file
-        from app.services.documents import document_service
-        file_path = document_service.save_file(file_content, file.filename)
+        from app.services.documents import get_document_service
+        file_path = get_document_service().save_file(file_content, file.filename)
         
         # Ingest into vector database
-        result = rag_service.ingest_document(file_path)
+        with maybe_profiled(profile, f"POST /documents/upload {file.filename}", current_user["email"]) as prof:
+            if prof:
+                response.headers["X-Profile-Id"] = prof.id
+            result = get_rag_service().ingest_document(file_path)
         
         return {
             "status": "success",
             "message": "Document uploaded and processed successfully",
             "filename": file.filename,
-            "chunks_processed": result["chunks_ingested"]
+            "chunks_processed": result["chunks_ingested"],
+            "chunks_deduplicated": result["chunks_deduplicated"],
+            "dedup_ratio": result["dedup_ratio"]
         }
     except Exception as e:
         raise HTTPException(
@@ -60,42 +70,54 @@ async def upload_document(
         )
 
 
+def _document_listing() -> dict:
+    documents = []
+    
+    # Get files from uploads folder
+    upload_dir = Path(settings.UPLOAD_DIR)
+    if upload_dir.exists():
+        for file_path in upload_dir.iterdir():
+            if file_path.is_file() and file_path.suffix.lower() in settings.ALLOWED_EXTENSIONS:
+                stat = file_path.stat()
+                documents.append({
+                    "filename": file_path.name,
+                    "size": stat.st_size,
+                    "uploaded_at": stat.st_mtime,
+                    "source": "uploaded"
+                })
+    
+    # Get files from existing documents folder
+    existing_docs_dir = Path(settings.EXISTING_DOCS_DIR)
+    if existing_docs_dir.exists():
+        for file_path in existing_docs_dir.iterdir():
+            if file_path.is_file() and file_path.suffix.lower() in settings.ALLOWED_EXTENSIONS:
+                stat = file_path.stat()
+                documents.append({
+                    "filename": file_path.name,
+                    "size": stat.st_size,
+                    "uploaded_at": stat.st_mtime,
+                    "source": "existing"
+                })
+    
+    return {
+        "documents": documents,
+        "total": len(documents)
+    }
+
+
 @router.get("/documents/list")
 async def list_documents(
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """List all documents (both uploaded and existing)."""
+    """
+    List all documents (both uploaded and existing).
+    
+    Supports conditional GET: send the last ETag in If-None-Match and an
+    unchanged corpus answers 304 without rescanning the folders.
+    """
     try:
-        documents = []
-        
-        # Get files from uploads folder
-        upload_dir = Path(settings.UPLOAD_DIR)
-        if upload_dir.exists():
-            for file_path in upload_dir.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in settings.ALLOWED_EXTENSIONS:
-                    documents.append({
-                        "filename": file_path.name,
-                        "size": file_path.stat().st_size,
-                        "uploaded_at": file_path.stat().st_mtime,
-                        "source": "uploaded"
-                    })
-        
-        # Get files from existing documents folder
-        existing_docs_dir = Path(settings.EXISTING_DOCS_DIR)
-        if existing_docs_dir.exists():
-            for file_path in existing_docs_dir.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in settings.ALLOWED_EXTENSIONS:
-                    documents.append({
-                        "filename": file_path.name,
-                        "size": file_path.stat().st_size,
-                        "uploaded_at": file_path.stat().st_mtime,
-                        "source": "existing"
-                    })
-        
-        return {
-            "documents": documents,
-            "total": len(documents)
-        }
+        return conditional_json(request, "documents-list", _document_listing)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -103,17 +125,94 @@ async def list_documents(
         )
 
 
+@router.get("/documents/tables")
+async def list_tables(
+    source: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Excel sheets stored as typed tables, with per-column statistics."""
+    from app.services.tables import get_table_store
+    tables = get_table_store()
+    if tables is None:
+        return {"enabled": False, "sheets": []}
+    return {"enabled": True, "sheets": tables.stats(source)}
+
+
+@router.post("/documents/reindex", status_code=status.HTTP_202_ACCEPTED)
+async def start_reindex(
+    request: Optional[ReindexRequest] = None,
+    current_user: dict = Depends(get_admin_user)
+):
+    """
+    Rebuild the index in the background with the current chunking settings
+    and the given (or configured) embedding model, then swap to it.
+    
+    The live collection keeps answering meanwhile; poll GET /documents/reindex.
+    Admins only (ADMIN_EMAILS).
+    """
+    from app.services.reindex import get_reindex_manager
+    try:
+        job = get_reindex_manager().start(request.embedding_model if request else None)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    return job.to_dict()
+
+
+@router.get("/documents/reindex")
+async def get_reindex_status(
+    current_user: dict = Depends(get_current_user)
+):
+    """Progress and throttling of the current (or last) re-index job."""
+    from app.core.database import get_active_index
+    from app.services.reindex import get_reindex_manager
+    job = get_reindex_manager().job
+    return {
+        "active_index": get_active_index(),
+        "job": job.to_dict() if job else None
+    }
+
+
+@router.post("/documents/reindex/cancel")
+async def cancel_reindex(
+    current_user: dict = Depends(get_admin_user)
+):
+    """Stop a running re-index; the live collection is left untouched (admins only)."""
+    from app.services.reindex import get_reindex_manager
+    job = get_reindex_manager().cancel()
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No re-index job"
+        )
+    return job.to_dict()
+
+
 @router.post("/documents/reload")
 async def reload_documents(
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    workers: Optional[int] = Query(None, ge=0, description="Embedding processes; default BULK_INGEST_WORKERS"),
+    current_user: dict = Depends(get_current_user),
+    profile: bool = Depends(get_profile_flag)
 ):
     """Manually reload existing documents from the documents folder."""
+    if workers and workers > (os.cpu_count() or 1):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"workers must be at most {os.cpu_count() or 1} (CPU cores)"
+        )
     try:
         from app.services.startup import load_existing_documents
-        load_existing_documents()
+        with maybe_profiled(profile, "POST /documents/reload", current_user["email"]) as prof:
+            if prof:
+                response.headers["X-Profile-Id"] = prof.id
+            summary = load_existing_documents(workers)
         return {
             "status": "success",
-            "message": "Documents reloaded successfully"
+            "message": "Documents reloaded successfully",
+            "ingestion": summary
         }
     except Exception as e:
         raise HTTPException(
@@ -122,30 +221,73 @@ async def reload_documents(
         )
 
 
+def _document_status() -> dict:
+    from app.core.database import get_vector_store
+    collection = get_vector_store()
+    count = collection.count()
+    
+    # Get list of ingested files
+    results = collection.get(include=["metadatas"])
+    ingested_files = set()
+    if results and "metadatas" in results:
+        for metadata in results["metadatas"]:
+            if "source" in metadata:
+                ingested_files.add(metadata["source"])
+    
+    from app.core.database import get_active_index
+    from app.services.dedup import get_dedup_index
+    dedup = get_dedup_index()
+    deduplicated = 0
+    if dedup:
+        per_source = dedup.stats(get_active_index()["collection"])
+        deduplicated = sum(s["duplicates"] for s in per_source)
+        ingested_files |= {s["source"] for s in per_source if s["duplicates"]}
+    
+    return {
+        "total_chunks": count,
+        "deduplicated_chunks": deduplicated,
+        "ingested_files": list(ingested_files),
+        "files_count": len(ingested_files),
+        "has_documents": count > 0
+    }
+
+
+def _dedup_report() -> dict:
+    from app.core.database import get_active_index
+    from app.services.dedup import get_dedup_index
+    dedup = get_dedup_index()
+    if dedup is None:
+        return {"enabled": False, "sources": []}
+    sources = dedup.stats(get_active_index()["collection"])
+    stored = sum(s["stored"] for s in sources)
+    duplicates = sum(s["duplicates"] for s in sources)
+    return {
+        "enabled": True,
+        "threshold": settings.DEDUP_THRESHOLD,
+        "chunks_stored": stored,
+        "chunks_deduplicated": duplicates,
+        "dedup_ratio": round(duplicates / (stored + duplicates), 4) if stored + duplicates else 0.0,
+        "sources": sources
+    }
+
+
+@router.get("/documents/dedup")
+async def get_dedup_report(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Near-duplicate chunks per file: stored vs. kept as references (conditional GET)."""
+    return conditional_json(request, "documents-dedup", _dedup_report)
+
+
 @router.get("/documents/status")
 async def get_document_status(
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get status of documents in the vector database."""
+    """Get status of documents in the vector database (conditional GET, see /documents/list)."""
     try:
-        from app.core.database import get_collection
-        collection = get_collection()
-        count = collection.count()
-        
-        # Get list of ingested files
-        results = collection.get()
-        ingested_files = set()
-        if results and "metadatas" in results:
-            for metadata in results["metadatas"]:
-                if "source" in metadata:
-                    ingested_files.add(metadata["source"])
-        
-        return {
-            "total_chunks": count,
-            "ingested_files": list(ingested_files),
-            "files_count": len(ingested_files),
-            "has_documents": count > 0
-        }
+        return conditional_json(request, "documents-status", _document_status)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
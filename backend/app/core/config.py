@@ -11,21 +11,113 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "sahakari-bot-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24 hours
+    ADMIN_EMAILS: List[str] = []  # Users allowed to profile requests and use /admin endpoints
+    
+    # Request profiling (X-Profile: 1, admins only; see app/core/profiling.py)
+    PROFILE_DIR: str = "./profiles"  # Folded stacks + stage timings of profiled requests
+    PROFILE_KEEP: int = 50  # Older profiles are deleted
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5.0  # Stack sampling period while a profile runs
+    PROFILE_MAX_SECONDS: float = 300.0  # Sampling stops after this (long ingestion jobs)
+    EVENT_LOOP_LAG_INTERVAL_MS: float = 100.0  # Event-loop lag probe period (see app/core/loop_lag.py); 0 disables
+    EVENT_LOOP_STALL_MS: float = 100.0  # Lag counted in event_loop_stalls_total
     
     # Ollama (Local LLM)
     OLLAMA_MODEL: Optional[str] = None  # None = auto-detect, or specify: "llama3", "mistral", "llama2", etc.
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OLLAMA_KEEP_ALIVE: str = "30m"  # How long Ollama keeps the model loaded after a request we send
+    
+    # Warm-up (model loading in the background after bind, see GET /ready)
+    WARMUP_ON_STARTUP: bool = True  # Load the embedding model and the Ollama model before the first chat
+    WARMUP_TIMEOUT_SECONDS: float = 300.0  # A cold Ollama load of a large model can take minutes
+    WARMUP_REFRESH_INTERVAL_SECONDS: int = 240  # Re-ping Ollama this often (below its 5 min default keep-alive)
+    WARMUP_REFRESH_HOURS: Optional[str] = "08:00-20:00"  # Local hours to keep the model pinned; None = always
+    
+    # LLM admission control
+    LLM_MAX_CONCURRENCY: int = 1  # Generations Ollama runs at once
+    LLM_MAX_QUEUE: int = 32  # Requests allowed to wait for a slot; more get HTTP 429
+    LLM_DEFAULT_DEADLINE_SECONDS: float = 120.0  # Used when the client sends no X-Deadline-Ms
+    LLM_INITIAL_GENERATION_SECONDS: float = 20.0  # Starting estimate for queue-wait predictions
+    
+    # Deadline-aware answers (see app/services/deadline.py)
+    DEADLINE_MIN_GENERATION_SECONDS: float = 3.0  # Below this (after the expected queue wait) answer extractively
+    DEADLINE_SAFETY_MS: int = 250  # Reserved at the end of the budget to build and send the response
+    DEADLINE_EXTRACTIVE_SENTENCES: int = 3  # Context sentences in an extractive answer
+    
+    # Chat sessions (multi-turn, in memory)
+    CHAT_SESSION_MAX_TURNS: int = 6  # Turns kept verbatim; older ones are summarised
+    CHAT_SESSION_SUMMARY_CHARS: int = 1500  # Max length of the summary of older turns
+    CHAT_SESSION_TOPIC_SIMILARITY: float = 0.6  # Cosine above which a follow-up reuses the last retrieval
+    CHAT_SESSION_MAX_CONTEXT_TOKENS: int = 3072  # Drop Ollama's KV context beyond this and rebuild from history
+    CHAT_SESSION_MEMORY_MB: int = 64  # Memory budget for all sessions (LRU eviction)
+    CHAT_SESSION_IDLE_SECONDS: int = 1800  # Idle sessions are evicted after this
+    
+    # Speculative retrieval while typing (POST /chat/prefetch, see app/services/prefetch.py)
+    PREFETCH_ENABLED: bool = True
+    PREFETCH_TTL_SECONDS: float = 30.0  # How long a prefetched retrieval can serve the real question
+    PREFETCH_MAX_PER_USER: int = 3  # Latest prefetches kept per user
+    PREFETCH_MAX_USERS: int = 1000  # Users with prefetches (least recently active dropped first)
+    PREFETCH_MATCH_RATIO: float = 0.9  # Text similarity (difflib) a question needs to reuse a prefetch
+    PREFETCH_MIN_CHARS: int = 12  # Shorter partial questions are not prefetched
+    PREFETCH_MAX_CONCURRENT: int = 2  # Prefetches computed at once; more are skipped
     
     # Embeddings (Sentence Transformers)
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"  # Free, local embeddings
     
+    # Bulk ingestion (see app/services/bulk_ingest.py)
+    BULK_INGEST_WORKERS: int = 0  # Embedding processes used by load_existing_documents; 0/1 = one file at a time
+    BULK_INGEST_BATCH_SIZE: int = 64  # Chunks per batch sent to an embedding process
+    BULK_INGEST_THREADS_PER_WORKER: int = 0  # Torch threads per embedding process; 0 = cores / workers
+    
+    # Chunking (structure-aware, see app/services/chunking.py)
+    CHUNK_SIZE: int = 1000  # Max characters per chunk
+    CHUNK_OVERLAP: int = 0  # Characters repeated when a long section is split
+    
     # ChromaDB
     CHROMA_DIR: str = "./chroma_db"
     COLLECTION_NAME: str = "sahakari_docs"
     
+    # Vector store backend (see app/core/database.py)
+    VECTOR_BACKEND: str = "chroma"  # "chroma" (HNSW in SQLite) or "numpy" (exact search, memory-mapped)
+    VECTOR_STORE_DIR: str = "./vector_store"  # Data folder of the numpy backend
+    VECTOR_COMPACT_RATIO: float = 0.25  # numpy backend: compact when this share of rows is deleted
+    
+    ACTIVE_INDEX_FILE: str = "./active_index.json"  # Live collection + its embedding model (written by re-index)
+    
+    # Online re-index (POST /documents/reindex)
+    REINDEX_BATCH_SIZE: int = 32  # Chunks per embedding batch when latency is within budget
+    REINDEX_MIN_BATCH_SIZE: int = 4  # Smallest batch while throttled
+    REINDEX_LATENCY_BUDGET_MS: float = 250.0  # Live retrieval p95 above this makes the job back off
+    REINDEX_DROP_DELAY_SECONDS: int = 300  # Keep the replaced collection this long for in-flight queries
+    
+    # Shared vector service (sidecar owning the embedding model + ChromaDB)
+    VECTOR_SERVICE_URL: Optional[str] = None  # e.g. "http://127.0.0.1:8765"; None = in-process
+    VECTOR_SERVICE_HOST: str = "127.0.0.1"  # Sidecar bind address (python -m app.sidecar)
+    VECTOR_SERVICE_PORT: int = 8765
+    VECTOR_SERVICE_TIMEOUT: float = 60.0  # Seconds per request from API workers
+    EMBED_BATCH_MAX_SIZE: int = 64  # Max texts per model.encode call in the sidecar
+    EMBED_BATCH_WAIT_MS: int = 5  # How long the sidecar waits to fill a batch
+    
     # File Upload
     UPLOAD_DIR: str = "./uploads"
     EXISTING_DOCS_DIR: str = "./data/documents"  # Folder for existing PDF/Excel files
+    LOAD_DOCUMENTS_ON_STARTUP: bool = True  # Ingest new files from EXISTING_DOCS_DIR in the background
+    SNAPSHOT_DIR: Optional[str] = "./data/snapshot"  # Prebuilt index loaded before ingesting (python -m scripts.build_snapshot)
+    EXTRACTION_CACHE_DIR: Optional[str] = "./extraction_cache"  # Cached per-page extraction output; None disables
+    EXTRACTION_CACHE_MAX_MB: int = 512  # Least recently used entries are evicted beyond this
+    TABLE_DB_PATH: Optional[str] = "./tables.db"  # Typed Excel sheets in SQLite (see app/services/tables.py); None disables
+    TABLE_MAX_CATEGORY_VALUES: int = 500  # Text columns with at most this many distinct values can be used as filters
+    TABLE_QUERY_ENABLED: bool = True  # Answer aggregate/lookup questions over Excel tables without the LLM
+    TABLE_QUERY_MIN_SCORE: float = 0.5  # Share of a column name's words the question must contain
+    TABLE_LOOKUP_MAX_ROWS: int = 5  # Lookups matching more rows fall back to the LLM
+    TABLE_RETRIEVAL_MARGIN: float = 0.2  # The sheet's best chunk must score within this of the top retrieved relevance
+    DEDUP_DB_PATH: Optional[str] = "dedup.db"  # MinHash/LSH index of near-duplicate chunks (see app/services/dedup.py), relative to CHROMA_DIR / VECTOR_STORE_DIR; None disables
+    DEDUP_THRESHOLD: float = 0.9  # Estimated Jaccard similarity of word shingles above which a chunk is a duplicate
+    DEDUP_NUM_PERM: int = 64  # MinHash permutations per signature
+    DEDUP_BANDS: int = 16  # LSH bands (DEDUP_NUM_PERM must be a multiple)
+    DEDUP_SHINGLE_WORDS: int = 5  # Words per shingle
+    DEDUP_MAX_REF_CITATIONS: int = 2  # Duplicates cited next to each retrieved chunk
+    CORPUS_VERSION_FILE: str = "./corpus_version.json"  # Persisted corpus version (ETags, cache keys)
+    CORPUS_CHECK_INTERVAL_SECONDS: float = 1.0  # How often folder mtimes are checked for changes
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: List[str] = [".pdf", ".xlsx", ".xls"]
     
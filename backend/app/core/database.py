@@ -1,18 +1,190 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
+"""
+Vector store access.
+
+Everything that stores or searches chunks goes through the VectorStore
+interface, which keeps Chroma's call and result shapes (add/query/get/delete/
+count returning the same dicts) so the backends are interchangeable:
+
+  * "chroma" - ChromaDB PersistentClient (HNSW index in SQLite), the default;
+  * "numpy"  - exact search over a memory-mapped float32 matrix
+               (app/core/numpy_store.py), faster for corpora of this size.
+
+VECTOR_BACKEND selects the backend; with VECTOR_SERVICE_URL set the store is
+the shared sidecar's (see app/sidecar.py) whatever the backend.
+
+Which collection is live, and which embedding model its vectors come from, is
+recorded in ACTIVE_INDEX_FILE. The online re-index (app/services/reindex.py)
+builds a new collection and switches to it by replacing that file; without
+it, COLLECTION_NAME and EMBEDDING_MODEL are used.
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+import shutil
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
 from app.core.config import settings
 
-# Initialize ChromaDB client
-chroma_client = chromadb.PersistentClient(
-    path=settings.CHROMA_DIR,
-    settings=ChromaSettings(anonymized_telemetry=False)
-)
+VECTOR_BACKENDS = ("chroma", "numpy")
+
+
+class VectorStore(ABC):
+    """
+    Interface of a vector collection (a backend missing a method cannot be created).
+
+    Results use Chroma's layout: query() returns {"ids", "documents",
+    "metadatas", "distances"} with one inner list per query embedding and
+    squared L2 distances; get() returns flat lists. `where` filters are
+    equality dicts on metadata ({"source": "x.pdf"}, optionally {"$eq": ...}
+    or {"$in": [...]}).
+    """
+
+    @abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict],
+            embeddings: Optional[List[List[float]]] = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              where: Optional[Dict] = None) -> Dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None) -> Dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        raise NotImplementedError
+
+
+@lru_cache()
+def get_chroma_client():
+    """Create the ChromaDB client on first use (chromadb is imported lazily)."""
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+
+    return chromadb.PersistentClient(
+        path=settings.CHROMA_DIR,
+        settings=ChromaSettings(anonymized_telemetry=False)
+    )
+
+
+class ChromaVectorStore(VectorStore):
+    """VectorStore backed by a ChromaDB collection."""
+
+    def __init__(self, name: str, client=None):
+        chroma_client = client or get_chroma_client()
+        try:
+            self._collection = chroma_client.get_collection(name=name)
+        except:
+            self._collection = chroma_client.create_collection(name=name)
+
+    def count(self) -> int:
+        return self._collection.count()
 
+    def add(self, ids, documents, metadatas, embeddings=None):
+        self._collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
 
-def get_collection():
-    """Get or create the ChromaDB collection."""
+    def query(self, query_embeddings, n_results=10, where=None):
+        kwargs = {"query_embeddings": query_embeddings, "n_results": n_results}
+        if where:
+            kwargs["where"] = where
+        return self._collection.query(**kwargs)
+
+    def get(self, ids=None, where=None, include=None):
+        kwargs = {k: v for k, v in {"ids": ids, "where": where, "include": include}.items() if v is not None}
+        return self._collection.get(**kwargs)
+
+    def delete(self, ids=None, where=None):
+        self._collection.delete(ids=ids, where=where)
+
+
+_active_index_lock = threading.Lock()
+_active_index: Dict = {}
+_active_index_mtime: Optional[float] = None
+
+
+def get_active_index() -> Dict:
+    """
+    The live index: {"collection", "embedding_model", "version", ...}.
+
+    Re-read when ACTIVE_INDEX_FILE changes, so every worker follows a swap.
+    """
+    global _active_index, _active_index_mtime
     try:
-        collection = chroma_client.get_collection(name=settings.COLLECTION_NAME)
-    except:
-        collection = chroma_client.create_collection(name=settings.COLLECTION_NAME)
-    return collection
+        mtime = os.stat(settings.ACTIVE_INDEX_FILE).st_mtime
+    except OSError:
+        mtime = None
+    if mtime != _active_index_mtime:
+        with _active_index_lock:
+            index = {}
+            if mtime is not None:
+                try:
+                    index = json.loads(Path(settings.ACTIVE_INDEX_FILE).read_text())
+                except (OSError, ValueError):
+                    index = _active_index  # Keep the last good one
+            _active_index, _active_index_mtime = index, mtime
+    return {
+        "collection": settings.COLLECTION_NAME,
+        "embedding_model": settings.EMBEDDING_MODEL,
+        "version": 0,
+        **_active_index,
+    }
+
+
+def set_active_index(index: Dict):
+    """Atomically make another collection the live one."""
+    path = Path(settings.ACTIVE_INDEX_FILE)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(index, indent=2))
+    os.replace(tmp, path)
+
+
+_stores: Dict[str, VectorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(name: Optional[str] = None) -> VectorStore:
+    """Return the process-wide store for a collection (default: the live one)."""
+    name = name or get_active_index()["collection"]
+    store = _stores.get(name)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(name)
+            if store is None:
+                store = _stores[name] = _open_vector_store(name)
+    return store
+
+
+def drop_vector_store(name: str):
+    """Delete a collection and its data (used to retire a replaced index)."""
+    with _stores_lock:
+        _stores.pop(name, None)
+    if settings.VECTOR_BACKEND == "numpy":
+        shutil.rmtree(Path(settings.VECTOR_STORE_DIR) / name, ignore_errors=True)
+    else:
+        try:
+            get_chroma_client().delete_collection(name=name)
+        except ValueError:
+            pass  # Already gone
+
+
+def _open_vector_store(name: str) -> VectorStore:
+    if settings.VECTOR_SERVICE_URL:
+        from app.services.vector_client import RemoteCollection
+        return RemoteCollection()
+
+    if settings.VECTOR_BACKEND == "numpy":
+        from app.core.numpy_store import NumpyVectorStore
+        return NumpyVectorStore(f"{settings.VECTOR_STORE_DIR}/{name}")
+    if settings.VECTOR_BACKEND != "chroma":
+        raise ValueError(f"Unknown VECTOR_BACKEND '{settings.VECTOR_BACKEND}' (expected one of {VECTOR_BACKENDS})")
+    return ChromaVectorStore(name)
@@ -0,0 +1,62 @@
+"""
+Event-loop lag of the API process, exposed on /metrics.
+
+A task asks to sleep EVENT_LOOP_LAG_INTERVAL_MS at a time; how much later
+than that it wakes up is how long the loop was blocked (sync work inside an
+async endpoint, a thread holding the GIL). Gauges and counters:
+
+    event_loop_lag_ms         worst lag of the last second
+    event_loop_lag_max_ms     worst lag since startup
+    event_loop_stalls_total   wake-ups later than EVENT_LOOP_STALL_MS
+"""
+import asyncio
+import logging
+from typing import Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopLagMonitor:
+    """Measures how late the event loop runs a periodic sleep."""
+
+    def __init__(self, interval_ms: float, stall_ms: float):
+        self.interval = interval_ms / 1000
+        self.stall_ms = stall_ms
+        self.max_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="event-loop-lag")
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        window_started, window_max = loop.time(), 0.0
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            lag = max(0.0, (now - expected) * 1000)
+            window_max = max(window_max, lag)
+            if lag >= self.stall_ms:
+                metrics.inc("event_loop_stalls_total")
+                logger.debug(f"Event loop blocked for {lag:.0f}ms")
+            if now - window_started >= 1.0:
+                self.max_ms = max(self.max_ms, window_max)
+                metrics.set("event_loop_lag_ms", round(window_max, 1))
+                metrics.set("event_loop_lag_max_ms", round(self.max_ms, 1))
+                window_started, window_max = now, 0.0
+
+
+def start_loop_lag_monitor() -> Optional[EventLoopLagMonitor]:
+    """Start the monitor on the running loop (None if EVENT_LOOP_LAG_INTERVAL_MS is 0)."""
+    if settings.EVENT_LOOP_LAG_INTERVAL_MS <= 0:
+        return None
+    monitor = EventLoopLagMonitor(settings.EVENT_LOOP_LAG_INTERVAL_MS, settings.EVENT_LOOP_STALL_MS)
+    monitor.start()
+    return monitor
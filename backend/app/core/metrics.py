@@ -0,0 +1,78 @@
+"""
+Minimal in-process metrics (counters and gauges), exposed as JSON on /metrics.
+
+    from app.core.metrics import metrics
+    metrics.inc("chat_turns_total", mode="session")
+    metrics.set("chat_sessions_active", 12)
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+
+def _key(name: str, labels: Dict[str, object]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+class Metrics:
+    """Thread-safe counters and gauges keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increase a counter."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def set(self, name: str, value: float, **labels):
+        """Set a gauge to the current value."""
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def get(self, name: str, **labels) -> float:
+        """Current value of a counter or gauge (0 if never recorded)."""
+        key = _key(name, labels)
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges)}
+
+
+class LatencyWindow:
+    """Latency samples (ms) of the last `seconds`, for live percentile checks."""
+
+    def __init__(self, seconds: float = 30.0, max_samples: int = 2048):
+        self.seconds = seconds
+        self._samples = deque(maxlen=max_samples)  # (monotonic time, ms)
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float):
+        with self._lock:
+            self._samples.append((time.monotonic(), ms))
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-th percentile of recent samples, or None if there are none."""
+        cutoff = time.monotonic() - self.seconds
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            values = sorted(ms for _, ms in self._samples)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+metrics = Metrics()
+# Embedding + vector search time of live queries; background jobs throttle on it.
+retrieval_latency = LatencyWindow()
@@ -0,0 +1,379 @@
+"""
+In-process exact-search vector store on a memory-mapped NumPy matrix.
+
+For a corpus of tens of thousands of chunks a brute-force scan is one
+(n x d) @ (d,) product - about a millisecond - with none of the SQLite, HNSW
+persistence and serialisation work Chroma does on every call, and results are
+exact instead of approximate.
+
+On-disk layout of a collection directory (everything for generation <g>):
+
+    meta.json           {"dimension", "generation"} - replaced atomically
+    vectors.<g>.f32     raw float32 rows, append-only, memory-mapped for search
+    records.<g>.jsonl   one {"id", "document", "metadata"} line per row
+    tombstones.<g>.txt  row numbers deleted since the generation was written
+
+Adds append to the vector and record files; deletes only write a tombstone.
+When tombstones exceed VECTOR_COMPACT_RATIO of the rows, a background thread
+writes the live rows to generation g+1 and switches meta.json to it, so
+searches and writes are never blocked for the duration of the rewrite.
+
+The row index lives in the memory of the process that opened the store, and
+adds append to shared files. A second process writing the same directory
+would corrupt it. So a collection directory is locked (fcntl.flock on
+.lock) by the first process that opens it, and any other process fails to
+open it. Several uvicorn workers must share the store through the sidecar
+(VECTOR_SERVICE_URL, see app/sidecar.py).
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single-process use is not enforced
+    fcntl = None
+from app.core.config import settings
+from app.core.database import VectorStore
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_COMPACT_MIN_TOMBSTONES = 256  # Don't bother rewriting tiny collections
+_held_locks: Dict[str, object] = {}  # collection directory -> open .lock file, held until exit
+_held_locks_lock = threading.Lock()
+
+
+def _lock_directory(path: Path):
+    """Hold an exclusive lock on a collection directory for the life of this process."""
+    if fcntl is None:
+        return
+    lock_path = path / ".lock"
+    key = str(path.resolve())
+    with _held_locks_lock:
+        held = _held_locks.get(key)
+        if held is not None and lock_path.exists() and os.fstat(held.fileno()).st_ino == lock_path.stat().st_ino:
+            return  # Already ours (the store was reopened in this process)
+        f = open(lock_path, "a+")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.seek(0)
+            owner = f.read().strip() or "?"
+            f.close()
+            raise RuntimeError(
+                f"Vector store {path} is already open in process {owner}. The numpy backend is "
+                "single-process: run several workers through the shared vector service (VECTOR_SERVICE_URL)"
+            )
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        if held is not None:
+            held.close()
+        _held_locks[key] = f
+
+
+def _matches(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Evaluate the subset of Chroma's `where` syntax the app uses."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class NumpyVectorStore(VectorStore):
+    """Flat (exact) index over an append-only memory-mapped float32 matrix."""
+
+    def __init__(self, path: str, compact_ratio: Optional[float] = None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        _lock_directory(self.path)
+        self.compact_ratio = settings.VECTOR_COMPACT_RATIO if compact_ratio is None else compact_ratio
+        self._lock = threading.RLock()
+        self._compacting = False
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def _file(self, kind: str, generation: Optional[int] = None) -> Path:
+        generation = self._generation if generation is None else generation
+        suffix = {"vectors": "f32", "records": "jsonl", "tombstones": "txt"}[kind]
+        return self.path / f"{kind}.{generation}.{suffix}"
+
+    def _write_meta(self, dimension: Optional[int], generation: int):
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps({"dimension": dimension, "generation": generation}))
+        os.replace(tmp, self.path / "meta.json")
+
+    def _load(self):
+        meta_path = self.path / "meta.json"
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+        self._dimension: Optional[int] = meta.get("dimension")
+        self._generation: int = meta.get("generation", 0)
+
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+        records = self._file("records")
+        if records.exists():
+            with open(records, encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # Torn write from a crash; dropped below
+                    record = json.loads(line)
+                    self._ids.append(record["id"])
+                    self._documents.append(record["document"])
+                    self._metadatas.append(record["metadata"])
+
+        vectors = self._file("vectors")
+        rows = vectors.stat().st_size // (4 * self._dimension) if self._dimension and vectors.exists() else 0
+        n = min(rows, len(self._ids))
+        if n != rows or n != len(self._ids):
+            # A crash between the two appends of add(): keep the common prefix.
+            logger.warning(f"Vector store {self.path}: truncating to {n} consistent rows")
+            self._truncate_files(n)
+            del self._ids[n:], self._documents[n:], self._metadatas[n:]
+
+        self._n = n
+        self._map(n)
+        self._norms = np.einsum("ij,ij->i", self._matrix, self._matrix) if n else np.zeros(0, np.float32)
+        self._alive = np.ones(n, dtype=bool)
+        tombstones = self._file("tombstones")
+        if tombstones.exists():
+            rows = [int(line) for line in tombstones.read_text().split() if int(line) < n]
+            self._alive[rows] = False
+        self._live = int(self._alive.sum())
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(self._ids) if self._alive[row]}
+
+    def _truncate_files(self, n: int):
+        vectors = self._file("vectors")
+        if vectors.exists():
+            with open(vectors, "r+b") as f:
+                f.truncate(n * 4 * (self._dimension or 0))
+        records = self._file("records")
+        if records.exists():
+            with open(records, "w", encoding="utf-8") as f:
+                for row in range(n):
+                    f.write(self._record_line(row))
+
+    def _record_line(self, row: int) -> str:
+        record = {"id": self._ids[row], "document": self._documents[row], "metadata": self._metadatas[row]}
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    def _map(self, n: int):
+        """(Re)map the vector file; called after every append."""
+        if n == 0:
+            self._matrix = np.zeros((0, self._dimension or 0), dtype=np.float32)
+        else:
+            self._matrix = np.memmap(self._file("vectors"), dtype=np.float32, mode="r", shape=(n, self._dimension))
+
+    # ------------------------------------------------------------------
+    # VectorStore interface
+    # ------------------------------------------------------------------
+
+    def count(self) -> int:
+        return self._live
+
+    def add(self, ids, documents, metadatas, embeddings=None):
+        if embeddings is None:
+            raise ValueError("NumpyVectorStore.add needs precomputed embeddings")
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("embeddings must be one vector per id")
+
+        with self._lock:
+            if self._dimension is None:
+                self._dimension = vectors.shape[1]
+                self._write_meta(self._dimension, self._generation)
+            elif vectors.shape[1] != self._dimension:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != collection dimension {self._dimension}")
+
+            # Re-adding an id replaces it (the old row becomes a tombstone).
+            self._tombstone_locked([self._row_of[i] for i in ids if i in self._row_of])
+
+            start = self._n
+            with open(self._file("vectors"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._file("records"), "a", encoding="utf-8") as f:
+                for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                    f.write(json.dumps({"id": chunk_id, "document": document, "metadata": metadata},
+                                       ensure_ascii=False) + "\n")
+
+            self._ids.extend(ids)
+            self._documents.extend(documents)
+            self._metadatas.extend(metadatas)
+            for offset, chunk_id in enumerate(ids):
+                self._row_of[chunk_id] = start + offset
+            self._n += len(ids)
+            self._norms = np.concatenate([self._norms, np.einsum("ij,ij->i", vectors, vectors)])
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._live += len(ids)
+            self._map(self._n)
+
+    def query(self, query_embeddings, n_results=10, where=None):
+        with self._lock:
+            # Take references to the current generation; compaction swaps these objects rather than mutating them.
+            n, matrix, norms = self._n, self._matrix, self._norms
+            documents, metadatas, ids = self._documents, self._metadatas, self._ids
+            mask = None
+            if self._live < n or where:
+                mask = self._alive[:n].copy()
+                if where:
+                    mask &= np.fromiter((_matches(metadatas[r], where) for r in range(n)), dtype=bool, count=n)
+            candidates = self._live if mask is None else int(mask.sum())
+
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        k = min(n_results, candidates)
+        if k == 0:
+            return {key: [[] for _ in range(len(queries))] for key in result}
+
+        # Squared L2, as Chroma reports: |x|^2 + |q|^2 - 2 x.q  (one row per query)
+        distances = queries @ matrix.T
+        distances *= -2
+        distances += norms
+        distances += np.einsum("ij,ij->i", queries, queries)[:, None]
+        if mask is not None:
+            distances[:, ~mask] = np.inf
+        for row in distances:
+            top = np.argpartition(row, k - 1)[:k]
+            top = top[np.argsort(row[top])]
+            result["ids"].append([ids[r] for r in top])
+            result["documents"].append([documents[r] for r in top])
+            result["metadatas"].append([metadatas[r] for r in top])
+            result["distances"].append(np.maximum(row[top], 0).tolist())
+        return result
+
+    def get(self, ids=None, where=None, include=None):
+        include = include if include is not None else ["documents", "metadatas"]
+        with self._lock:
+            if ids is not None:
+                rows = [self._row_of[i] for i in ids if i in self._row_of]
+            else:
+                rows = np.flatnonzero(self._alive[:self._n]).tolist()
+            if where:
+                rows = [r for r in rows if _matches(self._metadatas[r], where)]
+            result = {"ids": [self._ids[r] for r in rows]}
+            if "documents" in include:
+                result["documents"] = [self._documents[r] for r in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[r] for r in rows]
+            if "embeddings" in include:
+                result["embeddings"] = self._matrix[rows].tolist() if rows else []
+        return result
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            if ids is not None:
+                rows = [self._row_of[i] for i in ids if i in self._row_of]
+                if where:
+                    rows = [r for r in rows if _matches(self._metadatas[r], where)]
+            elif where:
+                rows = [r for r in np.flatnonzero(self._alive[:self._n]) if _matches(self._metadatas[r], where)]
+            else:
+                rows = []
+            self._tombstone_locked(rows)
+        self._maybe_compact()
+
+    # ------------------------------------------------------------------
+    # Deletes and compaction
+    # ------------------------------------------------------------------
+
+    def _tombstone_locked(self, rows: List[int]):
+        rows = [int(r) for r in rows if self._alive[r]]
+        if not rows:
+            return
+        with open(self._file("tombstones"), "a") as f:
+            f.write("".join(f"{r}\n" for r in rows))
+        self._alive[rows] = False
+        self._live -= len(rows)
+        for r in rows:
+            self._row_of.pop(self._ids[r], None)
+
+    def tombstones(self) -> int:
+        return self._n - self._live
+
+    def _maybe_compact(self):
+        dead = self.tombstones()
+        if dead < _COMPACT_MIN_TOMBSTONES or dead < self.compact_ratio * self._n:
+            return
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="vector-store-compaction", daemon=True).start()
+
+    def compact(self):
+        """Rewrite live rows into a new generation, then switch to it."""
+        with self._lock:
+            self._compacting = True
+            n0, generation = self._n, self._generation + 1
+            keep = np.flatnonzero(self._alive[:n0])
+            matrix = self._matrix
+        try:
+            # Bulk of the work without the lock: rows that existed when we started.
+            with open(self._file("vectors", generation), "wb") as f:
+                for i in range(0, len(keep), 4096):
+                    f.write(np.ascontiguousarray(matrix[keep[i:i + 4096]]).tobytes())
+            with open(self._file("records", generation), "w", encoding="utf-8") as f:
+                for row in keep:
+                    f.write(self._record_line(row))
+
+            with self._lock:
+                # Catch up with rows added meanwhile; rows deleted meanwhile stay tombstones.
+                added = np.arange(n0, self._n)[self._alive[n0:self._n]]
+                with open(self._file("vectors", generation), "ab") as f:
+                    f.write(np.ascontiguousarray(self._matrix[added]).tobytes())
+                with open(self._file("records", generation), "a", encoding="utf-8") as f:
+                    for row in added:
+                        f.write(self._record_line(row))
+                rows = np.concatenate([keep, added]).astype(np.int64)
+                alive = self._alive[rows]
+                with open(self._file("tombstones", generation), "w") as f:
+                    f.write("".join(f"{r}\n" for r in np.flatnonzero(~alive)))
+
+                old_generation = self._generation
+                self._write_meta(self._dimension, generation)
+                self._generation = generation
+                self._ids = [self._ids[r] for r in rows]
+                self._documents = [self._documents[r] for r in rows]
+                self._metadatas = [self._metadatas[r] for r in rows]
+                self._norms = self._norms[rows]
+                self._alive = alive
+                self._n = len(rows)
+                self._row_of = {self._ids[r]: int(r) for r in np.flatnonzero(alive)}
+                self._map(self._n)
+
+            for kind in ("vectors", "records", "tombstones"):
+                self._file(kind, old_generation).unlink(missing_ok=True)
+            metrics.inc("vector_store_compactions_total")
+            logger.info(f"Compacted vector store {self.path}: {n0} -> {len(rows)} rows")
+        except Exception as e:
+            logger.error(f"Vector store compaction failed: {e}")
+            for kind in ("vectors", "records", "tombstones"):
+                if generation != self._generation:
+                    self._file(kind, generation).unlink(missing_ok=True)
+        finally:
+            self._compacting = False
@@ -0,0 +1,236 @@
+"""
+On-demand profiling of single requests (admin only, see GET /admin/profiles).
+
+Code marks its stages, which cost one ContextVar lookup when nothing is profiled:
+
+    from app.core.profiling import stage
+    with stage("vector_search"):
+        results = collection.query(...)
+
+An endpoint starts a profile for the request when an admin sends
+`X-Profile: 1` (or `?profile=1`):
+
+    with profiled("POST /chat/query", user=current_user["email"]) as profile:
+        ...
+
+While a profile is active, a sampler thread records the Python stack of every
+thread that is inside one of its stages every PROFILE_SAMPLE_INTERVAL_MS.
+The open stages appear as `[name]` frames. The result is saved to PROFILE_DIR
+as folded stacks (`<id>.folded`, for flamegraph.pl, speedscope or inferno)
+and as per-stage timings (`<id>.json`).
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+PROFILE_ID = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{6}$")
+
+_active: ContextVar[Optional["Profile"]] = ContextVar("active_profile", default=None)
+_NO_STAGE = nullcontext()
+
+
+def stage(name: str):
+    """Time a stage of the current profile; a no-op context when none is active."""
+    profile = _active.get()
+    if profile is None:
+        return _NO_STAGE
+    return profile.stage(name)
+
+
+def _frame_depth(frame) -> int:
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = Path(code.co_filename)
+    return f"{code.co_name} ({path.parent.name}/{path.name}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Stage timings and stack samples of one request."""
+
+    def __init__(self, label: str, user: Optional[str], interval: float):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.label = label
+        self.user = user
+        self.interval = interval
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.stages: List[Dict] = []
+        self.samples: Counter = Counter()
+        self._started = time.perf_counter()
+        self._open: Dict[int, List] = {}  # thread id -> [(stage name, caller frame depth)]
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, name=f"profiler-{self.id}", daemon=True)
+
+    @contextmanager
+    def stage(self, name: str):
+        thread = threading.get_ident()
+        # Frames: this generator, contextmanager.__enter__, then the caller
+        depth = _frame_depth(sys._getframe(2))
+        with self._lock:
+            self._open.setdefault(thread, []).append((name, depth))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended = time.perf_counter()
+            with self._lock:
+                open_stages = self._open[thread]
+                path = ";".join(n for n, _ in open_stages)
+                open_stages.pop()
+                if not open_stages:
+                    del self._open[thread]
+                self.stages.append({
+                    "stage": name,
+                    "path": path,
+                    "thread": threading.current_thread().name,
+                    "start_ms": round((started - self._started) * 1000, 2),
+                    "ms": round((ended - started) * 1000, 2),
+                })
+
+    def _sample_loop(self):
+        deadline = time.monotonic() + settings.PROFILE_MAX_SECONDS
+        while not self._done.wait(self.interval) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            with self._lock:
+                open_stages = {thread: list(stages) for thread, stages in self._open.items()}
+            for thread, stages in open_stages.items():
+                frame = frames.get(thread)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                # Insert each open stage after the frame that entered it, drop the frames below the first.
+                folded = []
+                position = stages[0][1] - 1
+                for name, depth in stages:
+                    folded.extend(stack[position:depth])
+                    folded.append(f"[{name}]")
+                    position = depth
+                folded.extend(stack[position:])
+                self.samples[";".join(folded)] += 1
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._done.set()
+        self._sampler.join()
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 2)
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> Dict:
+        totals: Dict[str, Dict] = {}
+        for record in self.stages:
+            total = totals.setdefault(record["stage"], {"count": 0, "ms": 0.0})
+            total["count"] += 1
+            total["ms"] = round(total["ms"] + record["ms"], 2)
+        return {
+            "id": self.id,
+            "label": self.label,
+            "user": self.user,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            "sample_interval_ms": round(self.interval * 1000, 2),
+            "samples": sum(self.samples.values()),
+            "stage_totals": totals,
+        }
+
+
+class ProfileStore:
+    """Keeps the last `keep` profiles as <id>.folded + <id>.json files."""
+
+    def __init__(self, path: str, keep: int):
+        self.path = Path(path)
+        self.keep = keep
+
+    def save(self, profile: Profile):
+        self.path.mkdir(parents=True, exist_ok=True)
+        record = {**profile.summary(), "stages": profile.stages}
+        for suffix, data in ((".folded", profile.folded()), (".json", json.dumps(record, indent=2))):
+            tmp = self.path / f"{profile.id}{suffix}.tmp"
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, self.path / f"{profile.id}{suffix}")
+        self.prune()
+
+    def list(self) -> List[Dict]:
+        profiles = []
+        for meta in sorted(self.path.glob("*.json"), reverse=True) if self.path.exists() else []:
+            try:
+                record = json.loads(meta.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            record.pop("stages", None)
+            profiles.append(record)
+        return profiles
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        meta = self.path / f"{profile_id}.json"
+        if not PROFILE_ID.match(profile_id) or not meta.exists():
+            return None
+        return json.loads(meta.read_text(encoding="utf-8"))
+
+    def folded_path(self, profile_id: str) -> Optional[Path]:
+        path = self.path / f"{profile_id}.folded"
+        return path if PROFILE_ID.match(profile_id) and path.exists() else None
+
+    def prune(self):
+        # Ids start with a timestamp, so name order is age order
+        for meta in sorted(self.path.glob("*.json"), reverse=True)[self.keep:]:
+            meta.unlink(missing_ok=True)
+            meta.with_suffix(".folded").unlink(missing_ok=True)
+
+
+@lru_cache()
+def get_profile_store() -> ProfileStore:
+    """Return the process-wide ProfileStore."""
+    return ProfileStore(settings.PROFILE_DIR, settings.PROFILE_KEEP)
+
+
+def maybe_profiled(enabled: bool, label: str, user: Optional[str] = None):
+    """profiled(label, user) if enabled, else a context yielding None."""
+    return profiled(label, user) if enabled else nullcontext()
+
+
+@contextmanager
+def profiled(label: str, user: Optional[str] = None):
+    """Profile everything run in this context (including threadpool calls) and save it."""
+    profile = Profile(label, user, settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+    token = _active.set(profile)
+    profile.start()
+    try:
+        yield profile
+    except BaseException as e:
+        profile.error = str(e) or type(e).__name__
+        raise
+    finally:
+        _active.reset(token)
+        profile.stop()
+        get_profile_store().save(profile)
+        metrics.inc("profiles_recorded_total")
@@ -1,9 +1,13 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.core.config import settings
-from app.api import auth, chat, documents
+from app.core.loop_lag import start_loop_lag_monitor
+from app.core.metrics import metrics
+from app.api import admin, auth, chat, documents
 import logging
+import threading
 
 # Configure logging
 logging.basicConfig(
@@ -13,19 +17,37 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Load existing documents on startup."""
-    logger.info("Starting up Sahakari Bot...")
+def _load_documents_in_background():
+    """Ingest existing documents without holding up the server bind."""
     try:
         from app.services.startup import load_existing_documents
         load_existing_documents()
     except Exception as e:
         logger.warning(f"Could not load existing documents during startup: {e}")
         logger.info("You can still upload documents via the web interface.")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background document loading; heavy services are created on first use."""
+    logger.info("Starting up Sahakari Bot...")
+    loop_lag = start_loop_lag_monitor()
+    # With a shared vector service, the sidecar does the startup ingestion once.
+    if settings.LOAD_DOCUMENTS_ON_STARTUP and not settings.VECTOR_SERVICE_URL:
+        threading.Thread(
+            target=_load_documents_in_background,
+            name="startup-document-loader",
+            daemon=True
+        ).start()
+    if settings.WARMUP_ON_STARTUP:
+        from app.services.warmup import get_warmup_manager
+        get_warmup_manager().start()
     logger.info("Startup complete!")
     yield
-    # Cleanup code can go here if needed
+    if settings.WARMUP_ON_STARTUP:
+        get_warmup_manager().stop()
+    if loop_lag:
+        loop_lag.stop()
     logger.info("Shutting down Sahakari Bot...")
 
 
@@ -52,6 +74,7 @@ app.add_middleware(
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["Authentication"])
 app.include_router(chat.router, prefix=settings.API_V1_STR, tags=["Chat"])
 app.include_router(documents.router, prefix=settings.API_V1_STR, tags=["Documents"])
+app.include_router(admin.router, prefix=settings.API_V1_STR, tags=["Admin"])
 
 
 @app.get("/")
@@ -59,10 +82,30 @@ async def root():
     return {
         "message": "Welcome to Sahakari Bot API",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "ready": "/ready"
     }
 
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "Sahakari Bot"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """503 until the embedding and Ollama models are loaded (see app/services/warmup.py)."""
+    if not settings.WARMUP_ON_STARTUP:
+        return {"status": "ready", "warmup": "disabled"}
+    from app.services.warmup import get_warmup_manager
+    state = get_warmup_manager().state()
+    return JSONResponse(
+        status_code=200 if state["ready"] else 503,
+        content={"status": "ready" if state["ready"] else "warming", "warmup": state},
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """In-process counters and gauges (chat sessions, caches, queues, event-loop lag)."""
+    return metrics.snapshot()
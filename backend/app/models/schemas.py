@@ -32,11 +32,24 @@ class Token(BaseModel):
 class ChatQuery(BaseModel):
     query: str
     top_k: Optional[int] = 5
+    session_id: Optional[str] = None  # Continue a multi-turn session (POST /chat/sessions)
+    latency_budget_ms: Optional[int] = None  # How long the client will wait (like X-Deadline-Ms; the smaller wins)
+
+
+class ChatPrefetch(BaseModel):
+    query: str  # The partial question typed so far
+    top_k: Optional[int] = 5  # Must match the top_k of the query that follows
+
+
+class ChatPrefetchResponse(BaseModel):
+    status: str  # computed, cached, skipped, busy, failed or disabled
+    ttl_seconds: float
 
 
 class Citation(BaseModel):
     source: str
     page: str
+    section: Optional[str] = None
     excerpt: str
     relevance_score: Optional[float] = None
 
@@ -45,6 +58,16 @@ class ChatResponse(BaseModel):
     answer: str
     citations: List[Citation]
     sources_count: int
+    session_id: Optional[str] = None
+    mode: str = "full"  # full, truncated (cut at the deadline) or extractive (no generation)
+
+
+class ChatSessionResponse(BaseModel):
+    session_id: str
+
+
+class ReindexRequest(BaseModel):
+    embedding_model: Optional[str] = None  # Default: EMBEDDING_MODEL
 
 
 # Document Schemas
@@ -0,0 +1,159 @@
+"""
+Admission control for LLM generations.
+
+Ollama can only run a couple of generations at once; without a limit every
+request piles onto it and they all slow down until they time out together.
+The controller lets LLM_MAX_CONCURRENCY generations run, keeps a bounded
+priority queue for the rest (interactive chat ahead of batch/audit jobs) and
+rejects early, with a Retry-After hint, when the queue is full or the
+estimated wait would exceed the caller's deadline.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import List, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITY_HOUSEKEEPING = "housekeeping"  # idle_slot() only: never queued
+_PRIORITY_RANK = {PRIORITY_INTERACTIVE: 0, PRIORITY_BATCH: 1}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a generation is not admitted; maps to HTTP 429."""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"LLM is busy ({reason}); retry in {self.retry_after}s")
+
+
+class AdmissionController:
+    """Concurrency limit + bounded priority queue in front of the LLM."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, initial_estimate: float):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.avg_duration = initial_estimate  # EWMA of generation time (seconds)
+        self._active = 0
+        self._queue: List[list] = []  # heap of [rank, seq]
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def estimate_wait(self, priority: str = PRIORITY_INTERACTIVE) -> float:
+        """Expected queueing delay for a new request of this priority."""
+        with self._cond:
+            return self._estimate_locked(_PRIORITY_RANK.get(priority, 0))
+
+    def _estimate_locked(self, rank: int) -> float:
+        if self._active < self.max_concurrent and not self._queue:
+            return 0.0
+        ahead = sum(1 for entry in self._queue if entry[0] <= rank)
+        return self.avg_duration * math.ceil((ahead + 1) / self.max_concurrent)
+
+    @contextmanager
+    def slot(self, priority: str = PRIORITY_INTERACTIVE, deadline: Optional[float] = None):
+        """
+        Hold one generation slot for the duration of the block.
+
+        deadline is an absolute time.monotonic() value; raises AdmissionRejected
+        if the slot cannot be obtained before it.
+        """
+        self._acquire(priority, deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    @contextmanager
+    def idle_slot(self):
+        """
+        Hold a slot only if no generation is running or waiting (housekeeping calls).
+
+        Yields False, without a slot, when the LLM is busy. The slot's duration
+        is not added to avg_duration: a one-token ping says nothing about how
+        long an answer takes.
+        """
+        with self._cond:
+            admitted = self._active == 0 and not self._queue
+            if admitted:
+                self._admit_locked(PRIORITY_HOUSEKEEPING)
+        if not admitted:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._update_gauges_locked()
+                self._cond.notify_all()
+
+    def _acquire(self, priority: str, deadline: Optional[float]):
+        rank = _PRIORITY_RANK.get(priority, 0)
+        with self._cond:
+            if self._active < self.max_concurrent and not self._queue:
+                self._admit_locked(priority)
+                return
+
+            wait = self._estimate_locked(rank)
+            if len(self._queue) >= self.max_queue:
+                self._reject_locked("queue_full", wait)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                self._reject_locked("deadline", wait)
+
+            entry = [rank, next(self._seq)]
+            heapq.heappush(self._queue, entry)
+            self._update_gauges_locked()
+            while True:
+                if self._queue[0] is entry and self._active < self.max_concurrent:
+                    heapq.heappop(self._queue)
+                    self._admit_locked(priority)
+                    self._cond.notify_all()
+                    return
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                    self._reject_locked("timeout", self._estimate_locked(rank))
+                self._cond.wait(remaining)
+
+    def _admit_locked(self, priority: str):
+        self._active += 1
+        metrics.inc("llm_admission_admitted_total", priority=priority)
+        self._update_gauges_locked()
+
+    def _reject_locked(self, reason: str, retry_after: float):
+        metrics.inc("llm_admission_rejected_total", reason=reason)
+        self._update_gauges_locked()
+        raise AdmissionRejected(reason, retry_after or self.avg_duration)
+
+    def _release(self, duration: float):
+        with self._cond:
+            self._active -= 1
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+            self._update_gauges_locked()
+            self._cond.notify_all()
+
+    def _update_gauges_locked(self):
+        metrics.set("llm_admission_active", self._active)
+        metrics.set("llm_admission_queued", len(self._queue))
+        metrics.set("llm_generation_avg_seconds", round(self.avg_duration, 3))
+
+
+@lru_cache()
+def get_admission_controller() -> AdmissionController:
+    """Return the process-wide AdmissionController."""
+    return AdmissionController(
+        max_concurrent=settings.LLM_MAX_CONCURRENCY,
+        max_queue=settings.LLM_MAX_QUEUE,
+        initial_estimate=settings.LLM_INITIAL_GENERATION_SECONDS,
+    )
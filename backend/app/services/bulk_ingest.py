@@ -0,0 +1,256 @@
+"""
+Bulk ingestion of many documents with a pool of embedding processes.
+
+load_existing_documents() used to handle one file after another, each
+embedded by the single in-process model, so a many-core ingestion node sat
+mostly idle. With workers > 1, ingest_files() runs a pipeline instead:
+
+  1. a pool of `workers` spawned processes, each with its own model replica
+     (and BULK_INGEST_THREADS_PER_WORKER torch threads, so replicas do not
+     fight over cores), extracts and chunks files ahead of time;
+  2. the chunks that are not near-duplicates of stored ones are sent to the
+     same pool in batches of BULK_INGEST_BATCH_SIZE, from several files at
+     once (up to 2 * workers files are in flight);
+  3. a single writer (the calling thread) commits each file, in the order
+     given, through RAGService.store_document: the dedup check, the vector
+     store add, the Excel tables and the corpus version bump happen exactly
+     as for an upload, under RAGService.write_lock.
+
+With workers <= 1, or when embeddings come from the shared vector service
+(VECTOR_SERVICE_URL), files are ingested one at a time in this process.
+Used by load_existing_documents() (POST /documents/reload?workers=N) and
+`python -m scripts.bulk_ingest`.
+"""
+import contextvars
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.profiling import stage
+
+logger = logging.getLogger(__name__)
+
+_THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+_worker_service = None  # EmbeddingService of a pool process
+
+
+def _init_worker(model_name: str, threads: int):
+    """Pool initializer: cap the math libraries' threads, then load the model replica."""
+    global _worker_service
+    for var in _THREAD_VARS:
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    from app.services.embeddings import EmbeddingService
+
+    _worker_service = EmbeddingService(model_name)
+    _worker_service._get_model()
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _prepare(file_path: str):
+    from app.services.rag import get_rag_service
+    return get_rag_service().prepare_document(file_path)
+
+
+def _embed(texts: List[str]):
+    import numpy as np
+
+    # float32 arrays pickle far smaller and faster than lists of floats
+    embeddings = _worker_service._get_model().encode(texts, convert_to_numpy=True, show_progress_bar=False)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+class _PendingFile:
+    """A prepared file whose embedding batches are in the pool."""
+
+    def __init__(self, path: Path, texts=None, metadatas=None, batches=None, error: Optional[Exception] = None):
+        self.path = path
+        self.texts = texts
+        self.metadatas = metadatas
+        self.batches = batches or []  # [(chunk indices, future of their embeddings)]
+        self.error = error
+
+
+class BulkIngester:
+    """Ingests many files with a pool of embedding processes and one ordered writer."""
+
+    def __init__(self, workers: int, batch_size: Optional[int] = None, threads_per_worker: Optional[int] = None):
+        self.workers = max(1, workers)
+        self.batch_size = batch_size or settings.BULK_INGEST_BATCH_SIZE
+        self.threads = threads_per_worker or settings.BULK_INGEST_THREADS_PER_WORKER or \
+            max(1, (os.cpu_count() or 1) // self.workers)
+        self._stop = threading.Event()
+        self._producer_error: Optional[BaseException] = None
+
+    def ingest(self, paths: List[Path]) -> Dict:
+        """Ingest `paths`; returns a summary (see _Summary)."""
+        summary = _Summary(self.workers if self._parallel(paths) else 1)
+        with stage("bulk_ingest"):
+            if self._parallel(paths):
+                self._ingest_parallel(paths, summary)
+            else:
+                self._ingest_sequential(paths, summary)
+        return summary.finish()
+
+    def _parallel(self, paths: List[Path]) -> bool:
+        return self.workers > 1 and len(paths) > 0 and not settings.VECTOR_SERVICE_URL
+
+    def _ingest_sequential(self, paths: List[Path], summary: "_Summary"):
+        from app.services.rag import get_rag_service
+
+        for path in paths:
+            logger.info(f"Processing: {path.name}")
+            try:
+                summary.succeeded(path, get_rag_service().ingest_document(str(path)))
+            except Exception as e:
+                summary.failed(path, e)
+
+    def _ingest_parallel(self, paths: List[Path], summary: "_Summary"):
+        from app.core.database import get_active_index
+        from app.services.rag import get_rag_service
+
+        logger.info(
+            f"Bulk ingesting {len(paths)} file(s) with {self.workers} embedding processes "
+            f"({self.threads} thread(s) each, batches of {self.batch_size})"
+        )
+        model_name = get_active_index()["embedding_model"]
+        pending: "queue.Queue[Optional[_PendingFile]]" = queue.Queue(maxsize=2 * self.workers)
+        pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),  # fork is unsafe with torch and our threads
+            initializer=_init_worker,
+            initargs=(model_name, self.threads),
+        )
+        producer = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._produce, pool, paths, pending),
+            name="bulk-ingest-producer", daemon=True,
+        )
+        producer.start()
+        rag = get_rag_service()
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    break
+                self._write(rag, item, summary)
+            if self._producer_error:
+                raise self._producer_error
+        except BrokenProcessPool as e:
+            raise RuntimeError(
+                f"Embedding processes crashed or could not load {model_name} (see their output above)"
+            ) from e
+        finally:
+            self._stop.set()
+            while producer.is_alive():  # Unblock a producer waiting on a full queue
+                try:
+                    pending.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _produce(self, pool: ProcessPoolExecutor, paths: List[Path], pending: queue.Queue):
+        from app.core.database import get_active_index, get_vector_store
+        from app.services.dedup import get_dedup_index
+
+        dedup = get_dedup_index()
+        try:
+            # Extraction runs up to `workers` files ahead of embedding
+            prepared = [(path, pool.submit(_prepare, str(path))) for path in paths[:self.workers]]
+            queued = len(prepared)
+            while prepared and not self._stop.is_set():
+                path, future = prepared.pop(0)
+                if queued < len(paths):
+                    prepared.append((paths[queued], pool.submit(_prepare, str(paths[queued]))))
+                    queued += 1
+                try:
+                    texts, metadatas = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    pending.put(_PendingFile(path, error=e))
+                    continue
+                # Chunks that duplicate stored ones are not embedded; the writer re-checks
+                unique = dedup.plan(get_active_index()["collection"], texts, get_vector_store()).unique if dedup else range(len(texts))
+                unique = list(unique)
+                batches = [
+                    (indices, pool.submit(_embed, [texts[i] for i in indices]))
+                    for indices in (unique[i:i + self.batch_size] for i in range(0, len(unique), self.batch_size))
+                ]
+                pending.put(_PendingFile(path, texts, metadatas, batches))
+        except BaseException as e:
+            self._producer_error = e
+        finally:
+            pending.put(None)
+
+    def _write(self, rag, item: _PendingFile, summary: "_Summary"):
+        if item.error is not None:
+            summary.failed(item.path, item.error)
+            return
+        try:
+            embeddings = {}
+            for indices, future in item.batches:
+                embeddings.update(zip(indices, future.result().tolist()))
+            result = rag.store_document(str(item.path), item.texts, item.metadatas, embeddings)
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            summary.failed(item.path, e)
+            return
+        summary.succeeded(item.path, result)
+
+
+class _Summary:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.started = time.perf_counter()
+        self.results: List[Dict] = []
+        self.errors: Dict[str, str] = {}
+
+    def succeeded(self, path: Path, result: Dict):
+        self.results.append(result)
+        metrics.inc("bulk_ingest_files_total", result="ok")
+        logger.info(
+            f"✓ Successfully ingested {path.name} "
+            f"({result['chunks_ingested']} chunks, {result['chunks_deduplicated']} near-duplicates)"
+        )
+
+    def failed(self, path: Path, error: Exception):
+        self.errors[path.name] = str(error)
+        metrics.inc("bulk_ingest_files_total", result="failed")
+        logger.error(f"✗ Error processing {path.name}: {error}")
+
+    def finish(self) -> Dict:
+        seconds = time.perf_counter() - self.started
+        chunks = sum(r["chunks_ingested"] for r in self.results)
+        embedded = sum(r["chunks_stored"] for r in self.results)
+        if embedded:
+            metrics.set("bulk_ingest_chunks_per_second", round(embedded / seconds, 1))
+        return {
+            "workers": self.workers,
+            "succeeded": len(self.results),
+            "failed": len(self.errors),
+            "errors": self.errors,
+            "chunks": chunks,
+            "chunks_embedded": embedded,
+            "seconds": round(seconds, 2),
+            "chunks_per_second": round(embedded / seconds, 1) if seconds else None,
+        }
+
+
+def ingest_files(paths: List[Path], workers: Optional[int] = None) -> Dict:
+    """Ingest files with `workers` embedding processes (default BULK_INGEST_WORKERS)."""
+    if workers is None:
+        workers = settings.BULK_INGEST_WORKERS
+    return BulkIngester(workers).ingest(list(paths))
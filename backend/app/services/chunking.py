@@ -0,0 +1,272 @@
+"""
+Structure-aware chunking for legal documents (Acts, Rules, Directives).
+
+Statutes are organised as Chapters -> numbered Sections -> sub-clauses
+("(1)", "(a)", "Provided that ..."). Chunks follow those boundaries across page
+breaks instead of cutting every page into fixed windows, so a section that
+starts at the bottom of one page stays in one piece and every chunk records
+the page span it came from.
+
+All boundary detection is done with a handful of multiline regex scans over
+the whole document, so chunking is a linear pass with no per-line Python work.
+"""
+import re
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Every pattern is anchored on a literal "\n" rather than "^" with re.MULTILINE:
+# the regex engine can then skip straight to newlines, which makes the scans
+# several times faster. The joined document text always starts with "\n".
+
+# "Chapter-2", "Chapter - 2", "Chapter – 10", "CHAPTER 4", "Part 3" (+ optional title line)
+CHAPTER_RE = re.compile(
+    r"\n[ \t]*(?:[Cc]hapter|CHAPTER|[Pp]art|PART)[ \t]*[-–—:]?[ \t]*(\d+|[ivxlcIVXLC]+)[ \t]*(?=\n)"
+    r"(?:\n(?![ \t]*\d{1,3}[A-Z]?\.[ \t])([^\n]{1,120}))?"
+)
+# "3. Formation of Organization: ..." / "12A. Something"
+SECTION_RE = re.compile(r"\n[ \t]*(\d{1,3})[A-Z]?\.[ \t]+[A-Z“\"(][^\n:]{0,100}")
+# "(1)", "(a)", "a)", "1)", "(ab)", "Provided that", "Explanation:"
+CLAUSE_RE = re.compile(
+    r"\n[ \t]*(?:\(\d{1,3}\)|\(?[a-z]{1,2}\)|\d{1,2}\)|Provided[ \t]+(?:that|further)|Explanation[ \t]*[:-])"
+)
+SENTENCE_END_RE = re.compile(r"(?<=[.;:])\s+")
+HYPHEN_BREAK_RE = re.compile(r"-\n(?=[a-z])")  # "mutu-\nally" -> "mutually"
+
+
+# An atom is the smallest span the packer will not cut: a whole section, or one
+# clause of a long one. Plain tuples (start, end, chapter, section, continued)
+# are used because thousands are created per document; "continued" is True when
+# the atom is not the first piece of its section.
+_Atom = Tuple[int, int, str, str, bool]
+
+
+class LegalTextChunker:
+    """Split extracted pages into section-aligned chunks with page-span metadata."""
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 0):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # Room a continuation chunk needs before its own text: the "[section (contd.)]"
+        # line (plus the section label) and the "..."-prefixed overlap line.
+        self._continued_extra = 12 + (chunk_overlap + 4 if chunk_overlap else 0)
+
+    def split_pages(self, pages: List[Dict]) -> List[Dict]:
+        """
+        Chunk a sequence of extracted pages from ONE document.
+
+        Each page dict needs "text" and "page"; "source" and "type" are copied
+        through. Returns dicts with "text", "page" (e.g. "3" or "3-4"),
+        "page_start", "page_end", "chapter" and "section".
+        """
+        if not pages:
+            return []
+
+        text, offsets, labels = self._join_pages(pages)
+        atoms = self._atoms(text)
+
+        base = {"source": pages[0].get("source", "unknown"), "type": pages[0].get("type", "")}
+        chunks = []
+        previous_text = ""
+        for (start, _, chapter, section, continued), end, first_section, last_section in self._pack(atoms):
+            body = text[start:end].strip()
+            if not body:
+                continue
+            if continued and section:
+                prefix = f"[{section} (contd.)]\n"
+                if self.chunk_overlap and previous_text:
+                    prefix += self._tail(previous_text, self.chunk_overlap) + "\n"
+                body = prefix + body
+            previous_text = body
+
+            first = labels[bisect_right(offsets, start) - 1]
+            last = labels[bisect_right(offsets, end - 1) - 1]
+            chunks.append({
+                **base,
+                "text": body,
+                "page": str(first) if first == last else f"{first}-{last}",
+                "page_start": first,
+                "page_end": last,
+                "chapter": chapter,
+                "section": self._section_label(first_section, last_section),
+            })
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        """Chunk a single block of text (no page metadata)."""
+        return [c["text"] for c in self.split_pages([{"text": text, "page": 1}])]
+
+    # ------------------------------------------------------------------
+    # Page handling
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _join_pages(pages: List[Dict]):
+        """Concatenate pages, dropping running headers and trailing page numbers."""
+        texts = [(page.get("text") or "").strip() for page in pages]
+
+        # A first line repeated on at least half the pages is a running header
+        # (e.g. "www.lawcommission.gov.np").
+        header = None
+        if len(texts) >= 3:
+            firsts = Counter(t.split("\n", 1)[0].strip() for t in texts if t)
+            candidate, hits = firsts.most_common(1)[0] if firsts else ("", 0)
+            if candidate and hits >= len(texts) / 2 and not SECTION_RE.match("\n" + candidate):
+                header = candidate
+
+        parts, offsets, labels = [""], [], []
+        position = 1  # text starts with the "\n" sentinel the patterns anchor on
+        for page, page_text in zip(pages, texts):
+            if header is not None and page_text.startswith(header):
+                page_text = page_text[len(header):].lstrip()
+            body, _, last_line = page_text.rpartition("\n")
+            if body and last_line.strip().isdigit():
+                page_text = body.rstrip()
+            if "-\n" in page_text:
+                page_text = HYPHEN_BREAK_RE.sub("", page_text)
+            if not page_text:
+                continue
+            offsets.append(position)
+            labels.append(page.get("page"))
+            parts.append(page_text)
+            position += len(page_text) + 1
+        return "\n".join(parts), offsets, labels
+
+    # ------------------------------------------------------------------
+    # Structure detection
+    # ------------------------------------------------------------------
+
+    def _atoms(self, text: str) -> List[_Atom]:
+        """Cut the document at chapter/section boundaries, then split long sections by clause."""
+        boundaries = []  # (offset, kind, label)
+        for m in CHAPTER_RE.finditer(text):
+            title = f": {m.group(2).strip()}" if m.group(2) else ""
+            boundaries.append((m.start() + 1, "chapter", f"Chapter {m.group(1)}{title}"))
+
+        # Section numbers increase in small steps; anything else is a wrapped line
+        # such as "pursuant to Section\n15. ...".
+        last = 0
+        for m in SECTION_RE.finditer(text):
+            number = int(m.group(1))
+            if last < number <= last + 5:
+                last = number
+                boundaries.append((m.start() + 1, "section", m.group(0).strip()))
+        boundaries.sort(key=lambda b: b[0])
+
+        atoms: List[_Atom] = []
+        chapter, section = "", ""
+        start = 1
+        heading_only = False  # current span holds nothing but a chapter heading
+        for offset, kind, label in boundaries:
+            if kind == "section" and heading_only:
+                # Keep a bare chapter heading attached to its first section.
+                section, heading_only = label, False
+                continue
+            if offset > start:
+                self._emit(text, start, offset, chapter, section, atoms)
+            start = offset
+            if kind == "chapter":
+                chapter, section, heading_only = label, "", True
+            else:
+                section = label
+        self._emit(text, start, len(text), chapter, section, atoms)
+        return atoms
+
+    def _emit(self, text: str, start: int, end: int, chapter: str, section: str, atoms: List[_Atom]):
+        """Append one unit, split at clause boundaries (then sentences) if oversized."""
+        if end - start <= self.chunk_size:
+            atoms.append((start, end, chapter, section, False))
+            return
+
+        budget = self.chunk_size - len(section) - self._continued_extra  # room for the "(contd.)" prefix
+        cuts = [m.start() + 1 for m in CLAUSE_RE.finditer(text, start, end - 1)]
+        cuts.append(end)
+        continued = False
+        a = start
+        for b in cuts:
+            if b - a <= budget:
+                atoms.append((a, b, chapter, section, continued))
+            else:
+                for x, y in self._sentence_spans(text, a, b, budget):
+                    atoms.append((x, y, chapter, section, continued))
+                    continued = True
+            continued = True
+            a = b
+
+    @staticmethod
+    def _sentence_spans(text: str, start: int, end: int, budget: int):
+        """Last resort for one huge clause: pack sentences, then hard-wrap at line breaks/spaces."""
+        spans = []
+        span_start = start
+        cursor = start
+        for m in SENTENCE_END_RE.finditer(text, start, end):
+            if m.end() - span_start > budget and cursor > span_start:
+                spans.append((span_start, cursor))
+                span_start = cursor
+            cursor = m.end()
+        if end - span_start > budget and cursor > span_start:
+            spans.append((span_start, cursor))
+            span_start = cursor
+
+        result = []
+        for a, b in spans + [(span_start, end)]:
+            while b - a > budget:
+                # Prefer a line break (e.g. a table row), then a space.
+                cut = text.rfind("\n", a, a + budget)
+                if cut <= a + budget // 2:
+                    cut = text.rfind(" ", a, a + budget)
+                cut = cut if cut > a else a + budget
+                result.append((a, cut))
+                a = cut
+            if b > a:
+                result.append((a, b))
+        return result
+
+    # ------------------------------------------------------------------
+    # Packing
+    # ------------------------------------------------------------------
+
+    def _pack(self, atoms: List[_Atom]):
+        """
+        Greedily merge consecutive atoms of the same chapter up to chunk_size.
+
+        Yields (first atom, end offset, first section, last section) per chunk.
+        """
+        size = self.chunk_size
+        head = None
+        head_start = end = 0
+        limit = size
+        first_section = last_section = ""
+        for atom in atoms:
+            start, atom_end, chapter, section, continued = atom
+            if head is not None and (chapter != head[2] or atom_end - head_start > limit):
+                yield head, end, first_section, last_section
+                head = None
+            if head is None:
+                head, head_start = atom, start
+                limit = size - (len(section) + self._continued_extra if continued else 0)
+                first_section = last_section = section
+            elif section and not continued:
+                last_section = section
+                first_section = first_section or section
+            end = atom_end
+        if head is not None:
+            yield head, end, first_section, last_section
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _tail(text: str, size: int) -> str:
+        tail = text[-size:]
+        space = tail.find(" ")
+        return "..." + (tail[space + 1:] if 0 <= space < len(tail) - 1 else tail)
+
+    @staticmethod
+    def _section_label(first: str, last: str) -> str:
+        if not first or first == last:
+            return last
+        return f"Sections {first.split('.', 1)[0]}-{last.split('.', 1)[0]}"
@@ -0,0 +1,170 @@
+"""
+Corpus version: a persisted, monotonically increasing counter of changes to
+the document set.
+
+It is bumped on every ingest and snapshot import, and whenever the
+upload or documents folder changes on disk (detected from the two folder
+mtimes, checked at most every CORPUS_CHECK_INTERVAL_SECONDS). Anything
+derived from the corpus - single-flight keys, the ETags of /documents/list
+and /documents/status, cached response bodies - is keyed on it, so it only
+has to be recomputed when the version moves.
+
+The counter lives in CORPUS_VERSION_FILE, so it survives restarts and is
+shared by every worker (and the vector sidecar) running from the same folder.
+Every read-increment-write holds an OS lock (fcntl.flock) on
+CORPUS_VERSION_FILE + ".lock". Without it, two workers bumping at once could
+both write N+1. A body cached for N+1 by one of them would then be served
+under an ETag that still looks current after the second change.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+from app.core.config import settings
+from app.core.metrics import metrics
+try:
+    import fcntl
+except ImportError:  # Windows: bumps are only serialised within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusVersion:
+    """Persisted corpus version plus a cache of bodies computed for it."""
+
+    def __init__(self, path: str, watched_dirs: Tuple[str, ...], check_interval: float):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.watched_dirs = watched_dirs
+        self.check_interval = check_interval
+        self.value = 0
+        self.updated_at = time.time()
+        self._dir_mtimes: Dict[str, float] = {}
+        self._file_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._bodies: Dict[str, Tuple[int, bytes]] = {}
+        with self._lock:
+            self._read_locked()
+            # Folders changed while we were not running?
+            self._check_dirs_locked()
+
+    def current(self) -> int:
+        """Current version; cheap enough to call on every request."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                self._checked_at = now
+                self._read_locked()
+                self._check_dirs_locked()
+        return self.value
+
+    def bump(self, reason: str) -> int:
+        """Record a change to the corpus and return the new version."""
+        with self._lock, self._file_lock():
+            self._read_locked(force=True)  # Another worker may have bumped it since
+            # The change usually touched the folders too (an upload); count it once.
+            self._dir_mtimes = self._stat_dirs()
+            self._bump_locked(reason)
+            return self.value
+
+    def cached(self, name: str, version: int, build: Callable[[], bytes]) -> bytes:
+        """Return the body cached for this version, building it on a miss."""
+        entry = self._bodies.get(name)
+        if entry is not None and entry[0] == version:
+            metrics.inc("corpus_body_cache_total", result="hit")
+            return entry[1]
+        body = build()
+        self._bodies[name] = (version, body)
+        metrics.inc("corpus_body_cache_total", result="miss")
+        return body
+
+    def _bump_locked(self, reason: str):
+        self.value += 1
+        self.updated_at = time.time()
+        self._write_locked()
+        metrics.inc("corpus_version_bumps_total", reason=reason)
+        metrics.set("corpus_version", self.value)
+        logger.debug(f"Corpus version {self.value} ({reason})")
+
+    def _stat_dirs(self) -> Dict[str, float]:
+        mtimes = {}
+        for directory in self.watched_dirs:
+            try:
+                mtimes[directory] = os.stat(directory).st_mtime
+            except OSError:
+                mtimes[directory] = 0.0
+        return mtimes
+
+    def _check_dirs_locked(self):
+        mtimes = self._stat_dirs()
+        if mtimes == self._dir_mtimes:
+            return
+        with self._file_lock():
+            self._read_locked(force=True)  # Another worker may have recorded this change already
+            if mtimes != self._dir_mtimes:
+                self._dir_mtimes = mtimes
+                self._bump_locked("files_changed")
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock across processes for a read-increment-write of the version file."""
+        if fcntl is None:
+            yield
+            return
+        try:
+            f = open(self.lock_path, "a")
+        except OSError as e:
+            logger.warning(f"Could not lock {self.lock_path}: {e}")
+            yield
+            return
+        with f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_locked(self, force: bool = False):
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return
+        if mtime == self._file_mtime and not force:
+            return
+        try:
+            state = json.loads(self.path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read corpus version from {self.path}: {e}")
+            return
+        self._file_mtime = mtime
+        if state.get("version", 0) > self.value:
+            self.value = state["version"]
+            self.updated_at = state.get("updated_at", self.updated_at)
+        self._dir_mtimes = state.get("dir_mtimes", self._dir_mtimes)
+
+    def _write_locked(self):
+        state = {"version": self.value, "updated_at": self.updated_at, "dir_mtimes": self._dir_mtimes}
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps(state))
+            os.replace(tmp, self.path)
+            self._file_mtime = self.path.stat().st_mtime
+        except OSError as e:
+            logger.warning(f"Could not persist corpus version to {self.path}: {e}")
+
+
+@lru_cache()
+def get_corpus_version() -> CorpusVersion:
+    """Return the process-wide CorpusVersion."""
+    return CorpusVersion(
+        settings.CORPUS_VERSION_FILE,
+        watched_dirs=(settings.UPLOAD_DIR, settings.EXISTING_DOCS_DIR),
+        check_interval=settings.CORPUS_CHECK_INTERVAL_SECONDS,
+    )
@@ -0,0 +1,94 @@
+"""
+Deadline-aware answering: what /chat/query does with the time the client has left.
+
+The deadline (X-Deadline-Ms or ChatQuery.latency_budget_ms, else
+LLM_DEFAULT_DEADLINE_SECONDS) is an absolute time.monotonic() carried through
+retrieval, admission and generation. After retrieval RAGService picks a mode:
+
+    full        the generated answer
+    truncated   the generation was still running at the deadline: the answer so far
+    extractive  no generation (the remaining budget minus the expected LLM queue
+                wait is below DEADLINE_MIN_GENERATION_SECONDS, admission would
+                miss the deadline, or the LLM failed): the ranked citations and
+                the context sentences that best match the question
+
+Metrics:
+    chat_answer_mode_total{mode}      responses per mode
+    chat_degraded_total{reason}       budget, admission or llm_error
+    chat_deadline_missed_total        responses sent after their deadline
+"""
+import re
+import time
+from typing import List, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.admission import get_admission_controller
+
+MODE_FULL = "full"
+MODE_TRUNCATED = "truncated"
+MODE_EXTRACTIVE = "extractive"
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_WRAP_RE = re.compile(r"\s*\n\s*")
+_SENTENCE_RE = re.compile(r"(?<=[.;!?])\s+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "the and for are was were what which who whom how when where why with from that this these those "
+    "does did can could should would shall will may must has have had not any all its into about under "
+    "there their them than then been being our your you".split()
+)
+
+_LEADS = {
+    "budget": "There was not enough time left to generate an answer. The most relevant passages from the documents:",
+    "admission": "The language model is busy. The most relevant passages from the documents:",
+    "llm_error": "The language model is unavailable. The most relevant passages from the documents:",
+}
+
+
+def remaining(deadline: Optional[float]) -> float:
+    """Seconds left before `deadline` (minus DEADLINE_SAFETY_MS to build the response)."""
+    if deadline is None:
+        return float("inf")
+    return deadline - time.monotonic() - settings.DEADLINE_SAFETY_MS / 1000
+
+
+def can_generate(deadline: Optional[float], priority: str) -> bool:
+    """Whether the budget covers the expected LLM queue wait plus a useful generation."""
+    wait = get_admission_controller().estimate_wait(priority)
+    return remaining(deadline) - wait >= settings.DEADLINE_MIN_GENERATION_SECONDS
+
+
+def admission_deadline(deadline: Optional[float]) -> Optional[float]:
+    """Latest time a generation may start and still have DEADLINE_MIN_GENERATION_SECONDS."""
+    if deadline is None:
+        return None
+    return deadline - settings.DEADLINE_SAFETY_MS / 1000 - settings.DEADLINE_MIN_GENERATION_SECONDS
+
+
+def _terms(text: str) -> set:
+    return {w for w in _WORD_RE.findall(text.lower()) if len(w) > 2 and w not in _STOPWORDS}
+
+
+def extractive_answer(question: str, contexts: List[str], reason: str) -> str:
+    """The context sentences sharing the most terms with the question, best first."""
+    terms = _terms(question)
+    scored = []
+    for rank, context in enumerate(contexts):
+        # PDF text wraps lines mid-sentence: rejoin them, keeping blank-line paragraph breaks
+        paragraphs = (_WRAP_RE.sub(" ", p) for p in _PARAGRAPH_RE.split(context))
+        sentences = [s for p in paragraphs for s in _SENTENCE_RE.split(p)]
+        for position, sentence in enumerate(sentences):
+            sentence = " ".join(sentence.split())
+            if len(sentence) < 20:
+                continue
+            score = len(terms & _terms(sentence))
+            scored.append((-score, rank, position, sentence))
+    scored.sort()
+    picked = [s for s in scored if s[0] < 0] or sorted(scored, key=lambda s: (s[2], s[1]))
+    lines = []
+    for _, _, _, sentence in picked[:settings.DEADLINE_EXTRACTIVE_SENTENCES]:
+        if len(sentence) > 300:
+            sentence = sentence[:300].rsplit(" ", 1)[0] + "..."
+        lines.append(f"- {sentence}")
+    metrics.inc("chat_degraded_total", reason=reason)
+    return "\n".join([_LEADS.get(reason, _LEADS["budget"]), ""] + lines)
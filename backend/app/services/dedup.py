@@ -0,0 +1,421 @@
+"""
+Near-duplicate chunk detection at ingest time (MinHash + LSH).
+
+Amended versions of the same Act and repeated boilerplate (definitions,
+preambles) produce many chunks that are almost identical. Storing them all
+bloats the vector store, costs embedding time and lets copies of one passage
+crowd distinct passages out of top_k. Before a document is embedded, each
+chunk gets a MinHash signature over its word shingles. The signature is
+looked up in a persistent LSH index (SQLite, DEDUP_DB_PATH), and candidates
+are confirmed by their estimated Jaccard similarity (DEDUP_THRESHOLD).
+Chunks whose numbers differ are never duplicates: an amendment that only
+changes an amount or a period is exactly the text that must stay retrievable.
+
+A duplicate is not embedded or added to the vector store. It is recorded as
+a reference to the stored (canonical) chunk, together with its own text and
+citation metadata. When the canonical chunk is retrieved, its references are
+cited as well. When the canonical's source is deleted, one reference is
+promoted to a stored chunk, reusing the canonical's embedding.
+
+Everything is keyed by collection name, so a re-index builds its own index
+next to the live one. The index lives in the vector store's folder, so a
+wiped or switched store starts with an empty one, and stored chunks are
+checked against the store before anything is treated as a duplicate of them.
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_PRIME = (1 << 31) - 1  # a * x stays below 2**62, so uint64 arithmetic cannot overflow
+_SQL_BATCH = 500  # Parameters per IN (...) query
+_NUMBER_RE = re.compile(r"\b\d+(?:[.,/]\d+)*\b")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    chunk_id TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    source TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    numbers INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS signatures_source ON signatures(collection, source);
+CREATE TABLE IF NOT EXISTS bands (
+    collection TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bands_bucket ON bands(collection, bucket);
+CREATE INDEX IF NOT EXISTS bands_chunk ON bands(chunk_id);
+CREATE TABLE IF NOT EXISTS refs (
+    chunk_id TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    canonical_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    document TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    numbers INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_canonical ON refs(canonical_id);
+CREATE INDEX IF NOT EXISTS refs_source ON refs(collection, source);
+"""
+
+
+def _numbers(text: str) -> int:
+    """Fingerprint of the numbers in a chunk (amounts, periods, section numbers)."""
+    return zlib.crc32(" ".join(_NUMBER_RE.findall(text)).encode())
+
+
+def _batches(items: List, size: int = _SQL_BATCH):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class DedupPlan:
+    """Which chunks of one document are new and which duplicate a stored chunk."""
+
+    def __init__(self, collection: str, ids: List[str], duplicate_of: List[Optional[str]],
+                 signatures: np.ndarray, numbers: List[int]):
+        self.collection = collection
+        self.ids = ids
+        self.duplicate_of = duplicate_of  # Canonical chunk id (stored, or earlier in this document) or None
+        self.signatures = signatures
+        self.numbers = numbers
+
+    @property
+    def unique(self) -> List[int]:
+        return [i for i, canonical in enumerate(self.duplicate_of) if canonical is None]
+
+    @property
+    def duplicates(self) -> int:
+        return len(self.ids) - len(self.unique)
+
+    @property
+    def ratio(self) -> float:
+        return round(self.duplicates / len(self.ids), 4) if self.ids else 0.0
+
+    def existing_canonicals(self) -> List[str]:
+        own = set(self.ids)
+        return sorted({c for c in self.duplicate_of if c is not None and c not in own})
+
+
+class DedupIndex:
+    """Persistent MinHash/LSH index of stored chunks and their duplicates."""
+
+    def __init__(self, path: str, num_perm: int, bands: int, threshold: float, shingle_words: int):
+        if num_perm % bands:
+            raise ValueError("DEDUP_NUM_PERM must be a multiple of DEDUP_BANDS")
+        self.path = Path(path)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(20240611)  # Fixed: signatures must stay comparable across runs
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection that commits on success and is always closed."""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------
+    # Signatures
+    # ------------------------------------------------------------------
+
+    def signature(self, text: str) -> np.ndarray:
+        words = text.lower().split()
+        k = self.shingle_words
+        shingles = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+        x = np.fromiter((zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((self._a[:, None] * x[None, :] + self._b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def _buckets(self, signature: np.ndarray) -> List[int]:
+        return [
+            int.from_bytes(hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                                           digest_size=8, person=band.to_bytes(2, "little")).digest(),
+                           "little", signed=True)
+            for band in range(self.bands)
+        ]
+
+    def similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.count_nonzero(a == b)) / self.num_perm
+
+    # ------------------------------------------------------------------
+    # Ingest
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _live(store, chunk_ids) -> set:
+        """The chunk ids the vector store still holds."""
+        live = set()
+        for batch in _batches(sorted(chunk_ids)):
+            live.update(store.get(ids=batch, include=[])["ids"])
+        return live
+
+    def _forget(self, collection: str, chunk_ids: set):
+        """Drop indexed chunks the vector store no longer holds, with the references to them."""
+        logger.warning(f"Dedup index of {collection}: {len(chunk_ids)} chunks are missing from the vector store, dropping them")
+        with self._lock, self.connect() as db:
+            for batch in _batches(sorted(chunk_ids)):
+                marks = ", ".join("?" * len(batch))
+                db.execute(f"DELETE FROM refs WHERE canonical_id IN ({marks})", batch)
+                db.execute(f"DELETE FROM bands WHERE chunk_id IN ({marks})", batch)
+                db.execute(f"DELETE FROM signatures WHERE chunk_id IN ({marks})", batch)
+
+    def plan(self, collection: str, texts: List[str], store) -> DedupPlan:
+        """
+        Find the duplicates among a document's chunks (against the index and each other).
+
+        Candidates missing from `store` (the collection's vector store, e.g.
+        wiped) are forgotten, so their duplicates are stored again.
+        """
+        signatures = np.stack([self.signature(t) for t in texts]) if texts else np.zeros((0, self.num_perm), np.uint32)
+        buckets = [self._buckets(s) for s in signatures]
+        numbers = [_numbers(t) for t in texts]
+
+        # Stored chunks sharing at least one LSH bucket
+        wanted = sorted({b for chunk in buckets for b in chunk})
+        candidates: Dict[int, set] = {}
+        with self.connect() as db:
+            for batch in _batches(wanted):
+                marks = ", ".join("?" * len(batch))
+                for band, bucket, chunk_id in db.execute(
+                        f"SELECT band, bucket, chunk_id FROM bands WHERE collection = ? AND bucket IN ({marks})",
+                        [collection, *batch]):
+                    candidates.setdefault(bucket, set()).add((band, chunk_id))
+            stored: Dict[str, tuple] = {}  # chunk id -> (signature, numbers)
+            ids = sorted({c for pairs in candidates.values() for _, c in pairs})
+            for batch in _batches(ids):
+                marks = ", ".join("?" * len(batch))
+                for chunk_id, blob, chunk_numbers in db.execute(
+                        f"SELECT chunk_id, signature, numbers FROM signatures WHERE chunk_id IN ({marks})", batch):
+                    stored[chunk_id] = (np.frombuffer(blob, dtype=np.uint32), chunk_numbers)
+        stale = set(stored) - self._live(store, stored)
+        if stale:
+            self._forget(collection, stale)
+            for chunk_id in stale:
+                del stored[chunk_id]
+
+        chunk_ids = [str(uuid.uuid4()) for _ in texts]
+        duplicate_of: List[Optional[str]] = []
+        for i, (signature, chunk_buckets) in enumerate(zip(signatures, buckets)):
+            matches = {c for band, bucket in enumerate(chunk_buckets)
+                       for b, c in candidates.get(bucket, ()) if b == band and c in stored}
+            best, best_similarity = None, self.threshold
+            for chunk_id in matches:
+                other, other_numbers = stored[chunk_id]
+                if other_numbers != numbers[i]:
+                    continue
+                similarity = self.similarity(signature, other)
+                if similarity >= best_similarity:
+                    best, best_similarity = chunk_id, similarity
+            duplicate_of.append(best)
+            if best is None:
+                # New canonical: later chunks of this document may duplicate it
+                stored[chunk_ids[i]] = (signature, numbers[i])
+                for band, bucket in enumerate(chunk_buckets):
+                    candidates.setdefault(bucket, set()).add((band, chunk_ids[i]))
+        return DedupPlan(collection, chunk_ids, duplicate_of, signatures, numbers)
+
+    def is_current(self, plan: DedupPlan, store) -> bool:
+        """False if a stored chunk the plan refers to was deleted meanwhile (from the index or `store`)."""
+        canonicals = plan.existing_canonicals()
+        found = 0
+        with self.connect() as db:
+            for batch in _batches(canonicals):
+                marks = ", ".join("?" * len(batch))
+                found += db.execute(f"SELECT COUNT(*) FROM signatures WHERE chunk_id IN ({marks})", batch).fetchone()[0]
+        return found == len(canonicals) and len(self._live(store, canonicals)) == len(canonicals)
+
+    def commit(self, plan: DedupPlan, texts: List[str], metadatas: List[Dict]):
+        """Record the plan's new chunks (after they were stored) and its references."""
+        signature_rows, band_rows, ref_rows = [], [], []
+        for i, (chunk_id, canonical) in enumerate(zip(plan.ids, plan.duplicate_of)):
+            blob = plan.signatures[i].tobytes()
+            if canonical is None:
+                signature_rows.append((chunk_id, plan.collection, metadatas[i].get("source", "unknown"),
+                                       blob, plan.numbers[i]))
+                band_rows.extend((plan.collection, band, bucket, chunk_id)
+                                 for band, bucket in enumerate(self._buckets(plan.signatures[i])))
+            else:
+                ref_rows.append((chunk_id, plan.collection, canonical, metadatas[i].get("source", "unknown"),
+                                 texts[i], json.dumps(metadatas[i]), blob, plan.numbers[i]))
+        with self._lock, self.connect() as db:
+            db.executemany("INSERT INTO signatures VALUES (?, ?, ?, ?, ?)", signature_rows)
+            db.executemany("INSERT INTO bands VALUES (?, ?, ?, ?)", band_rows)
+            db.executemany("INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", ref_rows)
+
+    # ------------------------------------------------------------------
+    # Query / delete
+    # ------------------------------------------------------------------
+
+    def references(self, collection: str, chunk_ids: List[str]) -> Dict[str, List[Dict]]:
+        """Duplicates of the given stored chunks: {canonical id: [{"document", "metadata"}]}."""
+        refs: Dict[str, List[Dict]] = {}
+        if not chunk_ids:
+            return refs
+        with self.connect() as db:
+            marks = ", ".join("?" * len(chunk_ids))
+            for canonical, document, metadata in db.execute(
+                    f"SELECT canonical_id, document, metadata FROM refs "
+                    f"WHERE collection = ? AND canonical_id IN ({marks}) ORDER BY rowid", [collection, *chunk_ids]):
+                refs.setdefault(canonical, []).append({"document": document, "metadata": json.loads(metadata)})
+        return refs
+
+    def sources(self, collection: str, stored_ids: set) -> set:
+        """
+        Sources with a reference to one of `stored_ids` (the ids in the vector store).
+
+        Some have no stored chunk at all; references to chunks the store lost do not count.
+        """
+        with self.connect() as db:
+            return {source for source, canonical in db.execute(
+                "SELECT source, canonical_id FROM refs WHERE collection = ?", (collection,)) if canonical in stored_ids}
+
+    def source_references(self, collection: str, source: str) -> List[Dict]:
+        """A source's duplicates: [{"document", "metadata"}]."""
+        with self.connect() as db:
+            return [{"document": d, "metadata": json.loads(m)} for d, m in db.execute(
+                "SELECT document, metadata FROM refs WHERE collection = ? AND source = ? ORDER BY rowid",
+                (collection, source))]
+
+    def count_source(self, collection: str, source: str) -> int:
+        with self.connect() as db:
+            return db.execute("SELECT COUNT(*) FROM refs WHERE collection = ? AND source = ?",
+                              (collection, source)).fetchone()[0]
+
+    def remove_source(self, collection: str, source: str) -> Dict[str, List[Dict]]:
+        """
+        Forget a source's chunks and references.
+
+        Returns the references of other sources whose canonical chunk belonged
+        to it: {canonical id: [{"chunk_id", "document", "metadata", "signature", "numbers"}]}.
+        The caller must store one of each group (promote()).
+        """
+        orphans: Dict[str, List[Dict]] = {}
+        with self._lock, self.connect() as db:
+            own = [r[0] for r in db.execute("SELECT chunk_id FROM signatures WHERE collection = ? AND source = ?",
+                                            (collection, source))]
+            db.execute("DELETE FROM refs WHERE collection = ? AND source = ?", (collection, source))
+            for batch in _batches(own):
+                marks = ", ".join("?" * len(batch))
+                for chunk_id, canonical, document, metadata, signature, numbers in db.execute(
+                        f"SELECT chunk_id, canonical_id, document, metadata, signature, numbers FROM refs "
+                        f"WHERE canonical_id IN ({marks}) ORDER BY rowid", batch):
+                    orphans.setdefault(canonical, []).append({
+                        "chunk_id": chunk_id, "document": document, "metadata": json.loads(metadata),
+                        "signature": signature, "numbers": numbers,
+                    })
+                db.execute(f"DELETE FROM bands WHERE chunk_id IN ({marks})", batch)
+                db.execute(f"DELETE FROM signatures WHERE chunk_id IN ({marks})", batch)
+        return orphans
+
+    def promote(self, collection: str, canonical_id: str, refs: List[Dict]):
+        """Make refs[0] (now stored in the vector store) the canonical chunk of the other refs."""
+        head, rest = refs[0], refs[1:]
+        signature = np.frombuffer(head["signature"], dtype=np.uint32)
+        with self._lock, self.connect() as db:
+            db.execute("DELETE FROM refs WHERE chunk_id = ?", (head["chunk_id"],))
+            db.execute("INSERT INTO signatures VALUES (?, ?, ?, ?, ?)",
+                       (head["chunk_id"], collection, head["metadata"].get("source", "unknown"),
+                        head["signature"], head["numbers"]))
+            db.executemany("INSERT INTO bands VALUES (?, ?, ?, ?)",
+                           [(collection, band, bucket, head["chunk_id"])
+                            for band, bucket in enumerate(self._buckets(signature))])
+            db.executemany("UPDATE refs SET canonical_id = ? WHERE chunk_id = ?",
+                           [(head["chunk_id"], ref["chunk_id"]) for ref in rest])
+
+    def index_stored(self, collection: str, chunks: List[Dict], refs: List[Dict]):
+        """
+        Index chunks added to the vector store without plan() (snapshot import).
+
+        chunks: [{"id", "text", "metadata"}] now stored; refs: [{"chunk_id",
+        "canonical_id", "document", "metadata"}] whose canonical is stored.
+        Signatures are recomputed, so they follow this index's settings.
+        """
+        signature_rows, band_rows, ref_rows = [], [], []
+        for chunk in chunks:
+            signature = self.signature(chunk["text"])
+            signature_rows.append((chunk["id"], collection, chunk["metadata"].get("source", "unknown"),
+                                   signature.tobytes(), _numbers(chunk["text"])))
+            band_rows.extend((collection, band, bucket, chunk["id"])
+                             for band, bucket in enumerate(self._buckets(signature)))
+        for ref in refs:
+            ref_rows.append((ref["chunk_id"], collection, ref["canonical_id"], ref["metadata"].get("source", "unknown"),
+                             ref["document"], json.dumps(ref["metadata"]), self.signature(ref["document"]).tobytes(),
+                             _numbers(ref["document"])))
+        with self._lock, self.connect() as db:
+            for batch in _batches([row[0] for row in signature_rows]):
+                # Re-importing a snapshot must not leave stale bands behind
+                db.execute(f"DELETE FROM bands WHERE chunk_id IN ({', '.join('?' * len(batch))})", batch)
+            db.executemany("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?, ?, ?)", signature_rows)
+            db.executemany("INSERT INTO bands VALUES (?, ?, ?, ?)", band_rows)
+            db.executemany("INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", ref_rows)
+
+    def collection_references(self, collection: str) -> List[Dict]:
+        """Every reference of a collection: [{"chunk_id", "canonical_id", "document", "metadata"}]."""
+        with self.connect() as db:
+            return [{"chunk_id": c, "canonical_id": k, "document": d, "metadata": json.loads(m)}
+                    for c, k, d, m in db.execute(
+                        "SELECT chunk_id, canonical_id, document, metadata FROM refs WHERE collection = ? ORDER BY rowid",
+                        (collection,))]
+
+    def drop_collection(self, collection: str):
+        with self._lock, self.connect() as db:
+            for table in ("signatures", "bands", "refs"):
+                db.execute(f"DELETE FROM {table} WHERE collection = ?", (collection,))
+
+    def stats(self, collection: str) -> List[Dict]:
+        """Per source: chunks stored, duplicates referenced and the dedup ratio."""
+        per_source: Dict[str, Dict] = {}
+        with self.connect() as db:
+            for table, key in (("signatures", "stored"), ("refs", "duplicates")):
+                for source, n in db.execute(
+                        f"SELECT source, COUNT(*) FROM {table} WHERE collection = ? GROUP BY source", (collection,)):
+                    per_source.setdefault(source, {"source": source, "stored": 0, "duplicates": 0})[key] = n
+        for entry in per_source.values():
+            total = entry["stored"] + entry["duplicates"]
+            entry["dedup_ratio"] = round(entry["duplicates"] / total, 4) if total else 0.0
+        return sorted(per_source.values(), key=lambda e: e["source"])
+
+
+@lru_cache()
+def get_dedup_index() -> Optional[DedupIndex]:
+    """Return the process-wide DedupIndex, or None if DEDUP_DB_PATH is unset."""
+    if not settings.DEDUP_DB_PATH:
+        return None
+    # A relative path is kept in the folder of the store it describes, so it is reset with it
+    store_dir = settings.VECTOR_STORE_DIR if settings.VECTOR_BACKEND == "numpy" else settings.CHROMA_DIR
+    return DedupIndex(
+        str(Path(store_dir) / settings.DEDUP_DB_PATH),
+        num_perm=settings.DEDUP_NUM_PERM,
+        bands=settings.DEDUP_BANDS,
+        threshold=settings.DEDUP_THRESHOLD,
+        shingle_words=settings.DEDUP_SHINGLE_WORDS,
+    )
@@ -1,9 +1,21 @@
-import pdfplumber
-import pandas as pd
+import hashlib
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict
 from app.core.config import settings
 
+# Bump whenever extraction output changes (e.g. new pdfplumber options) so
+# cached pages from the old extractor are no longer used.
+EXTRACTOR_VERSION = 1
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
 
 class DocumentService:
     """Service for processing PDF and Excel documents."""
@@ -14,6 +26,8 @@ class DocumentService:
     
     def extract_text_from_pdf(self, file_path: str) -> List[Dict]:
         """Extract text from PDF with page numbers."""
+        import pdfplumber
+        
         chunks = []
         try:
             with pdfplumber.open(file_path) as pdf:
@@ -33,6 +47,8 @@ class DocumentService:
     
     def extract_text_from_excel(self, file_path: str) -> List[Dict]:
         """Extract text from Excel file."""
+        import pandas as pd
+        
         chunks = []
         try:
             excel_file = pd.ExcelFile(file_path)
@@ -56,15 +72,34 @@ class DocumentService:
         return chunks
     
     def process_document(self, file_path: str) -> List[Dict]:
-        """Process document based on file type."""
+        """
+        Process document based on file type.
+        
+        Pages are served from the extraction cache when this file's content
+        was extracted before by the same EXTRACTOR_VERSION.
+        """
         file_ext = Path(file_path).suffix.lower()
+        if file_ext not in (".pdf", ".xlsx", ".xls"):
+            raise ValueError(f"Unsupported file type: {file_ext}")
+        
+        from app.services.extraction_cache import get_extraction_cache
+        cache = get_extraction_cache()
+        digest = file_sha256(file_path) if cache else None
+        if cache:
+            pages = cache.get(digest)
+            if pages is not None:
+                # Same bytes may have been cached under another name
+                source = Path(file_path).name
+                return [{**page, "source": source} for page in pages]
         
         if file_ext == ".pdf":
-            return self.extract_text_from_pdf(file_path)
-        elif file_ext in [".xlsx", ".xls"]:
-            return self.extract_text_from_excel(file_path)
+            pages = self.extract_text_from_pdf(file_path)
         else:
-            raise ValueError(f"Unsupported file type: {file_ext}")
+            pages = self.extract_text_from_excel(file_path)
+        
+        if cache and pages:
+            cache.put(digest, pages)
+        return pages
     
     def save_file(self, content: bytes, filename: str) -> str:
         """Save uploaded file and return path."""
@@ -87,4 +122,7 @@ class DocumentService:
         return str(file_path)
 
 
-document_service = DocumentService()
+@lru_cache()
+def get_document_service() -> DocumentService:
+    """Return the process-wide DocumentService (created on first use)."""
+    return DocumentService()
@@ -1,7 +1,8 @@
-from sentence_transformers import SentenceTransformer
 from app.core.config import settings
-from typing import List
+from functools import lru_cache
+from typing import List, Optional
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -9,17 +10,24 @@ logger = logging.getLogger(__name__)
 class EmbeddingService:
     """Service for generating embeddings using sentence-transformers (free, local)."""
     
-    def __init__(self):
+    def __init__(self, model_name: Optional[str] = None):
         self.model = None  # Lazy initialization
-        self._model_name = getattr(settings, 'EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+        self._load_lock = threading.Lock()  # Warm-up and the document loader may both ask first
+        self._model_name = model_name or getattr(settings, 'EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
     
     def _get_model(self):
         """Lazy initialization of embedding model."""
-        if self.model is None:
+        if self.model is not None:
+            return self.model
+        with self._load_lock:
+            if self.model is not None:
+                return self.model
             # Using all-MiniLM-L6-v2: Fast, good quality, 384 dimensions
             # Downloads automatically on first use (~80MB)
             logger.info(f"Loading embedding model: {self._model_name}")
             try:
+                # Imported here: sentence_transformers pulls in torch (~seconds, hundreds of MB)
+                from sentence_transformers import SentenceTransformer
                 self.model = SentenceTransformer(self._model_name)
                 logger.info(f"✓ Embedding model loaded successfully")
             except Exception as e:
@@ -40,4 +48,28 @@ class EmbeddingService:
         return embeddings.tolist()
 
 
-embedding_service = EmbeddingService()
+def get_embedding_service(model_name: Optional[str] = None) -> EmbeddingService:
+    """
+    Return the process-wide EmbeddingService for a model (created on first use).
+    
+    The default is the model the live index was built with (see
+    get_active_index()), so queries keep matching the stored vectors while a
+    re-index to another model is running. With VECTOR_SERVICE_URL set,
+    embeddings come from the shared sidecar instead of a model loaded in this
+    process.
+    """
+    if settings.VECTOR_SERVICE_URL:
+        return _remote_embedding_service()
+    from app.core.database import get_active_index
+    return _embedding_service(model_name or get_active_index()["embedding_model"])
+
+
+@lru_cache()
+def _embedding_service(model_name: str) -> EmbeddingService:
+    return EmbeddingService(model_name)
+
+
+@lru_cache()
+def _remote_embedding_service():
+    from app.services.vector_client import RemoteEmbeddingService
+    return RemoteEmbeddingService()
@@ -0,0 +1,122 @@
+"""
+On-disk cache of extracted document pages.
+
+Text extraction (pdfplumber, pandas) is the slowest stage of ingestion, and its
+output only depends on the file's bytes and on the extractor code. Entries are
+keyed by the sha256 of the file plus EXTRACTOR_VERSION and stored as
+zlib-compressed JSON, so re-chunking or re-embedding the corpus (new
+CHUNK_SIZE, new EMBEDDING_MODEL) starts from cached text:
+
+    extraction_cache/ab/ab12...ef-v1.json.z
+
+Hits refresh the entry's mtime; when the cache grows past
+EXTRACTION_CACHE_MAX_MB the least recently used entries are removed.
+Manage it with `python -m scripts.extraction_cache {warm,prune,stats,clear}`.
+"""
+import json
+import logging
+import os
+import threading
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ENTRY_SUFFIX = ".json.z"
+
+
+class ExtractionCache:
+    """Content-addressed, size-bounded store of per-page extraction output."""
+
+    def __init__(self, path: str, max_bytes: int, extractor_version: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.extractor_version = extractor_version
+        self._lock = threading.Lock()
+
+    def _entry(self, digest: str) -> Path:
+        return self.path / digest[:2] / f"{digest}-v{self.extractor_version}{ENTRY_SUFFIX}"
+
+    def get(self, digest: str) -> Optional[List[Dict]]:
+        entry = self._entry(digest)
+        try:
+            pages = json.loads(zlib.decompress(entry.read_bytes()))
+        except FileNotFoundError:
+            metrics.inc("extraction_cache_total", result="miss")
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"Dropping unreadable extraction cache entry {entry.name}: {e}")
+            entry.unlink(missing_ok=True)
+            metrics.inc("extraction_cache_total", result="miss")
+            return None
+        os.utime(entry)  # LRU order for eviction
+        metrics.inc("extraction_cache_total", result="hit")
+        return pages
+
+    def put(self, digest: str, pages: List[Dict]):
+        entry = self._entry(digest)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        data = zlib.compress(json.dumps(pages, ensure_ascii=False).encode("utf-8"), 6)
+        tmp = entry.with_name(f"{entry.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, entry)
+        self.prune()
+
+    def entries(self) -> List[Tuple[Path, os.stat_result]]:
+        return [(p, p.stat()) for p in self.path.glob(f"*/*{ENTRY_SUFFIX}")] if self.path.exists() else []
+
+    def stats(self) -> Dict:
+        entries = self.entries()
+        current = [p for p, _ in entries if p.name.endswith(f"-v{self.extractor_version}{ENTRY_SUFFIX}")]
+        return {
+            "path": str(self.path),
+            "entries": len(entries),
+            "current_version_entries": len(current),
+            "bytes": sum(s.st_size for _, s in entries),
+            "max_bytes": self.max_bytes,
+            "extractor_version": self.extractor_version,
+        }
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """Drop entries of old extractor versions, then LRU entries over budget; returns removed count."""
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        removed = 0
+        with self._lock:
+            entries = []
+            for path, stat in self.entries():
+                if not path.name.endswith(f"-v{self.extractor_version}{ENTRY_SUFFIX}"):
+                    path.unlink(missing_ok=True)
+                    removed += 1
+                else:
+                    entries.append((path, stat))
+            total = sum(s.st_size for _, s in entries)
+            for path, stat in sorted(entries, key=lambda e: e[1].st_mtime):
+                if total <= budget:
+                    break
+                path.unlink(missing_ok=True)
+                total -= stat.st_size
+                removed += 1
+        if removed:
+            metrics.inc("extraction_cache_evictions_total", removed)
+        metrics.set("extraction_cache_bytes", total)
+        return removed
+
+    def clear(self) -> int:
+        return self.prune(max_bytes=0)
+
+
+@lru_cache()
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Return the process-wide ExtractionCache, or None if EXTRACTION_CACHE_DIR is unset."""
+    if not settings.EXTRACTION_CACHE_DIR:
+        return None
+    from app.services.documents import EXTRACTOR_VERSION
+    return ExtractionCache(
+        settings.EXTRACTION_CACHE_DIR,
+        max_bytes=settings.EXTRACTION_CACHE_MAX_MB * 1024 * 1024,
+        extractor_version=EXTRACTOR_VERSION,
+    )
@@ -0,0 +1,156 @@
+"""
+Speculative retrieval while the user is typing (POST /chat/prefetch).
+
+The frontend sends the partial question, debounced. RAGService.prefetch
+embeds it and runs the vector search, and PrefetchCache keeps the result
+(query embedding, contexts, citations) per user for PREFETCH_TTL_SECONDS,
+at most PREFETCH_MAX_PER_USER entries each. When the question is sent,
+RAGService takes an entry whose normalised text is close enough to it
+(difflib ratio >= PREFETCH_MATCH_RATIO), for the same top_k, corpus version
+and collection, and goes straight to generation.
+
+Metrics:
+    prefetch_requests_total{result}   computed, cached (an entry already matches), skipped, busy, failed
+    prefetch_lookups_total{result}    hit / miss at query time; gauge prefetch_hit_ratio
+    prefetch_saved_ms_total           retrieval time skipped by hits
+    prefetch_wasted_total             entries dropped unused (expired, replaced, stale corpus);
+    prefetch_wasted_ms_total          with their retrieval time; gauge prefetch_waste_ratio
+"""
+import difflib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class Prefetch:
+    """One speculative retrieval."""
+
+    def __init__(self, query: str, top_k: int, version: int, collection: str,
+                 embedding: List[float], contexts: List[str], citations: List[Dict], ms: float):
+        self.query = query  # Normalised text (RAGService.normalize_query)
+        self.top_k = top_k
+        self.version = version
+        self.collection = collection
+        self.embedding = embedding
+        self.contexts = contexts
+        self.citations = citations
+        self.ms = ms  # Embedding + search time, saved by a hit or wasted
+        self.created_at = time.monotonic()
+        self.used = False
+
+    def matches(self, query: str, top_k: int, version: int, collection: str, ratio: float) -> float:
+        """Similarity to `query` if the entry can serve it, else 0."""
+        if (top_k, version, collection) != (self.top_k, self.version, self.collection):
+            return 0.0
+        if query == self.query:
+            return 1.0
+        similarity = difflib.SequenceMatcher(None, self.query, query).ratio()
+        return similarity if similarity >= ratio else 0.0
+
+
+class PrefetchCache:
+    """Short-lived per-user prefetches, LRU-bounded by user count."""
+
+    def __init__(self, ttl_seconds: float, max_per_user: int, max_users: int, match_ratio: float):
+        self.ttl_seconds = ttl_seconds
+        self.max_per_user = max_per_user
+        self.max_users = max_users
+        self.match_ratio = match_ratio
+        self._entries: "OrderedDict[int, List[Prefetch]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._computed = self._wasted = self._hits = self._lookups = 0
+        self._last_sweep = 0.0
+
+    def covers(self, user_id: int, query: str, top_k: int, version: int, collection: str) -> bool:
+        """Whether a fresh entry already matches `query` (no need to prefetch again)."""
+        with self._lock:
+            return self._best_locked(user_id, query, top_k, version, collection) is not None
+
+    def put(self, user_id: int, entry: Prefetch):
+        with self._lock:
+            entries = self._entries.pop(user_id, [])
+            entries.append(entry)
+            while len(entries) > self.max_per_user:
+                self._drop_locked(entries.pop(0))
+            self._entries[user_id] = entries
+            while len(self._entries) > self.max_users:
+                for old in self._entries.popitem(last=False)[1]:
+                    self._drop_locked(old)
+            self._computed += 1
+            self._sweep_locked()
+            self._update_gauges_locked()
+
+    def take(self, user_id: Optional[int], query: str, top_k: int, version: int, collection: str) -> Optional[Prefetch]:
+        """The best entry for the real question, counted as a hit or a miss."""
+        if user_id is None:
+            return None
+        with self._lock:
+            entry = self._best_locked(user_id, query, top_k, version, collection)
+            self._lookups += 1
+            if entry is not None:
+                self._hits += 1
+                if not entry.used:
+                    entry.used = True
+                    metrics.inc("prefetch_saved_ms_total", round(entry.ms, 1))
+            self._update_gauges_locked()
+        metrics.inc("prefetch_lookups_total", result="hit" if entry else "miss")
+        return entry
+
+    def _best_locked(self, user_id: int, query: str, top_k: int, version: int, collection: str) -> Optional[Prefetch]:
+        entries = self._entries.get(user_id)
+        if not entries:
+            return None
+        self._expire_locked(entries)
+        best, best_score = None, 0.0
+        for entry in entries:
+            score = entry.matches(query, top_k, version, collection, self.match_ratio)
+            if score > best_score:
+                best, best_score = entry, score
+        return best
+
+    def _expire_locked(self, entries: List[Prefetch]):
+        cutoff = time.monotonic() - self.ttl_seconds
+        for entry in [e for e in entries if e.created_at < cutoff]:
+            entries.remove(entry)
+            self._drop_locked(entry)
+
+    def _sweep_locked(self):
+        # Users who stopped typing keep their entries until this runs (at most once a second)
+        now = time.monotonic()
+        if now - self._last_sweep < 1.0:
+            return
+        self._last_sweep = now
+        for user_id in list(self._entries):
+            self._expire_locked(self._entries[user_id])
+            if not self._entries[user_id]:
+                del self._entries[user_id]
+
+    def _drop_locked(self, entry: Prefetch):
+        if not entry.used:
+            self._wasted += 1
+            metrics.inc("prefetch_wasted_total")
+            metrics.inc("prefetch_wasted_ms_total", round(entry.ms, 1))
+
+    def _update_gauges_locked(self):
+        metrics.set("prefetch_entries", sum(len(e) for e in self._entries.values()))
+        if self._lookups:
+            metrics.set("prefetch_hit_ratio", round(self._hits / self._lookups, 3))
+        if self._computed:
+            metrics.set("prefetch_waste_ratio", round(self._wasted / self._computed, 3))
+
+
+@lru_cache()
+def get_prefetch_cache() -> Optional[PrefetchCache]:
+    """Return the process-wide PrefetchCache (None if PREFETCH_ENABLED is false)."""
+    if not settings.PREFETCH_ENABLED:
+        return None
+    return PrefetchCache(
+        ttl_seconds=settings.PREFETCH_TTL_SECONDS,
+        max_per_user=settings.PREFETCH_MAX_PER_USER,
+        max_users=settings.PREFETCH_MAX_USERS,
+        match_ratio=settings.PREFETCH_MATCH_RATIO,
+    )
@@ -1,31 +1,87 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.chat_models import ChatOllama
-from langchain.prompts import ChatPromptTemplate
+from functools import lru_cache
 from typing import List, Dict, Optional
-from app.core.database import get_collection
-from app.services.embeddings import embedding_service
-from app.services.documents import document_service
+from app.core.database import get_active_index, get_vector_store
+from app.services.embeddings import get_embedding_service
+from app.services.documents import get_document_service
+from app.services.chunking import LegalTextChunker
+from app.services.corpus import get_corpus_version
+from app.services.deadline import (
+    MODE_EXTRACTIVE, MODE_FULL, MODE_TRUNCATED, admission_deadline, can_generate, extractive_answer, remaining,
+)
+from app.services.prefetch import Prefetch, get_prefetch_cache
+from app.services.sessions import ChatSession
+from app.services.singleflight import SingleFlight
+from app.services.tables import get_table_query_engine, get_table_store
+from app.services.admission import AdmissionRejected, PRIORITY_INTERACTIVE, get_admission_controller
 from app.core.config import settings
+from app.core.metrics import metrics, retrieval_latency
+from app.core.profiling import stage
 import uuid
+import json
 import logging
+import re
+import socket
+import threading
+import time
 import requests
 
 logger = logging.getLogger(__name__)
 
+RAG_SYSTEM_PROMPT = """You are an expert AI assistant specializing in cybersecurity compliance and insider risk evaluation for cooperatives in Nepal. 
+You analyze regulations and cybersecurity frameworks to provide accurate, explainable guidance.
+
+Use the provided context documents to answer questions. Always be specific and cite information from the context.
+If the context doesn't contain enough information, say so clearly. Be precise and professional."""
+
+RAG_HUMAN_PROMPT = """Context from uploaded documents:
+{context}
+
+User Question: {question}
+
+Provide a comprehensive answer based on the context above. Be specific and reference the relevant information."""
+
+BASIC_SYSTEM_PROMPT = """You are Sahakari Bot, a helpful AI assistant specializing in cybersecurity compliance and insider risk evaluation for cooperatives in Nepal. 
+You provide friendly, professional assistance. If asked about compliance or regulations, mention that you can provide more detailed answers once documents are uploaded."""
+
+_QUERY_NOISE_RE = re.compile(r"[\s?!.]+")
+
+NO_CONTEXT_ANSWER = "I couldn't find relevant information in the uploaded documents to answer your question. Please try rephrasing or upload more documents."
+
+
+def _cut_stream(response: requests.Response):
+    """Interrupt a streaming read from another thread (closing the response does not wake it)."""
+    sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+    if sock is None:
+        response.close()
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
 
 class RAGService:
     """Service for RAG operations."""
     
     def __init__(self):
-        self.collection = get_collection()
         self.llm = None  # Will be initialized lazily on first use
         self._model_name = getattr(settings, 'OLLAMA_MODEL', None)  # None means auto-detect
+        self._resolved_model = None
         self._base_url = getattr(settings, 'OLLAMA_BASE_URL', 'http://localhost:11434')
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
+        self.chunker = LegalTextChunker(
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP,
         )
+        self._inflight = SingleFlight("rag_query")
+        # Held for every write to the live collection, so a re-index can
+        # catch up and swap collections without losing a concurrent upload.
+        self.write_lock = threading.RLock()
+        self._prefetch_slots = threading.BoundedSemaphore(settings.PREFETCH_MAX_CONCURRENT)
+    
+    @property
+    def collection(self):
+        """The live vector store collection (follows re-index swaps)."""
+        return get_vector_store()
     
     def _check_ollama_connection(self) -> bool:
         """Check if Ollama is running and accessible."""
@@ -93,14 +149,21 @@ class RAGService:
         logger.info(f"Using first available model: {selected}")
         return selected
     
+    def _get_model_name(self) -> str:
+        """Detected Ollama model name (detection runs once)."""
+        if self._resolved_model is None:
+            self._resolved_model = self._detect_model()
+        return self._resolved_model
+    
     def _get_llm(self):
         """Lazy initialization of Ollama LLM with auto-detection."""
         if self.llm is None:
             try:
                 # Auto-detect model if not specified or if specified model not available
-                model_name = self._detect_model()
+                model_name = self._get_model_name()
                 
                 logger.info(f"Initializing Ollama with model: {model_name}")
+                from langchain_community.chat_models import ChatOllama
                 self.llm = ChatOllama(
                     model=model_name,
                     temperature=0.7,
@@ -123,180 +186,664 @@ class RAGService:
                 raise
         return self.llm
     
+    def split_document(self, document_chunks: List[Dict],
+                       chunker: Optional[LegalTextChunker] = None) -> List[Dict]:
+        """
+        Split extracted pages into section-aware chunks.
+
+        PDF pages are chunked as one continuous text so sections that cross a
+        page break stay together; Excel sheets are chunked independently.
+        """
+        chunker = chunker or self.chunker
+        if document_chunks and document_chunks[0]["type"] == "excel":
+            return [c for sheet in document_chunks for c in chunker.split_pages([sheet])]
+        return chunker.split_pages(document_chunks)
+    
     def ingest_document(self, file_path: str) -> Dict:
         """Process and ingest document into vector database."""
-        # Extract text from document
-        document_chunks = document_service.process_document(file_path)
+        with stage("ingest"):
+            return self._ingest_document(file_path)
+    
+    def _ingest_document(self, file_path: str) -> Dict:
+        all_texts, all_metadatas = self.prepare_document(file_path)
+        return self.store_document(file_path, all_texts, all_metadatas)
+    
+    def store_document(self, file_path: str, all_texts: List[str], all_metadatas: List[Dict],
+                       embeddings: Optional[Dict[int, List[float]]] = None) -> Dict:
+        """
+        Dedup, embed and add a prepared document (see prepare_document).
         
-        all_texts = []
-        all_metadatas = []
-        all_ids = []
+        `embeddings` holds vectors already computed elsewhere, by chunk index
+        (bulk ingestion embeds in worker processes); missing ones are embedded here.
+        """
+        from app.services.dedup import get_dedup_index
         
-        for chunk in document_chunks:
-            # Split into smaller chunks
-            texts = self.text_splitter.split_text(chunk["text"])
+        embeddings = dict(embeddings or {})
+        dedup = get_dedup_index()
+        
+        for _ in range(3):
+            # Near-duplicates of stored chunks become references instead of being embedded
+            plan = None
+            if dedup:
+                with stage("dedup"):
+                    plan = dedup.plan(get_active_index()["collection"], all_texts, self.collection)
+            all_ids = plan.ids if plan else [str(uuid.uuid4()) for _ in all_texts]
+            unique = plan.unique if plan else list(range(len(all_texts)))
+            
+            # Generate embeddings
+            missing = [i for i in unique if i not in embeddings]
+            if missing:
+                with stage("embed"):
+                    vectors = get_embedding_service().embed_documents([all_texts[i] for i in missing])
+                embeddings.update(zip(missing, vectors))
             
-            for i, text in enumerate(texts):
-                if text.strip():  # Only add non-empty chunks
-                    chunk_id = str(uuid.uuid4())
-                    all_texts.append(text)
-                    all_metadatas.append({
-                        "source": chunk["source"],
-                        "page": str(chunk["page"]),
-                        "type": chunk["type"],
-                        "chunk_index": str(i)
-                    })
-                    all_ids.append(chunk_id)
+            # Add to the vector store
+            with stage("store"), self.write_lock:
+                if plan and (plan.collection != get_active_index()["collection"] or not dedup.is_current(plan, self.collection)):
+                    continue  # A re-index swap or a delete changed what the plan refers to
+                if unique:
+                    self.collection.add(
+                        embeddings=[embeddings[i] for i in unique],
+                        documents=[all_texts[i] for i in unique],
+                        metadatas=[all_metadatas[i] for i in unique],
+                        ids=[all_ids[i] for i in unique]
+                    )
+                if plan:
+                    dedup.commit(plan, all_texts, all_metadatas)
+            break
+        else:
+            raise RuntimeError("Index kept changing during ingestion; try again")
         
-        if not all_texts:
-            raise ValueError("No text extracted from document")
+        duplicates = plan.duplicates if plan else 0
+        metrics.inc("dedup_chunks_total", len(unique), result="stored")
+        metrics.inc("dedup_chunks_total", duplicates, result="duplicate")
+        if duplicates:
+            logger.info(f"{all_metadatas[0]['source']}: {duplicates}/{len(all_texts)} chunks are near-duplicates")
         
-        # Generate embeddings
-        embeddings = embedding_service.embed_documents(all_texts)
+        tables = get_table_store()
+        if tables and all_metadatas[0]["type"] == "excel":
+            with stage("tables"):
+                tables.ingest_excel(file_path)
         
-        # Add to ChromaDB
-        self.collection.add(
-            embeddings=embeddings,
-            documents=all_texts,
-            metadatas=all_metadatas,
-            ids=all_ids
-        )
+        get_corpus_version().bump("ingest")
         
         return {
             "status": "success",
             "chunks_ingested": len(all_texts),
-            "source": document_chunks[0]["source"] if document_chunks else "unknown"
+            "chunks_stored": len(unique),
+            "chunks_deduplicated": duplicates,
+            "dedup_ratio": plan.ratio if plan else 0.0,
+            "source": all_metadatas[0]["source"]
         }
     
-    def query(self, user_query: str, top_k: int = 5) -> Dict:
-        """Query RAG system and generate response."""
-        # Check if collection has documents
-        collection_count = self.collection.count()
+    def prepare_document(self, file_path: str, chunker: Optional[LegalTextChunker] = None):
+        """Extract and chunk a document; returns (texts, metadatas) ready to embed."""
+        # Extract text from document
+        with stage("extract"):
+            document_chunks = get_document_service().process_document(file_path)
+        with stage("chunk"):
+            chunks = self.split_document(document_chunks, chunker)
         
-        # If no documents, use basic chat mode (Ollama only)
-        if collection_count == 0:
-            return self._basic_chat(user_query)
+        all_texts = []
+        all_metadatas = []
+        for i, chunk in enumerate(chunks):
+            all_texts.append(chunk["text"])
+            all_metadatas.append({
+                "source": chunk["source"],
+                "page": chunk["page"],
+                "page_start": chunk["page_start"],
+                "page_end": chunk["page_end"],
+                "section": chunk["section"],
+                "chapter": chunk["chapter"],
+                "type": chunk["type"],
+                "chunk_index": str(i)
+            })
         
-        # Generate query embedding
-        query_embedding = embedding_service.embed_text(user_query)
+        if not all_texts:
+            raise ValueError("No text extracted from document")
+        return all_texts, all_metadatas
+    
+    def remove_source_chunks(self, store, collection_name: str, source: str) -> int:
+        """
+        Delete a source's stored and deduplicated chunks; returns how many.
         
-        # Search in ChromaDB
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=min(top_k, collection_count)
-        )
+        Stored chunks that other sources' duplicates refer to are replaced by
+        one of those duplicates (re-using the embedding). Call with write_lock held.
+        """
+        from app.services.dedup import get_dedup_index
+        
+        chunks = len(store.get(where={"source": source}, include=[])["ids"])
+        dedup = get_dedup_index()
+        if dedup:
+            chunks += dedup.count_source(collection_name, source)
+            orphans = dedup.remove_source(collection_name, source)
+            if orphans:
+                stored = store.get(ids=list(orphans), include=["embeddings"])
+                for canonical_id, embedding in zip(stored["ids"], stored["embeddings"]):
+                    head = orphans[canonical_id][0]
+                    store.add(
+                        ids=[head["chunk_id"]],
+                        documents=[head["document"]],
+                        metadatas=[head["metadata"]],
+                        embeddings=[list(embedding)]
+                    )
+                    dedup.promote(collection_name, canonical_id, orphans[canonical_id])
+        if chunks:
+            store.delete(where={"source": source})
+        return chunks
+    
+    @staticmethod
+    def _citation(doc: str, metadata: Dict, distance: Optional[float]) -> Dict:
+        return {
+            "source": metadata.get("source", "Unknown"),
+            "page": metadata.get("page", "N/A"),
+            "section": metadata.get("section") or None,
+            "excerpt": doc[:200] + "..." if len(doc) > 200 else doc,
+            "relevance_score": round(1 - distance, 3) if distance is not None else None
+        }
+    
+    def _retrieve(self, query_embedding: List[float], top_k: int, collection_count: int):
+        """Vector search; returns (contexts, citations)."""
+        with stage("vector_search"):
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=min(top_k, collection_count)
+            )
         
-        # Extract relevant context
         contexts = []
         citations = []
         
         if results["documents"] and len(results["documents"][0]) > 0:
+            # Near-duplicates stored as references are cited with the chunk they duplicate
+            from app.services.dedup import get_dedup_index
+            dedup = get_dedup_index()
+            references = dedup.references(get_active_index()["collection"], results["ids"][0]) if dedup else {}
+            
             for i, doc in enumerate(results["documents"][0]):
                 metadata = results["metadatas"][0][i]
                 distance = results["distances"][0][i] if "distances" in results else None
                 
                 contexts.append(doc)
-                citations.append({
-                    "source": metadata.get("source", "Unknown"),
-                    "page": metadata.get("page", "N/A"),
-                    "excerpt": doc[:200] + "..." if len(doc) > 200 else doc,
-                    "relevance_score": round(1 - distance, 3) if distance else None
-                })
+                citations.append(self._citation(doc, metadata, distance))
+                for ref in references.get(results["ids"][0][i], [])[:settings.DEDUP_MAX_REF_CITATIONS]:
+                    citations.append(self._citation(ref["document"], ref["metadata"], distance))
+        
+        return contexts, citations
+    
+    @staticmethod
+    def _context_text(contexts: List[str]) -> str:
+        return "\n\n".join([f"Context {i+1}:\n{ctx}" for i, ctx in enumerate(contexts)])
+    
+    @staticmethod
+    def _error_answer(e: Exception) -> str:
+        """User-facing message for an Ollama failure."""
+        if isinstance(e, ConnectionError):
+            logger.error(f"Ollama connection error: {e}")
+            return f"❌ Cannot connect to Ollama. Please make sure Ollama is running:\n\n1. Open a terminal and run: ollama serve\n2. Keep that terminal open\n3. Try your question again"
+        if isinstance(e, ValueError):
+            logger.error(f"Ollama model error: {e}")
+            return f"❌ Model error: {str(e)}\n\nPlease download a model:\n  ollama pull llama3\n  or\n  ollama pull mistral"
+        logger.error(f"Error generating response from Ollama: {e}")
+        return f"I apologize, but I encountered an error: {str(e)}\n\nPlease check:\n1. Ollama is running: 'ollama serve'\n2. You have a model: 'ollama list'\n3. If not, download one: 'ollama pull llama3'"
+    
+    @staticmethod
+    def normalize_query(user_query: str) -> str:
+        """Case/whitespace/punctuation-insensitive form used to detect identical questions."""
+        return _QUERY_NOISE_RE.sub(" ", user_query.lower()).strip()
+    
+    def query(self, user_query: str, top_k: int = 5, priority: str = PRIORITY_INTERACTIVE,
+              deadline: Optional[float] = None, user_id: Optional[int] = None) -> Dict:
+        """
+        Query RAG system and generate response.
+        
+        Identical questions (same normalised text, top_k and corpus version)
+        that arrive while one is already being answered wait for that answer
+        instead of repeating the embedding, search and generation. The shared
+        result must not be mutated by callers.
+        
+        deadline is an absolute time.monotonic(): the answer is degraded
+        (result "mode", see app/services/deadline.py) rather than sent late.
+        Only questions with the same budget and priority are coalesced, so a
+        waiter never gets an answer after its own deadline and an interactive
+        question never waits in a batch request's place in the LLM queue.
+        AdmissionRejected is raised
+        when the LLM queue is full. With user_id, a matching retrieval
+        prefetched for that user is used.
+        """
+        budget = None if deadline is None else round(deadline - time.monotonic())
+        key = (self.normalize_query(user_query), top_k, get_corpus_version().current(), budget, priority)
+        with stage("query"):
+            return self._inflight.do(key, lambda: self._query(user_query, top_k, priority, deadline, user_id))
+    
+    def prefetch(self, user_id: int, partial_query: str, top_k: int = 5) -> str:
+        """
+        Embed and retrieve for a partial question ahead of /chat/query (see app/services/prefetch.py).
+        
+        Returns the outcome: computed, cached, skipped, busy, failed or disabled.
+        """
+        cache = get_prefetch_cache()
+        if cache is None:
+            return "disabled"
+        result = self._prefetch(cache, user_id, partial_query, top_k)
+        metrics.inc("prefetch_requests_total", result=result)
+        return result
+    
+    def _prefetch(self, cache, user_id: int, partial_query: str, top_k: int) -> str:
+        query = self.normalize_query(partial_query)
+        if len(query) < settings.PREFETCH_MIN_CHARS:
+            return "skipped"
+        version, collection = get_corpus_version().current(), get_active_index()["collection"]
+        if cache.covers(user_id, query, top_k, version, collection):
+            return "cached"
+        # Speculative work must never queue up behind (or slow down) real questions
+        if not self._prefetch_slots.acquire(blocking=False):
+            return "busy"
+        try:
+            collection_count = self.collection.count()
+            if collection_count == 0:
+                return "skipped"
+            started = time.perf_counter()
+            with stage("embed_query"):
+                embedding = get_embedding_service().embed_text(partial_query)
+            contexts, citations = self._retrieve(embedding, top_k, collection_count)
+            ms = (time.perf_counter() - started) * 1000
+        except Exception as e:
+            logger.debug(f"Prefetch failed: {e}")
+            return "failed"
+        finally:
+            self._prefetch_slots.release()
+        cache.put(user_id, Prefetch(query, top_k, version, collection, embedding, contexts, citations, ms))
+        return "computed"
+    
+    def _prefetched(self, user_id: Optional[int], user_query: str, top_k: int) -> Optional[Prefetch]:
+        """The user's prefetched retrieval for this question, if any."""
+        cache = get_prefetch_cache()
+        if cache is None or user_id is None:
+            return None
+        return cache.take(user_id, self.normalize_query(user_query), top_k,
+                          get_corpus_version().current(), get_active_index()["collection"])
+    
+    def _answer_from_tables(self, user_query: str) -> Optional[Dict]:
+        """Exact answer from the Excel tables, or None to use retrieval + LLM."""
+        engine = get_table_query_engine()
+        if engine is None:
+            return None
+        with stage("table_query"):
+            try:
+                result = engine.answer(user_query)
+            except Exception as e:
+                logger.warning(f"Table query failed, falling back to retrieval: {e}")
+                result = None
+        if result is None:
+            metrics.inc("table_query_total", result="fallback")
+        return result
+    
+    def _use_table_answer(self, table_answer: Dict, query_embedding: Optional[List[float]],
+                          citations: Optional[List[Dict]]) -> bool:
+        """
+        Whether retrieval agrees that the question is about the answering sheet.
+        
+        The best chunk of the sheet's source (searched on its own, so it need
+        not be in top_k) must be within TABLE_RETRIEVAL_MARGIN of the top
+        retrieved relevance; otherwise a document (an Act) matches better and
+        the question goes to retrieval + LLM. Without a retrieval (citations
+        None: empty vector store) the table answer stands.
+        """
+        if citations:
+            source = table_answer["citations"][0]["source"]
+            top = max(c["relevance_score"] or 0.0 for c in citations)
+            with stage("table_check"):
+                own = self.collection.query(query_embeddings=[query_embedding], n_results=1, where={"source": source})
+            distances = own.get("distances") or [[]]
+            if not distances[0] or 1 - distances[0][0] < top - settings.TABLE_RETRIEVAL_MARGIN:
+                metrics.inc("table_query_total", result="outranked")
+                return False
+        metrics.inc("table_query_total", result="answered")
+        return True
+    
+    def _query(self, user_query: str, top_k: int, priority: str, deadline: Optional[float],
+               user_id: Optional[int] = None) -> Dict:
+        """Retrieve context and generate an answer (no coalescing)."""
+        table_answer = self._answer_from_tables(user_query)
+        
+        # Check if collection has documents
+        collection_count = self.collection.count()
+        
+        # If no documents, use basic chat mode (Ollama only)
+        if collection_count == 0:
+            if table_answer is not None and self._use_table_answer(table_answer, None, None):
+                return table_answer
+            return self._basic_chat(user_query, priority, deadline)
+        
+        prefetched = self._prefetched(user_id, user_query, top_k)
+        if prefetched is not None:
+            # Retrieved while the user was typing: straight to generation
+            query_embedding = prefetched.embedding
+            contexts, citations = prefetched.contexts, prefetched.citations
+        else:
+            # Generate query embedding
+            started = time.perf_counter()
+            with stage("embed_query"):
+                query_embedding = get_embedding_service().embed_text(user_query)
+            
+            # Search in the vector store
+            contexts, citations = self._retrieve(query_embedding, top_k, collection_count)
+            retrieval_latency.observe((time.perf_counter() - started) * 1000)
+        
+        if table_answer is not None and self._use_table_answer(table_answer, query_embedding, citations):
+            return table_answer
         
         if not contexts:
             return {
-                "answer": "I couldn't find relevant information in the uploaded documents to answer your question. Please try rephrasing or upload more documents.",
+                "answer": NO_CONTEXT_ANSWER,
                 "citations": [],
-                "sources_count": 0
+                "sources_count": 0,
+                "mode": MODE_FULL
             }
         
-        # Create prompt with context
-        context_text = "\n\n".join([f"Context {i+1}:\n{ctx}" for i, ctx in enumerate(contexts)])
-        
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert AI assistant specializing in cybersecurity compliance and insider risk evaluation for cooperatives in Nepal. 
-You analyze regulations and cybersecurity frameworks to provide accurate, explainable guidance.
-
-Use the provided context documents to answer questions. Always be specific and cite information from the context.
-If the context doesn't contain enough information, say so clearly. Be precise and professional."""),
-            ("human", """Context from uploaded documents:
-{context}
-
-User Question: {question}
-
-Provide a comprehensive answer based on the context above. Be specific and reference the relevant information.""")
-        ])
+        # Not worth queueing for the LLM if the answer could not be generated in time
+        if not can_generate(deadline, priority):
+            return self._extractive(user_query, contexts, citations, "budget")
         
-        # Generate response using Ollama
-        # ChatOllama works with ChatPromptTemplate directly
+        messages = [
+            {"role": "system", "content": RAG_SYSTEM_PROMPT},
+            {"role": "user", "content": RAG_HUMAN_PROMPT.format(context=self._context_text(contexts), question=user_query)}
+        ]
         try:
-            messages = prompt_template.format_messages(
-                context=context_text,
-                question=user_query
-            )
-            
-            llm = self._get_llm()  # Lazy initialization
-            response = llm.invoke(messages)
-            # ChatOllama returns AIMessage object with content attribute
-            answer = response.content if hasattr(response, 'content') else str(response)
-        except ConnectionError as e:
-            logger.error(f"Ollama connection error: {e}")
-            answer = f"❌ Cannot connect to Ollama. Please make sure Ollama is running:\n\n1. Open a terminal and run: ollama serve\n2. Keep that terminal open\n3. Try your question again"
-        except ValueError as e:
-            logger.error(f"Ollama model error: {e}")
-            answer = f"❌ Model error: {str(e)}\n\nPlease download a model:\n  ollama pull llama3\n  or\n  ollama pull mistral"
+            answer, complete = self._generate_until(messages, priority, deadline)
+        except AdmissionRejected as e:
+            if e.reason == "queue_full":
+                raise
+            return self._extractive(user_query, contexts, citations, "admission")
         except Exception as e:
             logger.error(f"Error generating response from Ollama: {e}")
-            answer = f"I apologize, but I encountered an error: {str(e)}\n\nPlease check:\n1. Ollama is running: 'ollama serve'\n2. You have a model: 'ollama list'\n3. If not, download one: 'ollama pull llama3'"
+            return self._extractive(user_query, contexts, citations, "llm_error")
+        if not complete and not answer.strip():
+            return self._extractive(user_query, contexts, citations, "budget")
         
         return {
             "answer": answer,
             "citations": citations,
-            "sources_count": len(citations)
+            "sources_count": len(citations),
+            "mode": MODE_FULL if complete else MODE_TRUNCATED
         }
     
-    def _basic_chat(self, user_query: str) -> Dict:
+    @staticmethod
+    def _extractive(user_query: str, contexts: List[str], citations: List[Dict], reason: str) -> Dict:
+        """Degraded answer without the LLM: ranked citations and matching context sentences."""
+        with stage("extractive"):
+            answer = extractive_answer(user_query, contexts, reason)
+        return {
+            "answer": answer,
+            "citations": citations,
+            "sources_count": len(citations),
+            "mode": MODE_EXTRACTIVE
+        }
+    
+    def _basic_chat(self, user_query: str, priority: str = PRIORITY_INTERACTIVE,
+                    deadline: Optional[float] = None) -> Dict:
         """Basic chat mode when no documents are available - uses Ollama directly."""
         try:
-            llm = self._get_llm()  # Lazy initialization
+            from langchain.prompts import ChatPromptTemplate
             
             # Create a simple prompt for general chat
             prompt_template = ChatPromptTemplate.from_messages([
-                ("system", """You are Sahakari Bot, a helpful AI assistant specializing in cybersecurity compliance and insider risk evaluation for cooperatives in Nepal. 
-You provide friendly, professional assistance. If asked about compliance or regulations, mention that you can provide more detailed answers once documents are uploaded."""),
+                ("system", BASIC_SYSTEM_PROMPT),
                 ("human", "{question}")
             ])
             
             messages = prompt_template.format_messages(question=user_query)
-            response = llm.invoke(messages)
+            response = self._invoke_llm(messages, priority, deadline)
             answer = response.content if hasattr(response, 'content') else str(response)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            answer = self._error_answer(e)
+        
+        return {
+            "answer": answer,
+            "citations": [],
+            "sources_count": 0
+        }
+    
+    def query_session(self, session: ChatSession, user_query: str, top_k: int = 5,
+                      priority: str = PRIORITY_INTERACTIVE, deadline: Optional[float] = None) -> Dict:
+        """
+        Answer one turn of a multi-turn chat session.
+        
+        Follow-ups on the same topic reuse the session's last retrieval, and
+        Ollama's returned context is passed back so the system prompt and
+        earlier turns are not prefilled again.
+        """
+        with stage("query_session"), session.lock:
+            table_answer = self._answer_from_tables(user_query)
+            collection_count = self.collection.count()
+            query_embedding = None
+            reused = False
+            contexts, citations = [], []
+            
+            if collection_count > 0:
+                prefetched = self._prefetched(session.user_id, user_query, top_k)
+                started = time.perf_counter()
+                if prefetched is not None:
+                    query_embedding = prefetched.embedding
+                else:
+                    with stage("embed_query"):
+                        query_embedding = get_embedding_service().embed_text(user_query)
+                retrieved = None
+                if prefetched is not None:
+                    retrieved = prefetched.contexts, prefetched.citations
+                elif table_answer is not None:
+                    # A table answer is checked against a fresh retrieval, never a reused one
+                    retrieved = self._retrieve(query_embedding, top_k, collection_count)
+                if table_answer is not None and not self._use_table_answer(table_answer, query_embedding, retrieved[1]):
+                    table_answer = None
+                if table_answer is None:
+                    if session.same_topic(query_embedding):
+                        contexts, citations = session.contexts, session.citations
+                        reused = True
+                        metrics.inc("chat_session_retrieval_reused_total")
+                    else:
+                        contexts, citations = retrieved or self._retrieve(query_embedding, top_k, collection_count)
+                        session.query_embedding = query_embedding
+                        session.contexts, session.citations = contexts, citations
+                if prefetched is None:
+                    retrieval_latency.observe((time.perf_counter() - started) * 1000)
+            elif table_answer is not None and not self._use_table_answer(table_answer, None, None):
+                table_answer = None
+            
+            if table_answer is not None:
+                session.add_turn(user_query, table_answer["answer"])
+                return {**table_answer, "session_id": session.id}
+            
+            kv_context = session.ollama_context
+            if len(kv_context) > settings.CHAT_SESSION_MAX_CONTEXT_TOKENS:
+                # Too long to keep: start a fresh KV context from the summarised history.
+                kv_context = []
+                metrics.inc("chat_session_context_resets_total")
+            
+            parts = []
+            if not kv_context and (session.summary or session.turns):
+                parts.append(f"Conversation so far:\n{session.history_text()}")
+            if contexts and not (reused and kv_context):
+                parts.append(f"Context from uploaded documents:\n{self._context_text(contexts)}")
+            parts.append(f"User Question: {user_query}")
+            if contexts:
+                parts.append("Answer based on the context above. Be specific and reference the relevant information.")
+            prompt = "\n\n".join(parts)
+            system = RAG_SYSTEM_PROMPT if contexts else BASIC_SYSTEM_PROMPT
+            
+            # A cut-off /api/generate stream returns no KV context, so sessions
+            # degrade straight to extractive answers (never truncated ones).
+            degraded = None
+            if contexts and not can_generate(deadline, priority):
+                degraded = "budget"
+            else:
+                try:
+                    with stage("llm"), get_admission_controller().slot(
+                        priority, admission_deadline(deadline) if contexts else deadline
+                    ), stage("generate"):
+                        answer, new_context, prefill_tokens = self._generate_with_context(
+                            prompt, system, kv_context, timeout=min(120.0, max(1.0, remaining(deadline)))
+                        )
+                except AdmissionRejected as e:
+                    if not contexts or e.reason == "queue_full":
+                        raise
+                    degraded = "admission"
+                except Exception as e:
+                    if not contexts:
+                        return {
+                            "answer": self._error_answer(e),
+                            "citations": citations,
+                            "sources_count": len(citations),
+                            "session_id": session.id,
+                            "mode": MODE_FULL
+                        }
+                    logger.error(f"Error generating session answer from Ollama: {e}")
+                    degraded = "budget" if isinstance(e, requests.Timeout) else "llm_error"
+            if degraded:
+                result = self._extractive(user_query, contexts, citations, degraded)
+                session.add_turn(user_query, result["answer"])
+                return {**result, "session_id": session.id}
+            
+            saved = len(kv_context)
+            session.ollama_context = new_context
+            session.prefill_tokens_saved += saved
+            session.add_turn(user_query, answer)
+            metrics.inc("chat_session_turns_total")
+            metrics.inc("chat_session_prefill_tokens_total", prefill_tokens)
+            metrics.inc("chat_session_prefill_tokens_saved_total", saved)
             
             return {
                 "answer": answer,
-                "citations": [],
-                "sources_count": 0
-            }
-        except ConnectionError as e:
-            logger.error(f"Ollama connection error: {e}")
-            return {
-                "answer": f"❌ Cannot connect to Ollama. Please make sure Ollama is running:\n\n1. Open a terminal and run: ollama serve\n2. Keep that terminal open\n3. Try your question again",
-                "citations": [],
-                "sources_count": 0
-            }
-        except ValueError as e:
-            logger.error(f"Ollama model error: {e}")
-            return {
-                "answer": f"❌ Model error: {str(e)}\n\nPlease download a model:\n  ollama pull llama3\n  or\n  ollama pull mistral",
-                "citations": [],
-                "sources_count": 0
-            }
-        except Exception as e:
-            logger.error(f"Error in basic chat: {e}")
-            return {
-                "answer": f"I apologize, but I encountered an error: {str(e)}\n\nPlease check:\n1. Ollama is running: 'ollama serve'\n2. You have a model: 'ollama list'\n3. If not, download one: 'ollama pull llama3'",
-                "citations": [],
-                "sources_count": 0
+                "citations": citations,
+                "sources_count": len(citations),
+                "session_id": session.id,
+                "mode": MODE_FULL
             }
+    
+    def _invoke_llm(self, messages, priority: str, deadline: Optional[float]):
+        """Run one ChatOllama generation inside an admission-control slot."""
+        llm = self._get_llm()  # Lazy initialization
+        # "llm" minus "generate" is the time spent waiting for a slot
+        with stage("llm"), get_admission_controller().slot(priority, deadline), stage("generate"):
+            return llm.invoke(messages)
+    
+    def _generate_until(self, messages: List[Dict], priority: str, deadline: Optional[float]):
+        """
+        Stream Ollama's /api/chat inside an admission slot, stopping at the deadline.
+        
+        Returns (answer so far, whether the generation completed). An incomplete
+        answer means the deadline cut it; a failed or dropped stream raises.
+        """
+        model = self._get_model_name()
+        stop_at = time.monotonic() + 120.0 if deadline is None else time.monotonic() + remaining(deadline)
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+            "options": {"temperature": 0.7}
+        }
+        parts = []
+        cut = threading.Event()
+        with stage("llm"), get_admission_controller().slot(priority, admission_deadline(deadline)), stage("generate"):
+            try:
+                # The read timeout bounds the wait for the response headers
+                response = requests.post(f"{self._base_url}/api/chat", json=payload, stream=True,
+                                         timeout=(5.0, max(0.1, stop_at - time.monotonic())))
+            except requests.ConnectionError as e:
+                raise ConnectionError(f"Cannot connect to Ollama at {self._base_url}") from e
+            except requests.Timeout:
+                if time.monotonic() < stop_at:
+                    raise
+                return "", False
+            
+            def cut_stream():
+                cut.set()
+                _cut_stream(response)
+            
+            # The deadline must not wait for the next line: a stalled stream is cut at stop_at
+            timer = threading.Timer(max(0.0, stop_at - time.monotonic()), cut_stream)
+            timer.daemon = True
+            timer.start()
+            with response:
+                try:
+                    if response.status_code != 200:
+                        raise Exception(f"Ollama returned {response.status_code}: {response.text[:200]}")
+                    for line in response.iter_lines():
+                        if line:
+                            chunk = json.loads(line)
+                            parts.append((chunk.get("message") or {}).get("content", ""))
+                            if chunk.get("done"):
+                                return "".join(parts), True
+                        if time.monotonic() >= stop_at:
+                            # Closing the stream makes Ollama stop generating
+                            break
+                except requests.RequestException as e:
+                    if not cut.is_set():
+                        raise ConnectionError(f"Ollama stream failed: {e}") from e
+                    # Cut at the deadline: keep the answer so far
+                finally:
+                    timer.cancel()
+            if not cut.is_set() and time.monotonic() < stop_at:
+                raise ConnectionError("Ollama closed the stream before the answer was done")
+        return "".join(parts), False
+    
+    def _generate_with_context(self, prompt: str, system: str, context: List[int], timeout: float = 120.0):
+        """
+        Call Ollama's /api/generate, continuing from a previous `context`.
+        
+        Returns (answer, new context token ids, prompt tokens evaluated).
+        """
+        payload = {
+            "model": self._get_model_name(),
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+            "options": {"temperature": 0.7}
+        }
+        if context:
+            payload["context"] = context
+        else:
+            payload["system"] = system
+        
+        try:
+            response = requests.post(f"{self._base_url}/api/generate", json=payload, timeout=timeout)
+        except requests.ConnectionError as e:
+            raise ConnectionError(f"Cannot connect to Ollama at {self._base_url}") from e
+        if response.status_code != 200:
+            raise Exception(f"Ollama returned {response.status_code}: {response.text[:200]}")
+        
+        data = response.json()
+        return data.get("response", ""), data.get("context") or [], data.get("prompt_eval_count", 0)
+    
+    def warm_up_llm(self, timeout: float) -> str:
+        """
+        Detect the model, create the client and have Ollama load the weights.
+        
+        Sends a one-token generation with OLLAMA_KEEP_ALIVE, which also
+        resets how long Ollama keeps the model in memory. Returns the model name.
+        """
+        self._get_llm()
+        model = self._get_model_name()
+        payload = {
+            "model": model,
+            "prompt": "Hi",
+            "stream": False,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+            "options": {"num_predict": 1}
+        }
+        try:
+            response = requests.post(f"{self._base_url}/api/generate", json=payload, timeout=timeout)
+        except requests.ConnectionError as e:
+            raise ConnectionError(f"Cannot connect to Ollama at {self._base_url}") from e
+        if response.status_code != 200:
+            raise Exception(f"Ollama returned {response.status_code}: {response.text[:200]}")
+        return model
 
 
-rag_service = RAGService()
+@lru_cache()
+def get_rag_service() -> RAGService:
+    """Return the process-wide RAGService (created on first use)."""
+    return RAGService()
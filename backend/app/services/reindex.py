@@ -0,0 +1,311 @@
+"""
+Online re-indexing with an atomic collection swap.
+
+Changing EMBEDDING_MODEL or the chunking settings used to mean deleting the
+vector store and re-ingesting while the bot could not answer. A ReindexJob
+instead builds a new versioned collection (COLLECTION_NAME_v<n>) next to the
+live one, while the live one keeps serving queries:
+
+  1. every source file is extracted (through the extraction cache), chunked
+     with the current settings and embedded in batches with the target
+     model (near-duplicates become references, as on ingest); sources whose
+     file is gone are re-embedded from their stored chunk texts;
+  2. embedding is throttled: after each batch the p95 of live retrieval
+     latency (embedding + vector search of real queries) is compared with
+     REINDEX_LATENCY_BUDGET_MS, and the job backs off (smaller batches,
+     growing pauses) while it is over budget;
+  3. uploads and deletes made meanwhile are replayed, then the new
+     collection is verified (chunk counts, sources, self-retrieval probes);
+  4. ACTIVE_INDEX_FILE is replaced, which switches RAGService and the query
+     embedding model atomically; the old collection is dropped after
+     REINDEX_DROP_DELAY_SECONDS so in-flight queries can finish.
+
+Progress and throttling are exposed by GET /documents/reindex.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.database import drop_vector_store, get_active_index, get_vector_store, set_active_index
+from app.core.metrics import metrics, retrieval_latency
+from app.services.chunking import LegalTextChunker
+from app.services.corpus import get_corpus_version
+from app.services.dedup import get_dedup_index
+from app.services.embeddings import get_embedding_service
+
+logger = logging.getLogger(__name__)
+
+_MAX_PAUSE_SECONDS = 5.0
+_VERIFY_PROBES = 5
+
+
+class ReindexCancelled(Exception):
+    pass
+
+
+class ReindexJob:
+    """One background rebuild of the index into a new collection."""
+
+    def __init__(self, embedding_model: str):
+        active = get_active_index()
+        self.id = uuid.uuid4().hex[:12]
+        self.version = active.get("version", 0) + 1
+        self.source_collection = active["collection"]
+        self.target_collection = f"{settings.COLLECTION_NAME}_v{self.version}"
+        self.embedding_model = embedding_model
+        self.status = "pending"  # pending -> running -> verifying -> swapped | failed | cancelled
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.sources_total = 0
+        self.sources_done = 0
+        self.chunks_embedded = 0
+        self.batch_size = settings.REINDEX_BATCH_SIZE
+        self.pause_seconds = 0.0
+        self.throttle_events = 0
+        self.live_p95_ms: Optional[float] = None
+        self._cancel = threading.Event()
+
+    def to_dict(self) -> Dict:
+        elapsed = None
+        if self.started_at:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 1)
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "source_collection": self.source_collection,
+            "target_collection": self.target_collection,
+            "embedding_model": self.embedding_model,
+            "chunk_size": settings.CHUNK_SIZE,
+            "chunk_overlap": settings.CHUNK_OVERLAP,
+            "progress": {
+                "sources_total": self.sources_total,
+                "sources_done": self.sources_done,
+                "chunks_embedded": self.chunks_embedded,
+            },
+            "throttle": {
+                "latency_budget_ms": settings.REINDEX_LATENCY_BUDGET_MS,
+                "live_p95_ms": None if self.live_p95_ms is None else round(self.live_p95_ms, 1),
+                "batch_size": self.batch_size,
+                "pause_seconds": round(self.pause_seconds, 2),
+                "throttle_events": self.throttle_events,
+            },
+            "elapsed_seconds": elapsed,
+        }
+
+    def cancel(self):
+        self._cancel.set()
+
+    # ------------------------------------------------------------------
+    # Build
+    # ------------------------------------------------------------------
+
+    def run(self):
+        from app.services.rag import get_rag_service
+
+        self.status, self.started_at = "running", time.time()
+        rag = get_rag_service()
+        chunker = LegalTextChunker(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+        target = None
+        try:
+            previous = get_active_index().get("previous_collection")
+            if previous and previous != self.source_collection:
+                _drop_collection(previous)  # Retired by an earlier swap; its timer may not have run
+            _drop_collection(self.target_collection)  # Leftover of an interrupted attempt
+            target = get_vector_store(self.target_collection)
+            live = get_vector_store(self.source_collection)
+
+            sources = self._live_sources(live, self.source_collection)
+            self.sources_total = len(sources)
+            for source in sorted(sources):
+                self._build_source(source, live, target, rag, chunker)
+                self.sources_done += 1
+
+            self.status = "verifying"
+            with rag.write_lock:
+                # Nothing can be written to the live collection from here to the swap.
+                self._catch_up(live, target, rag, chunker)
+                self._verify(live, target)
+                self._swap()
+            self.status = "swapped"
+            metrics.inc("reindex_jobs_total", result="swapped")
+            logger.info(f"Re-index {self.id} swapped to {self.target_collection} ({self.chunks_embedded} chunks)")
+        except ReindexCancelled:
+            self.status = "cancelled"
+            metrics.inc("reindex_jobs_total", result="cancelled")
+        except Exception as e:
+            self.status, self.error = "failed", str(e)
+            metrics.inc("reindex_jobs_total", result="failed")
+            logger.error(f"Re-index {self.id} failed: {e}")
+        finally:
+            self.finished_at = time.time()
+            if self.status != "swapped" and target is not None:
+                _drop_collection(self.target_collection)
+
+    @staticmethod
+    def _live_sources(store, name: str) -> Set[str]:
+        stored = store.get(include=["metadatas"])
+        sources = {m.get("source", "unknown") for m in stored["metadatas"]}
+        dedup = get_dedup_index()
+        return sources | dedup.sources(name, set(stored["ids"])) if dedup else sources
+
+    @staticmethod
+    def _source_path(source: str) -> Optional[Path]:
+        for folder in (settings.UPLOAD_DIR, settings.EXISTING_DOCS_DIR):
+            path = Path(folder) / source
+            if path.is_file():
+                return path
+        return None
+
+    def _build_source(self, source: str, live, target, rag, chunker: LegalTextChunker):
+        path = self._source_path(source)
+        if path is not None:
+            texts, metadatas = rag.prepare_document(str(path), chunker)
+        else:
+            # No file to re-chunk (e.g. removed from disk): re-embed the stored chunks as they are.
+            stored = live.get(where={"source": source}, include=["documents", "metadatas"])
+            texts, metadatas = stored["documents"], stored["metadatas"]
+            if get_dedup_index():
+                refs = get_dedup_index().source_references(self.source_collection, source)
+                texts, metadatas = texts + [r["document"] for r in refs], metadatas + [r["metadata"] for r in refs]
+        dedup = get_dedup_index()
+        if dedup is None:
+            self._embed_into(target, texts, metadatas, [str(uuid.uuid4()) for _ in texts])
+            return
+        # The new collection is deduplicated too; only first occurrences are embedded
+        plan = dedup.plan(self.target_collection, texts, target)
+        unique = plan.unique
+        self._embed_into(target, [texts[i] for i in unique], [metadatas[i] for i in unique],
+                         [plan.ids[i] for i in unique])
+        dedup.commit(plan, texts, metadatas)
+
+    def _embed_into(self, target, texts: List[str], metadatas: List[Dict], ids: List[str]):
+        service = get_embedding_service(self.embedding_model)
+        i = 0
+        while i < len(texts):
+            if self._cancel.is_set():
+                raise ReindexCancelled()
+            batch = slice(i, i + self.batch_size)
+            embeddings = service.embed_documents(texts[batch])
+            target.add(
+                ids=ids[batch],
+                documents=texts[batch],
+                metadatas=metadatas[batch],
+                embeddings=embeddings,
+            )
+            i += len(embeddings)
+            self.chunks_embedded += len(embeddings)
+            metrics.inc("reindex_chunks_embedded_total", len(embeddings))
+            self._throttle()
+
+    def _throttle(self):
+        """AIMD on batch size and pause, driven by live retrieval latency."""
+        self.live_p95_ms = retrieval_latency.percentile(95)
+        if self.live_p95_ms is not None and self.live_p95_ms > settings.REINDEX_LATENCY_BUDGET_MS:
+            self.throttle_events += 1
+            metrics.inc("reindex_throttle_events_total")
+            self.batch_size = max(settings.REINDEX_MIN_BATCH_SIZE, self.batch_size // 2)
+            self.pause_seconds = min(_MAX_PAUSE_SECONDS, max(0.1, self.pause_seconds * 2))
+        else:
+            self.batch_size = min(settings.REINDEX_BATCH_SIZE, self.batch_size + settings.REINDEX_MIN_BATCH_SIZE)
+            self.pause_seconds = self.pause_seconds / 2 if self.pause_seconds > 0.05 else 0.0
+        metrics.set("reindex_batch_size", self.batch_size)
+        metrics.set("reindex_pause_seconds", self.pause_seconds)
+        if self.pause_seconds and self._cancel.wait(self.pause_seconds):
+            raise ReindexCancelled()
+
+    # ------------------------------------------------------------------
+    # Finish
+    # ------------------------------------------------------------------
+
+    def _catch_up(self, live, target, rag, chunker: LegalTextChunker):
+        """Replay uploads and deletes that reached the live collection during the build."""
+        live_sources = self._live_sources(live, self.source_collection)
+        built = self._live_sources(target, self.target_collection)
+        for source in built - live_sources:
+            rag.remove_source_chunks(target, self.target_collection, source)
+        for source in live_sources - built:
+            self._build_source(source, live, target, rag, chunker)
+            self.sources_total += 1
+            self.sources_done += 1
+
+    def _verify(self, live, target):
+        live_sources = self._live_sources(live, self.source_collection)
+        built = self._live_sources(target, self.target_collection)
+        if built != live_sources:
+            raise RuntimeError(f"Sources differ after re-index: missing {sorted(live_sources - built)}")
+        if target.count() == 0 and live.count() > 0:
+            raise RuntimeError("New collection is empty")
+
+        # Each probe chunk must find itself first: catches broken vectors or id/row mix-ups.
+        ids = target.get(include=[])["ids"]
+        for chunk_id in random.sample(ids, min(_VERIFY_PROBES, len(ids))):
+            stored = target.get(ids=[chunk_id], include=["embeddings"])
+            hit = target.query(query_embeddings=[list(stored["embeddings"][0])], n_results=1)
+            if not hit["ids"][0] or hit["ids"][0][0] != chunk_id:
+                raise RuntimeError(f"Verification probe failed for chunk {chunk_id}")
+
+    def _swap(self):
+        set_active_index({
+            "collection": self.target_collection,
+            "embedding_model": self.embedding_model,
+            "version": self.version,
+            "chunk_size": settings.CHUNK_SIZE,
+            "chunk_overlap": settings.CHUNK_OVERLAP,
+            "previous_collection": self.source_collection,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        })
+        get_corpus_version().bump("reindex")
+        old = self.source_collection
+        timer = threading.Timer(settings.REINDEX_DROP_DELAY_SECONDS, _drop_retired, [old])
+        timer.daemon = True
+        timer.start()
+
+
+def _drop_retired(name: str):
+    if get_active_index()["collection"] == name:
+        return  # Swapped back meanwhile
+    _drop_collection(name)
+    logger.info(f"Dropped retired collection {name}")
+
+
+def _drop_collection(name: str):
+    drop_vector_store(name)
+    dedup = get_dedup_index()
+    if dedup:
+        dedup.drop_collection(name)
+
+
+class ReindexManager:
+    """Runs at most one ReindexJob at a time and remembers the last one."""
+
+    def __init__(self):
+        self.job: Optional[ReindexJob] = None
+        self._lock = threading.Lock()
+
+    def start(self, embedding_model: Optional[str] = None) -> ReindexJob:
+        if settings.VECTOR_SERVICE_URL:
+            raise RuntimeError("Re-indexing is not available with a shared vector service")
+        with self._lock:
+            if self.job and self.job.status in ("pending", "running", "verifying"):
+                raise RuntimeError(f"Re-index {self.job.id} is already {self.job.status}")
+            self.job = ReindexJob(embedding_model or settings.EMBEDDING_MODEL)
+            threading.Thread(target=self.job.run, name="reindex", daemon=True).start()
+            return self.job
+
+    def cancel(self) -> Optional[ReindexJob]:
+        if self.job and self.job.status in ("pending", "running"):
+            self.job.cancel()
+        return self.job
+
+
+@lru_cache()
+def get_reindex_manager() -> ReindexManager:
+    """Return the process-wide ReindexManager."""
+    return ReindexManager()
@@ -0,0 +1,160 @@
+"""
+Server-side chat sessions for multi-turn conversations.
+
+A session keeps:
+  * the last few turns verbatim plus a compact summary of older ones,
+  * the last retrieval (query embedding, contexts, citations) so follow-ups on
+    the same topic skip the vector search,
+  * Ollama's returned `context` (token ids of the conversation so far) so the
+    system prompt and earlier turns are not prefilled again every turn.
+
+Sessions live in memory. Idle sessions expire after CHAT_SESSION_IDLE_SECONDS
+and the least recently used ones are evicted when the store exceeds
+CHAT_SESSION_MEMORY_MB.
+"""
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class ChatSession:
+    """State of one conversation."""
+
+    def __init__(self, user_id: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.lock = threading.Lock()  # One turn at a time per session
+        self.turns: List[Dict[str, str]] = []  # Recent {"question", "answer"} pairs
+        self.summary = ""  # Compressed older turns
+        self.ollama_context: List[int] = []
+        self.query_embedding: Optional[List[float]] = None
+        self.contexts: List[str] = []
+        self.citations: List[Dict] = []
+        self.prefill_tokens_saved = 0
+
+    def add_turn(self, question: str, answer: str):
+        """Record a turn, folding the oldest ones into the summary."""
+        self.turns.append({"question": question, "answer": answer})
+        while len(self.turns) > settings.CHAT_SESSION_MAX_TURNS:
+            old = self.turns.pop(0)
+            answer_head = old["answer"].split("\n", 1)[0][:200]
+            self.summary = f"{self.summary}\n- Q: {old['question'][:200]} A: {answer_head}".strip()
+            limit = settings.CHAT_SESSION_SUMMARY_CHARS
+            if len(self.summary) > limit:
+                self.summary = "..." + self.summary[-limit:]
+
+    def history_text(self) -> str:
+        """Summary and recent turns, used to rebuild the prompt when the KV context is dropped."""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        for turn in self.turns:
+            parts.append(f"User: {turn['question']}\nAssistant: {turn['answer']}")
+        return "\n\n".join(parts)
+
+    def same_topic(self, query_embedding: List[float]) -> bool:
+        """Whether a follow-up is close enough to reuse the last retrieval."""
+        if self.query_embedding is None or not self.contexts:
+            return False
+        return _cosine(self.query_embedding, query_embedding) >= settings.CHAT_SESSION_TOPIC_SIMILARITY
+
+    def approx_bytes(self) -> int:
+        """Rough memory footprint used for budget-based eviction."""
+        text = sum(len(t["question"]) + len(t["answer"]) for t in self.turns)
+        text += len(self.summary) + sum(len(c) for c in self.contexts)
+        text += sum(len(c.get("excerpt", "")) for c in self.citations)
+        vectors = 8 * (len(self.ollama_context) + len(self.query_embedding or []))
+        return 512 + text + vectors
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SessionStore:
+    """LRU store of chat sessions bounded by idle time and memory budget."""
+
+    def __init__(self, memory_budget_bytes: int, idle_seconds: int):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, user_id: int) -> ChatSession:
+        session = ChatSession(user_id)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._evict_locked()
+        metrics.inc("chat_sessions_created_total")
+        return session
+
+    def get(self, session_id: str, user_id: int) -> Optional[ChatSession]:
+        """Return the user's session and mark it as recently used."""
+        with self._lock:
+            self._evict_locked()
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id:
+                return None
+            session.last_used = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str, user_id: int) -> bool:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id:
+                return False
+            del self._sessions[session_id]
+            self._update_gauges_locked()
+            return True
+
+    def touch(self, session: ChatSession):
+        """Call after a turn: sizes changed, so re-check the budget."""
+        with self._lock:
+            session.last_used = time.time()
+            if session.id in self._sessions:
+                self._sessions.move_to_end(session.id)
+            self._evict_locked()
+
+    def _evict_locked(self):
+        now = time.time()
+        for session_id in [s.id for s in self._sessions.values() if now - s.last_used > self.idle_seconds]:
+            del self._sessions[session_id]
+            metrics.inc("chat_sessions_evicted_total", reason="idle")
+
+        total = sum(s.approx_bytes() for s in self._sessions.values())
+        # Oldest first; a session in the middle of a turn is never evicted.
+        for session in list(self._sessions.values()):
+            if total <= self.memory_budget_bytes:
+                break
+            if session.lock.locked():
+                continue
+            total -= session.approx_bytes()
+            del self._sessions[session.id]
+            metrics.inc("chat_sessions_evicted_total", reason="memory")
+        self._update_gauges_locked(total)
+
+    def _update_gauges_locked(self, total: Optional[int] = None):
+        if total is None:
+            total = sum(s.approx_bytes() for s in self._sessions.values())
+        metrics.set("chat_sessions_active", len(self._sessions))
+        metrics.set("chat_sessions_bytes", total)
+
+
+@lru_cache()
+def get_session_store() -> SessionStore:
+    """Return the process-wide SessionStore."""
+    return SessionStore(
+        memory_budget_bytes=settings.CHAT_SESSION_MEMORY_MB * 1024 * 1024,
+        idle_seconds=settings.CHAT_SESSION_IDLE_SECONDS,
+    )
@@ -0,0 +1,59 @@
+"""
+Single-flight execution: concurrent calls with the same key share one result.
+
+The first caller for a key runs the function; callers arriving while it is
+still running wait for it and receive the same result (or exception) instead
+of starting duplicate work. Nothing is cached once the call completes.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable
+from app.core.metrics import metrics
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls (thread-based)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn() for key, or wait for the identical call already running."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.inc("singleflight_coalesced_total", group=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.inc("singleflight_executed_total", group=self.name)
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,231 @@
+"""
+Prebuilt vector-index snapshots for the bundled corpus.
+
+Re-parsing and re-embedding the bundled Acts on every new deployment costs
+minutes of CPU per node for an identical result. A snapshot stores the
+finished index so startup only has to copy it into the vector store:
+
+    snapshot/
+      manifest.json     format version, embedding model + dimension, chunking
+                        settings and the sha256 of every source file
+      embeddings.npy    float32 matrix (rows x dimension), memory-mapped on load
+      chunks.jsonl      one {"id", "text", "metadata"} object per row
+      refs.jsonl        near-duplicate chunks stored as references (app/services/dedup.py):
+                        one {"chunk_id", "canonical_id", "document", "metadata"} per line
+
+Build one with `python -m scripts.build_snapshot`. On startup
+load_existing_documents() imports SNAPSHOT_DIR (if present) before scanning
+EXISTING_DOCS_DIR. A snapshot built with another embedding model is refused;
+a source file that changed since the snapshot was built is skipped and
+re-ingested normally.
+
+On import the dedup index gets MinHash signatures for the imported chunks,
+so later uploads deduplicate against them, and the references are restored.
+A reference whose canonical chunk is not imported (its source changed or
+was already ingested) is stored in its place with the canonical's
+embedding. So is every reference when dedup is disabled.
+"""
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.database import get_active_index, get_vector_store
+from app.services.dedup import get_dedup_index
+from app.services.documents import file_sha256
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.jsonl"
+REFS_FILE = "refs.jsonl"
+_ADD_BATCH_SIZE = 1000  # Rows per collection.add call when importing
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, corrupt or incompatible."""
+
+
+def export_snapshot(out_dir: str, docs_dir: Optional[str] = None) -> Dict:
+    """
+    Write the current collection to out_dir and return the manifest.
+
+    docs_dir (default EXISTING_DOCS_DIR) is used to record the hash of every
+    source file, so a later import can tell which sources are still current.
+    """
+    import numpy as np
+
+    results = get_vector_store().get(include=["documents", "metadatas", "embeddings"])
+    ids = results.get("ids") or []
+    if not ids:
+        raise SnapshotError("The collection is empty; ingest documents before building a snapshot")
+
+    embeddings = np.asarray(results["embeddings"], dtype=np.float32)
+    dedup = get_dedup_index()
+    refs = dedup.collection_references(get_active_index()["collection"]) if dedup else []
+    docs_path = Path(docs_dir or settings.EXISTING_DOCS_DIR)
+    sources = {}
+    metadatas = results["metadatas"] + [ref["metadata"] for ref in refs]
+    for source in sorted({m.get("source", "unknown") for m in metadatas}):
+        path = docs_path / source
+        sources[source] = file_sha256(path) if path.is_file() else None
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    np.save(out / EMBEDDINGS_FILE, embeddings)
+    with open(out / CHUNKS_FILE, "w", encoding="utf-8") as f:
+        for chunk_id, text, metadata in zip(ids, results["documents"], results["metadatas"]):
+            f.write(json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+    with open(out / REFS_FILE, "w", encoding="utf-8") as f:
+        for ref in refs:
+            f.write(json.dumps(ref, ensure_ascii=False) + "\n")
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "embedding_model": get_active_index()["embedding_model"],
+        "dimension": int(embeddings.shape[1]),
+        "count": len(ids),
+        "references": len(refs),
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP,
+        "sources": sources,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    # Manifest last: a snapshot without one is incomplete and is never loaded.
+    (out / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    logger.info(f"Wrote snapshot of {len(ids)} chunks and {len(refs)} references "
+                f"from {len(sources)} source(s) to {out}")
+    return manifest
+
+
+def read_manifest(snapshot_dir: str) -> Dict:
+    """Load and validate a snapshot's manifest against the running configuration."""
+    path = Path(snapshot_dir) / MANIFEST_FILE
+    if not path.is_file():
+        raise SnapshotError(f"No snapshot manifest at {path}")
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(
+            f"Snapshot format {manifest.get('format_version')} is not supported "
+            f"(expected {SNAPSHOT_FORMAT_VERSION}); rebuild it with python -m scripts.build_snapshot"
+        )
+    model = get_active_index()["embedding_model"]
+    if manifest.get("embedding_model") != model:
+        raise SnapshotError(
+            f"Snapshot was built with embedding model '{manifest.get('embedding_model')}' "
+            f"but the index uses '{model}'; its vectors are not comparable"
+        )
+    if (manifest.get("chunk_size"), manifest.get("chunk_overlap")) != (settings.CHUNK_SIZE, settings.CHUNK_OVERLAP):
+        logger.warning(
+            "Snapshot was built with different chunking settings "
+            f"({manifest.get('chunk_size')}/{manifest.get('chunk_overlap')}); loading it anyway"
+        )
+    return manifest
+
+
+def import_snapshot(snapshot_dir: str, docs_dir: Optional[str] = None,
+                    skip_sources: Optional[Set[str]] = None) -> List[str]:
+    """
+    Copy a snapshot into the collection and return the sources it provided.
+
+    Sources in skip_sources (already ingested) and sources whose file in
+    docs_dir no longer matches the recorded hash are left out.
+    """
+    import numpy as np
+
+    manifest = read_manifest(snapshot_dir)
+    root = Path(snapshot_dir)
+    embeddings = np.load(root / EMBEDDINGS_FILE, mmap_mode="r")
+    if embeddings.shape != (manifest["count"], manifest["dimension"]):
+        raise SnapshotError(
+            f"Snapshot embeddings have shape {embeddings.shape}, "
+            f"manifest says ({manifest['count']}, {manifest['dimension']})"
+        )
+
+    docs_path = Path(docs_dir or settings.EXISTING_DOCS_DIR)
+    skip = set(skip_sources or ())
+    wanted = set()
+    for source, digest in manifest["sources"].items():
+        if source in skip:
+            continue
+        path = docs_path / source
+        if digest and path.is_file() and file_sha256(path) != digest:
+            logger.info(f"{source} changed since the snapshot was built; it will be re-ingested")
+            continue
+        wanted.add(source)
+    if not wanted:
+        return []
+
+    collection = get_vector_store()
+    dedup = get_dedup_index()
+    batch_rows, batch = [], []
+    rows: Dict[str, int] = {}  # chunk id -> embedding row, for references stored in place of their canonical
+    imported: List[Dict] = []
+
+    def flush():
+        collection.add(
+            ids=[c["id"] for c in batch],
+            documents=[c["text"] for c in batch],
+            metadatas=[c["metadata"] for c in batch],
+            # Only the rows being added are read from the memory map.
+            embeddings=embeddings[batch_rows].tolist(),
+        )
+        if dedup:
+            imported.extend(batch)
+        batch_rows.clear()
+        batch.clear()
+
+    with open(root / CHUNKS_FILE, encoding="utf-8") as f:
+        for row, line in enumerate(f):
+            chunk = json.loads(line)
+            rows[chunk["id"]] = row
+            if chunk["metadata"].get("source") not in wanted:
+                continue
+            batch_rows.append(row)
+            batch.append(chunk)
+            if len(batch) >= _ADD_BATCH_SIZE:
+                flush()
+    if batch:
+        flush()
+
+    refs = _read_refs(root, wanted)
+    imported_ids = {c["id"] for c in imported}
+    missing = sorted({r["canonical_id"] for r in refs} - imported_ids) if dedup else []
+    existing = set(collection.get(ids=missing, include=["metadatas"])["ids"]) if missing else set()
+    kept, replaced = [], {}  # replaced: canonical id -> reference stored in its place
+    for ref in refs:
+        canonical = ref["canonical_id"]
+        if dedup and (canonical in imported_ids or canonical in existing):
+            kept.append(ref)
+        elif dedup and canonical in replaced:
+            kept.append({**ref, "canonical_id": replaced[canonical]})
+        elif canonical in rows:
+            if dedup:
+                replaced[canonical] = ref["chunk_id"]
+            batch_rows.append(rows[canonical])
+            batch.append({"id": ref["chunk_id"], "text": ref["document"], "metadata": ref["metadata"]})
+            if len(batch) >= _ADD_BATCH_SIZE:
+                flush()
+        else:
+            logger.warning(f"Snapshot reference {ref['chunk_id']} has no canonical chunk; skipped")
+    if batch:
+        flush()
+    if dedup:
+        dedup.index_stored(get_active_index()["collection"], imported, kept)
+
+    logger.info(f"Loaded snapshot {root} ({', '.join(sorted(wanted))}; {len(kept)} references)")
+    return sorted(wanted)
+
+
+def _read_refs(root: Path, sources: Set[str]) -> List[Dict]:
+    """The snapshot's references from `sources` (snapshots built before dedup have none)."""
+    path = root / REFS_FILE
+    if not path.is_file():
+        return []
+    with open(path, encoding="utf-8") as f:
+        refs = [json.loads(line) for line in f]
+    return [ref for ref in refs if ref["metadata"].get("source") in sources]
@@ -3,10 +3,14 @@ Startup service to automatically load existing documents on application start.
 """
 import logging
 from pathlib import Path
-from typing import Set
+from typing import Dict, List, Optional, Set
 from app.core.config import settings
-from app.core.database import get_collection
-from app.services.rag import rag_service
+from app.core.database import get_active_index, get_vector_store
+from app.services.bulk_ingest import ingest_files
+from app.services.corpus import get_corpus_version
+from app.services.dedup import get_dedup_index
+from app.services.snapshot import MANIFEST_FILE, SnapshotError, import_snapshot
+from app.services.tables import get_table_store
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +18,7 @@ logger = logging.getLogger(__name__)
 def get_ingested_files() -> Set[str]:
     """Get list of files that have already been ingested into ChromaDB."""
     try:
-        collection = get_collection()
+        collection = get_vector_store()
         # Get all documents from collection to check metadata
         results = collection.get()
         
@@ -24,70 +28,91 @@ def get_ingested_files() -> Set[str]:
                 if "source" in metadata:
                     ingested_files.add(metadata["source"])
         
+        # A file whose chunks all duplicate other files has no stored chunk of its own
+        dedup = get_dedup_index()
+        if dedup and results:
+            ingested_files |= dedup.sources(get_active_index()["collection"], set(results["ids"]))
+        
         return ingested_files
     except Exception as e:
         logger.warning(f"Error getting ingested files: {e}")
         return set()
 
 
-def load_existing_documents():
+def load_snapshot(ingested_files: Set[str]) -> Set[str]:
+    """Import SNAPSHOT_DIR if it exists; returns the sources it provided."""
+    if not settings.SNAPSHOT_DIR or not Path(settings.SNAPSHOT_DIR, MANIFEST_FILE).exists():
+        return set()
+    try:
+        sources = import_snapshot(settings.SNAPSHOT_DIR, skip_sources=ingested_files)
+    except SnapshotError as e:
+        logger.warning(f"Ignoring snapshot: {e}")
+        return set()
+    if sources:
+        get_corpus_version().bump("snapshot")
+    return set(sources)
+
+
+def _load_snapshot_tables(docs_dir: Path, sources: Set[str]):
+    """Snapshots carry embeddings only: build the Excel tables of their sources here."""
+    tables = get_table_store()
+    if not tables:
+        return
+    for source in sorted(sources):
+        path = docs_dir / source
+        if path.suffix.lower() in (".xlsx", ".xls") and path.is_file():
+            try:
+                tables.ingest_excel(str(path))
+            except Exception as e:
+                logger.warning(f"Could not build tables for {source}: {e}")
+
+
+def load_existing_documents(workers: Optional[int] = None) -> Optional[Dict]:
     """
     Scan the existing documents folder and automatically ingest any PDF/Excel files
     that haven't been processed yet.
+    
+    `workers` embedding processes are used (default BULK_INGEST_WORKERS, see
+    app/services/bulk_ingest.py). Returns the ingestion summary, or None if
+    there was nothing to ingest.
     """
     docs_dir = Path(settings.EXISTING_DOCS_DIR)
     
     if not docs_dir.exists():
         logger.info(f"Documents directory does not exist: {docs_dir}. Creating it...")
         docs_dir.mkdir(parents=True, exist_ok=True)
-        return
+        return None
     
     # Get list of already ingested files
     ingested_files = get_ingested_files()
     logger.info(f"Found {len(ingested_files)} already ingested files in database")
     
-    # Find all PDF and Excel files in the documents folder
-    all_files = []
-    for ext in settings.ALLOWED_EXTENSIONS:
-        all_files.extend(docs_dir.glob(f"*{ext}"))
-        all_files.extend(docs_dir.glob(f"*{ext.upper()}"))
-    
-    if not all_files:
-        logger.info(f"No documents found in {docs_dir}")
-        return
-    
-    logger.info(f"Found {len(all_files)} document(s) in {docs_dir}")
-    
-    # Filter out already ingested files
-    files_to_ingest = [
-        f for f in all_files 
-        if f.name not in ingested_files
-    ]
+    # A prebuilt snapshot saves re-parsing and re-embedding the bundled documents
+    snapshot_sources = load_snapshot(ingested_files)
+    ingested_files |= snapshot_sources
+    _load_snapshot_tables(docs_dir, snapshot_sources)
     
+    files_to_ingest = find_new_documents([docs_dir], ingested_files)
     if not files_to_ingest:
         logger.info("All documents have already been ingested")
-        return
+        return None
     
     logger.info(f"Processing {len(files_to_ingest)} new document(s)...")
-    
-    # Process each file
-    success_count = 0
-    error_count = 0
-    
-    for file_path in files_to_ingest:
-        try:
-            logger.info(f"Processing: {file_path.name}")
-            result = rag_service.ingest_document(str(file_path))
-            success_count += 1
-            logger.info(
-                f"✓ Successfully ingested {file_path.name} "
-                f"({result['chunks_ingested']} chunks)"
-            )
-        except Exception as e:
-            error_count += 1
-            logger.error(f"✗ Error processing {file_path.name}: {str(e)}")
-    
+    summary = ingest_files(files_to_ingest, workers)
     logger.info(
         f"Startup document loading complete: "
-        f"{success_count} succeeded, {error_count} failed"
+        f"{summary['succeeded']} succeeded, {summary['failed']} failed "
+        f"({summary['chunks_per_second']} chunks/s with {summary['workers']} embedding process(es))"
     )
+    return summary
+
+
+def find_new_documents(folders: List[Path], ingested_files: Set[str]) -> List[Path]:
+    """PDF and Excel files in `folders` whose name is not an ingested source, sorted."""
+    all_files = set()
+    for folder in folders:
+        for ext in settings.ALLOWED_EXTENSIONS:
+            all_files.update(folder.glob(f"*{ext}"))
+            all_files.update(folder.glob(f"*{ext.upper()}"))
+    logger.info(f"Found {len(all_files)} document(s) in {', '.join(str(f) for f in folders)}")
+    return sorted(f for f in all_files if f.name not in ingested_files)
@@ -0,0 +1,493 @@
+"""
+Typed tables for ingested Excel sheets, and exact answers computed from them.
+
+Embedding a sheet's to_string() dump is fine for "what does the fee sheet
+say about X", but "total loans disbursed in Q2" then becomes LLM arithmetic
+over garbled text fragments. Every Excel sheet is therefore also stored in
+SQLite (TABLE_DB_PATH) as a typed table keyed by its Excel row number:
+
+    sheets          one row per sheet: source, sheet, file sha256, row count
+    columns         per column: original name, kind (number/date/text) and
+                    statistics (non-null, distinct, min, max, sum, mean)
+    column_values   distinct values of low-cardinality text columns, used to
+                    recognise filters such as "Kathmandu" or "Q2" in questions
+    t_<id>          the sheet itself: _row, c0, c1, ...
+
+TableQueryEngine.answer() recognises aggregate questions ("total", "average",
+"how many", "highest", ...) and lookups ("interest rate for Savings B") whose
+column names and filter values occur in the question. It runs them as one
+SQL aggregate over the filtered rows and returns the exact result with
+sheet/row citations. Anything it is not confident about returns None, and
+RAGService falls back to retrieval + LLM.
+"""
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheets (
+    table_name TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sheets_source ON sheets(source);
+CREATE TABLE IF NOT EXISTS columns (
+    table_name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    sql_name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    non_null INTEGER,
+    distinct_count INTEGER,
+    min,
+    max,
+    sum REAL,
+    mean REAL,
+    PRIMARY KEY (table_name, position)
+);
+CREATE TABLE IF NOT EXISTS column_values (
+    table_name TEXT NOT NULL,
+    sql_name TEXT NOT NULL,
+    norm TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS column_values_norm ON column_values(norm);
+"""
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "and", "or", "is", "are", "was", "were",
+    "what", "which", "who", "how", "many", "much", "me", "show", "give", "tell", "list", "all",
+    "with", "from", "at", "as", "per", "during", "this", "that", "there", "do", "does", "did",
+    "total", "sum", "average", "avg", "mean", "number", "count", "highest", "lowest", "maximum",
+    "minimum", "max", "min", "largest", "smallest", "most", "least",
+}
+_AGGREGATES = [  # First match wins: "total number of" is a count, not a sum
+    ("count", re.compile(r"\b(how many|number of|count of|count)\b")),
+    ("avg", re.compile(r"\b(average|avg|mean)\b")),
+    ("max", re.compile(r"\b(highest|largest|maximum|max|biggest|most)\b")),
+    ("min", re.compile(r"\b(lowest|smallest|minimum|min|least)\b")),
+    ("sum", re.compile(r"\b(total|sum|overall|combined|altogether)\b")),
+]
+_AGGREGATE_LABELS = {"count": "Number of rows", "avg": "Average", "max": "Highest", "min": "Lowest", "sum": "Total"}
+_QUARTER_RE = re.compile(r"\bq([1-4])\b")
+_YEAR_RE = re.compile(r"\b((?:19|20)\d{2})\b")
+_MONTHS = {
+    name: i for i, names in enumerate(
+        [("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"), ("may",),
+         ("jun", "june"), ("jul", "july"), ("aug", "august"), ("sep", "sept", "september"),
+         ("oct", "october"), ("nov", "november"), ("dec", "december")], start=1)
+    for name in names
+}
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(str(text).lower())
+
+
+def _norm(text: str) -> str:
+    return " ".join(_words(text))
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def _terms(text: str) -> set:
+    return {_stem(w) for w in _words(text) if w not in _STOPWORDS}
+
+
+def _format_number(value) -> str:
+    if value is None:
+        return "n/a"
+    if float(value).is_integer():
+        return f"{int(value):,}"
+    return f"{value:,.2f}"
+
+
+def _row_ranges(rows: List[int], limit: int = 12) -> str:
+    """[2, 3, 4, 9] -> "2-4, 9" (truncated after `limit` ranges)."""
+    ranges, start = [], None
+    for i, row in enumerate(rows):
+        if start is None:
+            start = row
+        if i + 1 == len(rows) or rows[i + 1] != row + 1:
+            ranges.append(str(start) if start == row else f"{start}-{row}")
+            start = None
+    text = ", ".join(ranges[:limit])
+    return text + (f" (+{len(ranges) - limit} more)" if len(ranges) > limit else "")
+
+
+@dataclass
+class _Column:
+    name: str
+    sql_name: str
+    kind: str
+    terms: set = field(default_factory=set)
+
+
+@dataclass
+class _Sheet:
+    table_name: str
+    source: str
+    sheet: str
+    rows: int
+    columns: List[_Column]
+    terms: set = field(default_factory=set)
+
+
+class TableStore:
+    """SQLite store of typed Excel sheets with column statistics."""
+
+    def __init__(self, path: str, max_category_values: int):
+        self.path = Path(path)
+        self.max_category_values = max_category_values
+        self._lock = threading.Lock()
+        self._catalog: Optional[Tuple[float, List[_Sheet]]] = None  # (db mtime, sheets)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection that commits on success and is always closed."""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def ingest_excel(self, file_path: str) -> int:
+        """Store every sheet of an Excel file (replacing older versions); returns the sheet count."""
+        import pandas as pd
+        from app.services.documents import file_sha256
+
+        source, digest = Path(file_path).name, file_sha256(file_path)
+        with self._lock, self.connect() as db:
+            stored = db.execute("SELECT sha256, COUNT(*) FROM sheets WHERE source = ? GROUP BY sha256",
+                                (source,)).fetchall()
+            if len(stored) == 1 and stored[0][0] == digest:
+                return stored[0][1]
+            self._drop_source(db, source)
+            sheets = pd.read_excel(file_path, sheet_name=None)
+            for sheet_name, df in sheets.items():
+                self._store_sheet(db, source, str(sheet_name), digest, df)
+        metrics.inc("table_sheets_ingested_total", len(sheets))
+        return len(sheets)
+
+    def _drop_source(self, db: sqlite3.Connection, source: str) -> int:
+        tables = [r[0] for r in db.execute("SELECT table_name FROM sheets WHERE source = ?", (source,))]
+        for table in tables:
+            db.execute(f'DROP TABLE IF EXISTS "{table}"')
+            for meta in ("sheets", "columns", "column_values"):
+                db.execute(f"DELETE FROM {meta} WHERE table_name = ?", (table,))
+        return len(tables)
+
+    def _store_sheet(self, db: sqlite3.Connection, source: str, sheet: str, digest: str, df):
+        import pandas as pd
+
+        df = df.dropna(how="all").dropna(axis=1, how="all")
+        table = "t_" + hashlib.sha1(f"{source}\0{sheet}".encode()).hexdigest()[:16]
+        columns, data = [], {"_row": (df.index + 2).tolist()}  # Header is Excel row 1
+        for position, name in enumerate(df.columns):
+            series, sql_name = df[name], f"c{position}"
+            kind, values = self._typed(series)
+            columns.append((position, str(name), sql_name, kind, series))
+            data[sql_name] = values
+
+        ddl = ", ".join(f'{c[2]} {"REAL" if c[3] == "number" else "TEXT"}' for c in columns)
+        db.execute(f'CREATE TABLE "{table}" (_row INTEGER PRIMARY KEY{", " + ddl if ddl else ""})')
+        names = ["_row"] + [c[2] for c in columns]
+        db.executemany(
+            f'INSERT INTO "{table}" ({", ".join(names)}) VALUES ({", ".join("?" * len(names))})',
+            zip(*(data[n] for n in names)),
+        )
+        db.execute("INSERT INTO sheets VALUES (?, ?, ?, ?, ?, ?)", (table, source, sheet, digest, len(df), time.time()))
+
+        for position, name, sql_name, kind, series in columns:
+            values = pd.Series(data[sql_name], dtype="object")
+            present = values.dropna()
+            stats = {"non_null": int(len(present)), "distinct_count": int(present.nunique())}
+            if kind == "number" and len(present):
+                numeric = present.astype(float)
+                stats.update(min=float(numeric.min()), max=float(numeric.max()),
+                             sum=float(numeric.sum()), mean=float(numeric.mean()))
+            elif kind == "date" and len(present):
+                stats.update(min=str(present.min()), max=str(present.max()))
+            db.execute(
+                "INSERT INTO columns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (table, position, name, sql_name, kind, stats["non_null"], stats["distinct_count"],
+                 stats.get("min"), stats.get("max"), stats.get("sum"), stats.get("mean")),
+            )
+            if kind == "text" and 0 < stats["distinct_count"] <= self.max_category_values:
+                db.executemany(
+                    "INSERT INTO column_values VALUES (?, ?, ?, ?)",
+                    [(table, sql_name, _norm(v), v) for v in present.unique() if _norm(v)],
+                )
+
+    @staticmethod
+    def _typed(series) -> Tuple[str, List]:
+        """Column kind and its values as Python objects (None for missing)."""
+        import pandas as pd
+        from pandas.api import types
+
+        present = series.notna()
+        if types.is_bool_dtype(series) or types.is_numeric_dtype(series):
+            return "number", [float(v) if ok else None for v, ok in zip(series, present)]
+        if types.is_datetime64_any_dtype(series):
+            return "date", [v.strftime("%Y-%m-%d") if ok else None for v, ok in zip(series, present)]
+        # Numbers typed as text ("1,20,000", " 45 ") are numbers if nearly all of them parse
+        numeric = pd.to_numeric(series.astype(str).str.replace(",", "").str.strip(), errors="coerce")
+        if present.any() and numeric[present].notna().mean() >= 0.9:
+            return "number", [float(v) if ok and v == v else None for v, ok in zip(numeric, present)]
+        return "text", [str(v).strip() if ok else None for v, ok in zip(series, present)]
+
+    # ------------------------------------------------------------------
+    # Catalog
+    # ------------------------------------------------------------------
+
+    def catalog(self) -> List[_Sheet]:
+        """All sheets with their columns; re-read only when the database file changed."""
+        try:
+            mtime = max(p.stat().st_mtime for p in (self.path, Path(f"{self.path}-wal")) if p.exists())
+        except ValueError:
+            return []
+        if self._catalog is None or self._catalog[0] != mtime:
+            with self.connect() as db:
+                sheets = {
+                    r[0]: _Sheet(r[0], r[1], r[2], r[3], [], _terms(r[2]))
+                    for r in db.execute("SELECT table_name, source, sheet, rows FROM sheets")
+                }
+                for table, name, sql_name, kind in db.execute(
+                        "SELECT table_name, name, sql_name, kind FROM columns ORDER BY table_name, position"):
+                    if table in sheets:
+                        sheets[table].columns.append(_Column(name, sql_name, kind, _terms(name)))
+            self._catalog = (mtime, list(sheets.values()))
+        return self._catalog[1]
+
+    def stats(self, source: Optional[str] = None) -> List[Dict]:
+        """Sheets with per-column statistics (all sources, or one)."""
+        with self.connect() as db:
+            db.row_factory = sqlite3.Row
+            where, args = ("WHERE source = ?", (source,)) if source else ("", ())
+            sheets = [dict(r) for r in db.execute(f"SELECT * FROM sheets {where} ORDER BY source, sheet", args)]
+            for sheet in sheets:
+                sheet["columns"] = [
+                    {k: r[k] for k in r.keys() if k not in ("table_name", "sql_name")}
+                    for r in db.execute("SELECT * FROM columns WHERE table_name = ? ORDER BY position",
+                                        (sheet["table_name"],))
+                ]
+        return sheets
+
+
+class TableQueryEngine:
+    """Answers aggregate and lookup questions over TableStore sheets with SQL."""
+
+    def __init__(self, store: TableStore, min_score: float, lookup_max_rows: int):
+        self.store = store
+        self.min_score = min_score
+        self.lookup_max_rows = lookup_max_rows
+
+    def answer(self, question: str) -> Optional[Dict]:
+        catalog = self.store.catalog()
+        if not catalog:
+            return None
+        q = question.lower()
+        aggregate, keyword = next(((name, m.group(1)) for name, pattern in _AGGREGATES
+                                   for m in [pattern.search(q)] if m), (None, None))
+        words = _words(q)
+        terms = {_stem(w) for w in words if w not in _STOPWORDS}
+
+        with self.store.connect() as db:
+            values = self._value_filters(db, words)
+            best = None
+            for sheet in catalog:
+                plan = self._plan(sheet, aggregate, keyword, terms, values.get(sheet.table_name, {}), q)
+                if plan and (best is None or plan["score"] > best["score"]):
+                    best = plan
+            if best is None:
+                return None
+            return self._execute(db, best)
+
+    @staticmethod
+    def _value_filters(db: sqlite3.Connection, words: List[str]) -> Dict[str, Dict[str, Dict]]:
+        """Question n-grams that are values of text columns: {table: {sql_name: {norm: value}}}."""
+        grams = {" ".join(words[i:i + n]) for n in range(1, 5) for i in range(len(words) - n + 1)}
+        grams = [g for g in grams if g not in _STOPWORDS]
+        found: Dict[str, Dict[str, Dict]] = {}
+        if not grams:
+            return found
+        marks = ", ".join("?" * len(grams))
+        for table, sql_name, norm, value in db.execute(
+                f"SELECT table_name, sql_name, norm, value FROM column_values WHERE norm IN ({marks})", grams):
+            found.setdefault(table, {}).setdefault(sql_name, {})[norm] = value
+        # Keep the longest matches: "savings b" wins over "b"
+        for columns in found.values():
+            for sql_name, matches in columns.items():
+                columns[sql_name] = {
+                    norm: value for norm, value in matches.items()
+                    if not any(norm != other and f" {norm} " in f" {other} " for other in matches)
+                }
+        return found
+
+    def _plan(self, sheet: _Sheet, aggregate: Optional[str], keyword: Optional[str], terms: set,
+              values: Dict[str, Dict], question: str) -> Optional[Dict]:
+        filter_terms = {_stem(w) for matches in values.values() for norm in matches for w in norm.split()}
+        column_terms = terms - filter_terms
+
+        target, target_score = None, 0.0
+        for column in sheet.columns:
+            if not column.terms or column.sql_name in values:
+                continue
+            if aggregate in ("sum", "avg", "max", "min") and column.kind != "number":
+                continue
+            score = len(column.terms & column_terms) / len(column.terms)
+            if score > target_score:
+                target, target_score = column, score
+
+        filters = [(sql_name, list(matches.values())) for sql_name, matches in values.items() if matches]
+        if aggregate in ("max", "min") and filters and any(
+                keyword in _words(c.name) for c in sheet.columns if c.terms & column_terms):
+            # "minimum balance for Savings B": the keyword belongs to a column name ("Total X" still sums)
+            return self._plan(sheet, None, None, terms, values, question)
+        date_filters = self._date_filters(sheet, question, values)
+        sheet_score = len(sheet.terms & column_terms) / len(sheet.terms) if sheet.terms else 0.0
+
+        if aggregate in ("sum", "avg", "max", "min"):
+            if target is None or target_score < self.min_score:
+                return None
+        elif aggregate == "count":
+            # Counting rows needs the question to name the sheet ("how many loans") or a
+            # value in it ("... in Kathmandu"); a year or month alone matches any question.
+            # "How many members" naming a whole numeric column (Members) asks for the
+            # quantity in that column, not for a number of rows: leave it to retrieval.
+            if not (filters or sheet_score >= self.min_score):
+                return None
+            if target is not None and target.kind == "number" and target_score >= 1.0:
+                return None
+            target = None
+        else:
+            # Lookup: needs both a row filter and a column to read
+            if not filters or target is None or target_score < self.min_score:
+                return None
+            aggregate = "lookup"
+
+        score = target_score + sheet_score + len(filters) + len(date_filters) * 0.5
+        return {"sheet": sheet, "aggregate": aggregate, "target": target, "filters": filters,
+                "date_filters": date_filters, "score": score}
+
+    @staticmethod
+    def _date_filters(sheet: _Sheet, question: str, values: Dict[str, Dict]) -> List[Tuple[str, str, List]]:
+        """Quarter / month / year mentions applied to the sheet's first date column."""
+        date_column = next((c for c in sheet.columns if c.kind == "date"), None)
+        if date_column is None:
+            return []
+        matched = {norm for matches in values.values() for norm in matches}
+        filters = []
+        quarter = _QUARTER_RE.search(question)
+        if quarter and f"q{quarter.group(1)}" not in matched:
+            first = (int(quarter.group(1)) - 1) * 3 + 1
+            filters.append((date_column.sql_name, "month", [first, first + 1, first + 2]))
+        else:
+            # "may" is far more often the verb than the month
+            months = sorted({_MONTHS[w] for w in _words(question) if w in _MONTHS and w != "may" and w not in matched})
+            if months:
+                filters.append((date_column.sql_name, "month", months))
+        years = [int(y) for y in _YEAR_RE.findall(question) if y not in matched]
+        if years:
+            filters.append((date_column.sql_name, "year", years))
+        return filters
+
+    def _execute(self, db: sqlite3.Connection, plan: Dict) -> Optional[Dict]:
+        sheet, target, aggregate = plan["sheet"], plan["target"], plan["aggregate"]
+        columns = {c.sql_name: c for c in sheet.columns}
+        where, args, described = [], [], []
+        for sql_name, allowed in plan["filters"]:
+            where.append(f"{sql_name} IN ({', '.join('?' * len(allowed))})")
+            args.extend(allowed)
+            described.append(f"{columns[sql_name].name} = {' or '.join(map(str, allowed))}")
+        for sql_name, part, allowed in plan["date_filters"]:
+            fmt = "%m" if part == "month" else "%Y"
+            where.append(f"CAST(strftime('{fmt}', {sql_name}) AS INTEGER) IN ({', '.join('?' * len(allowed))})")
+            args.extend(allowed)
+            described.append(f"{columns[sql_name].name} in {part} {', '.join(map(str, allowed))}")
+        if target is not None:
+            where.append(f"{target.sql_name} IS NOT NULL")
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        table = f'"{sheet.table_name}"'
+
+        rows = [r[0] for r in db.execute(f"SELECT _row FROM {table} {clause} ORDER BY _row", args)]
+        if not rows:
+            return None
+        scope = f" where {' and '.join(described)}" if described else ""
+
+        if aggregate == "lookup":
+            if len(rows) > self.lookup_max_rows:
+                return None
+            found = db.execute(f"SELECT _row, {target.sql_name} FROM {table} {clause} ORDER BY _row", args).fetchall()
+            shown = [_format_number(v) if target.kind == "number" else str(v) for _, v in found]
+            answer = f"{target.name}{scope}: " + "; ".join(f"{v} (row {r})" for (r, _), v in zip(found, shown))
+            expression = f"{target.name}{scope}"
+        elif aggregate in ("max", "min"):
+            order = "DESC" if aggregate == "max" else "ASC"
+            row, value = db.execute(
+                f"SELECT _row, {target.sql_name} FROM {table} {clause} ORDER BY {target.sql_name} {order}, _row LIMIT 1",
+                args).fetchone()
+            rows = [row]
+            answer = f"{_AGGREGATE_LABELS[aggregate]} {target.name}{scope}: {_format_number(value)} (row {row})"
+            expression = f"{aggregate.upper()}({target.name}){scope}"
+        else:
+            sql = "COUNT(*)" if aggregate == "count" else f"{aggregate.upper()}({target.sql_name})"
+            value = db.execute(f"SELECT {sql} FROM {table} {clause}", args).fetchone()[0]
+            label = _AGGREGATE_LABELS[aggregate] + (f" {target.name}" if target is not None else "")
+            answer = f"{label}{scope}: {_format_number(value)}"
+            expression = f"{aggregate.upper()}({target.name if target is not None else '*'}){scope}"
+
+        answer += (f"\n\nComputed exactly from {len(rows)} row(s) of sheet '{sheet.sheet}' in {sheet.source}"
+                   f" (rows {_row_ranges(rows)}).")
+        citation = {
+            "source": sheet.source,
+            "page": sheet.sheet,
+            "section": f"Rows {_row_ranges(rows)}",
+            "excerpt": f"{expression} over {len(rows)} row(s)",
+            "relevance_score": 1.0,
+        }
+        return {"answer": answer, "citations": [citation], "sources_count": 1}
+
+
+@lru_cache()
+def get_table_store() -> Optional[TableStore]:
+    """Return the process-wide TableStore, or None if TABLE_DB_PATH is unset."""
+    if not settings.TABLE_DB_PATH:
+        return None
+    return TableStore(settings.TABLE_DB_PATH, settings.TABLE_MAX_CATEGORY_VALUES)
+
+
+@lru_cache()
+def get_table_query_engine() -> Optional[TableQueryEngine]:
+    """Return the process-wide TableQueryEngine, or None if tables or the fast path are disabled."""
+    store = get_table_store()
+    if store is None or not settings.TABLE_QUERY_ENABLED:
+        return None
+    return TableQueryEngine(store, settings.TABLE_QUERY_MIN_SCORE, settings.TABLE_LOOKUP_MAX_ROWS)
@@ -0,0 +1,81 @@
+"""
+Thin clients for the shared vector service (see app/sidecar.py).
+
+When VECTOR_SERVICE_URL is set, API workers use these instead of loading their
+own SentenceTransformer model and opening their own ChromaDB PersistentClient.
+They expose the same methods the rest of the app uses on EmbeddingService and
+on a Chroma collection, so callers do not need to know which mode is active.
+"""
+import threading
+from typing import Dict, List, Optional
+import requests
+from app.core.config import settings
+from app.core.database import VectorStore
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    """One keep-alive HTTP session per thread."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _local.session = session
+    return session
+
+
+def _call(method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+    """Send a request to the vector service and return the decoded JSON body."""
+    url = f"{settings.VECTOR_SERVICE_URL.rstrip('/')}{path}"
+    try:
+        response = _session().request(method, url, json=payload, timeout=settings.VECTOR_SERVICE_TIMEOUT)
+    except requests.RequestException as e:
+        raise ConnectionError(
+            f"Cannot reach vector service at {settings.VECTOR_SERVICE_URL}. "
+            "Start it with: python -m app.sidecar"
+        ) from e
+    if response.status_code != 200:
+        raise Exception(f"Vector service error ({response.status_code}): {response.text}")
+    return response.json()
+
+
+class RemoteEmbeddingService:
+    """EmbeddingService look-alike backed by the sidecar's batched model."""
+
+    def embed_text(self, text: str) -> List[float]:
+        return _call("POST", "/embed", {"texts": [text]})["embeddings"][0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return _call("POST", "/embed", {"texts": texts})["embeddings"]
+
+
+class RemoteCollection(VectorStore):
+    """Chroma collection look-alike; every call is served by the sidecar."""
+
+    def count(self) -> int:
+        return _call("GET", "/collection/count")["count"]
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict],
+            embeddings: Optional[List[List[float]]] = None):
+        _call("POST", "/collection/add", {
+            "ids": ids,
+            "documents": documents,
+            "metadatas": metadatas,
+            "embeddings": embeddings,
+        })
+
+    def query(self, query_embeddings: Optional[List[List[float]]] = None, n_results: int = 10,
+              where: Optional[Dict] = None, query_texts: Optional[List[str]] = None) -> Dict:
+        return _call("POST", "/collection/query", {
+            "query_embeddings": query_embeddings,
+            "query_texts": query_texts,
+            "n_results": n_results,
+            "where": where,
+        })
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None) -> Dict:
+        return _call("POST", "/collection/get", {"ids": ids, "where": where, "include": include})
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        _call("POST", "/collection/delete", {"ids": ids, "where": where})
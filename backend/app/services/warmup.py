@@ -0,0 +1,153 @@
+"""
+Background warm-up of the embedding model and the Ollama model.
+
+Both models are loaded lazily, so the first chat after a deploy (or after
+Ollama evicted an idle model) used to wait for SentenceTransformer to load,
+for Ollama model detection and for Ollama to read the weights into RAM. After
+bind, WarmupManager does that work up front:
+
+  1. embedding: loads the model of the live index, embeds a probe text and
+     runs one vector query so the store is opened too;
+  2. llm: detects the Ollama model and sends a one-token generation with
+     OLLAMA_KEEP_ALIVE.
+
+It then re-pings Ollama every WARMUP_REFRESH_INTERVAL_SECONDS during
+WARMUP_REFRESH_HOURS, so the model is not evicted between chats in working
+hours (ChatOllama's requests reset Ollama's keep-alive to its default). A
+failed step is retried on the next refresh. GET /ready reports the state.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+COMPONENTS = ("embedding", "llm")
+
+
+def _within_hours(spec: Optional[str], now: datetime) -> bool:
+    """True if now's local time is inside "HH:MM-HH:MM" (may wrap past midnight)."""
+    if not spec:
+        return True
+    start, end = (datetime.strptime(part.strip(), "%H:%M").time() for part in spec.split("-"))
+    current = now.time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+class WarmupManager:
+    """Loads the models once after startup and keeps the Ollama model resident."""
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.components: Dict[str, Dict] = {
+            name: {"status": "pending", "seconds": None, "error": None, "last_success": None}
+            for name in COMPONENTS
+        }
+        self.last_refresh: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return all(c["status"] == "ready" for c in self.components.values())
+
+    def state(self) -> Dict:
+        with self._lock:
+            components = {name: dict(c) for name, c in self.components.items()}
+        return {
+            "ready": all(c["status"] == "ready" for c in components.values()),
+            "components": components,
+            "last_refresh": self.last_refresh,
+            "refresh_hours": settings.WARMUP_REFRESH_HOURS,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+        }
+
+    def start(self):
+        """Run the warm-up, then the refresh loop, in a daemon thread."""
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        self.warm_embedding()
+        self.warm_llm()
+        metrics.set("warmup_ready", int(self.ready))
+        if self.ready:
+            logger.info(f"Warm-up complete in {time.time() - self.started_at:.1f}s")
+        while not self._stop.wait(settings.WARMUP_REFRESH_INTERVAL_SECONDS):
+            self.refresh()
+
+    def refresh(self):
+        """Retry failed steps and re-pin the Ollama model during working hours."""
+        from app.services.admission import get_admission_controller
+
+        if self.components["embedding"]["status"] != "ready":
+            self.warm_embedding()
+        if not _within_hours(settings.WARMUP_REFRESH_HOURS, datetime.now()):
+            return  # Let Ollama evict the model overnight
+        # The ping holds an LLM slot the admission controller knows about, and only when idle
+        with get_admission_controller().idle_slot() as admitted:
+            if not admitted:
+                return  # A generation is running or queued: the model is loaded anyway
+            self.warm_llm()
+        self.last_refresh = time.time()
+        metrics.set("warmup_ready", int(self.ready))
+
+    def warm_embedding(self):
+        def step():
+            from app.core.database import get_vector_store
+            from app.services.embeddings import get_embedding_service
+
+            embedding = get_embedding_service().embed_text("warm-up")
+            store = get_vector_store()
+            if store.count():
+                store.query(query_embeddings=[embedding], n_results=1)
+
+        self._step("embedding", step)
+
+    def warm_llm(self):
+        def step():
+            from app.services.rag import get_rag_service
+            return get_rag_service().warm_up_llm(settings.WARMUP_TIMEOUT_SECONDS)
+
+        model = self._step("llm", step)
+        if model:
+            with self._lock:
+                self.components["llm"]["model"] = model
+
+    def _step(self, name: str, fn):
+        component = self.components[name]
+        if component["status"] != "ready":
+            component["status"] = "warming"
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            with self._lock:
+                component.update(status="failed", error=str(e))
+            metrics.inc("warmup_runs_total", component=name, result="failed")
+            logger.warning(f"Warm-up of {name} failed: {e}")
+            return None
+        seconds = round(time.perf_counter() - started, 3)
+        with self._lock:
+            component.update(status="ready", seconds=seconds, error=None, last_success=time.time())
+        metrics.inc("warmup_runs_total", component=name, result="ok")
+        metrics.set("warmup_seconds", seconds, component=name)
+        return result
+
+
+@lru_cache()
+def get_warmup_manager() -> WarmupManager:
+    """Return the process-wide WarmupManager."""
+    return WarmupManager()
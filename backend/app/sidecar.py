@@ -0,0 +1,246 @@
+"""
+Shared embedding / vector-store sidecar.
+
+One process owns the SentenceTransformer model and the ChromaDB
+PersistentClient and serves embed/search/add over a loopback HTTP socket, so
+API workers become thin clients (app/services/vector_client.py) and adding
+uvicorn workers adds HTTP concurrency without adding model copies or SQLite
+writers:
+
+    python -m app.sidecar
+    VECTOR_SERVICE_URL=http://127.0.0.1:8765 uvicorn app.main:app --workers 4
+
+Concurrent /embed calls are coalesced into micro-batches (EMBED_BATCH_MAX_SIZE,
+EMBED_BATCH_WAIT_MS) and every write goes through a single writer thread.
+The sidecar also performs the startup ingestion of EXISTING_DOCS_DIR, which
+API workers skip in this mode. Always run it with a single worker.
+"""
+import argparse
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# The sidecar IS the vector service: its own factories must use the local
+# model and ChromaDB even if the shared .env points workers at VECTOR_SERVICE_URL.
+settings.VECTOR_SERVICE_URL = None
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+
+class AddRequest(BaseModel):
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Dict[str, Any]]
+    embeddings: Optional[List[List[float]]] = None
+
+
+class QueryRequest(BaseModel):
+    query_embeddings: Optional[List[List[float]]] = None
+    query_texts: Optional[List[str]] = None
+    n_results: int = 10
+    where: Optional[Dict[str, Any]] = None
+
+
+class GetRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    where: Optional[Dict[str, Any]] = None
+    include: Optional[List[str]] = None
+
+
+class DeleteRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    where: Optional[Dict[str, Any]] = None
+
+
+class EmbeddingBatcher:
+    """Coalesce concurrent embed requests into batched model.encode calls."""
+
+    def __init__(self, max_batch_size: int, max_wait_ms: int):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.texts = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # The model runs on one dedicated thread; batching is what gives throughput.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        self._executor.shutdown(wait=False)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[List[str], asyncio.Future]] = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            all_texts = [text for texts, _ in batch for text in texts]
+            try:
+                from app.services.embeddings import get_embedding_service
+                vectors = await loop.run_in_executor(
+                    self._executor, get_embedding_service().embed_documents, all_texts
+                )
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(all_texts)} texts failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.texts += len(all_texts)
+            offset = 0
+            for texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(texts)])
+                offset += len(texts)
+
+
+batcher = EmbeddingBatcher(settings.EMBED_BATCH_MAX_SIZE, settings.EMBED_BATCH_WAIT_MS)
+# Single writer: ChromaDB's SQLite store sees one writer no matter how many API workers.
+writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-writer")
+
+
+def _collection():
+    from app.services.rag import get_rag_service
+    return get_rag_service().collection
+
+
+async def _read(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+async def _write(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(writer, lambda: fn(*args, **kwargs))
+
+
+def _load_documents():
+    try:
+        from app.services.startup import load_existing_documents
+        load_existing_documents()
+    except Exception as e:
+        logger.warning(f"Could not load existing documents during startup: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    batcher.start()
+    if settings.LOAD_DOCUMENTS_ON_STARTUP:
+        threading.Thread(target=_load_documents, name="startup-document-loader", daemon=True).start()
+    logger.info(f"Vector service ready (model: {settings.EMBEDDING_MODEL}, store: {settings.CHROMA_DIR})")
+    yield
+    await batcher.stop()
+    writer.shutdown(wait=True)
+
+
+app = FastAPI(title=f"{settings.PROJECT_NAME} vector service", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "healthy",
+        "embedding_model": settings.EMBEDDING_MODEL,
+        "embed_batches": batcher.batches,
+        "embedded_texts": batcher.texts,
+    }
+
+
+@app.post("/embed")
+async def embed(request: EmbedRequest):
+    return {"embeddings": await batcher.embed(request.texts)}
+
+
+@app.get("/collection/count")
+async def count():
+    return {"count": await _read(_collection().count)}
+
+
+@app.post("/collection/add")
+async def add(request: AddRequest):
+    embeddings = request.embeddings or await batcher.embed(request.documents)
+    await _write(
+        _collection().add,
+        ids=request.ids,
+        embeddings=embeddings,
+        documents=request.documents,
+        metadatas=request.metadatas,
+    )
+    return {"added": len(request.ids)}
+
+
+@app.post("/collection/query")
+async def query(request: QueryRequest):
+    embeddings = request.query_embeddings
+    if embeddings is None:
+        embeddings = await batcher.embed(request.query_texts or [])
+    kwargs = {"query_embeddings": embeddings, "n_results": request.n_results}
+    if request.where:
+        kwargs["where"] = request.where
+    return await _read(_collection().query, **kwargs)
+
+
+@app.post("/collection/get")
+async def get(request: GetRequest):
+    kwargs = {k: v for k, v in request.model_dump().items() if v is not None}
+    return await _read(_collection().get, **kwargs)
+
+
+@app.post("/collection/delete")
+async def delete(request: DeleteRequest):
+    kwargs = {k: v for k, v in request.model_dump().items() if v is not None}
+    await _write(_collection().delete, **kwargs)
+    return {"status": "deleted"}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the shared embedding/vector service.")
+    parser.add_argument("--host", default=settings.VECTOR_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=settings.VECTOR_SERVICE_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # One process on purpose: it is the single owner of the model and the store.
+    uvicorn.run(app, host=args.host, port=args.port, workers=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Chunking benchmark: LegalTextChunker vs LangChain's RecursiveCharacterTextSplitter.
+
+Reports, per document, chunking time, chunk count and the number of characters
+that would be embedded, plus retrieval quality (hit@k and MRR) over a set of
+probe questions about the bundled Acts.
+
+Run from the backend folder:
+    python -m benchmarks.chunking_benchmark
+    python -m benchmarks.chunking_benchmark --docs ../data/documents --repeat 50 --top-k 5
+
+Retrieval uses the configured sentence-transformers model when it is installed
+and falls back to a TF-IDF retriever otherwise (the report says which).
+"""
+import argparse
+import math
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from app.core.config import settings
+from app.services.chunking import LegalTextChunker
+
+# (question, phrase the retrieved chunk must contain)
+PROBES: List[Tuple[str, str]] = [
+    ("How many citizens are needed to form a cooperative organization?",
+     "three nepali citizens in the minimum"),
+    ("Can a person be a member of more than one cooperative of the same nature?",
+     "no person shall be a member of more than one organization of the same nature"),
+    ("What share of women members should the board of directors have?",
+     "thirty three percent women members"),
+    ("Who determines the reference interest rate for savings and credit?",
+     "determine the reference interests rate"),
+    ("How much is deposited annually in the cooperative promotion fund?",
+     "zero point two five percent"),
+    ("Within what time must a cooperative get its accounts audited?",
+     "audited within three months from the expiry of the fiscal year"),
+    ("Why can savings and credit organizations create a stabilization fund?",
+     "stabilization fund to protect themselves from the probable risks"),
+    ("What is the punishment for offences under section 122?",
+     "an imprisonment up to one year and a fine up to one hundred thousand rupees"),
+    ("When can the controller revoke the license of a certifying authority?",
+     "the controller may revoke a license issued under this act"),
+    ("What must a subscriber do to protect the private key?",
+     "exercise reasonable care to retain control of the private key"),
+    ("What is the offence of unauthorized access to a computer?",
+     "uses such a computer without authorization of the owner"),
+    ("Is publishing illegal material on the internet an offence?",
+     "publishes or displays any material in the electronic media"),
+    ("What is computer fraud involving ATM cards?",
+     "inventory or atm card in connivance"),
+    ("Who constitutes the Information Technology Tribunal?",
+     "constitute a three member information technology tribunal"),
+]
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    text = re.sub(r"-\n(?=[a-z])", "", text)
+    return " ".join(text.lower().split())
+
+
+def load_pages(docs_dir: Path) -> Dict[str, List[Dict]]:
+    from app.services.documents import get_document_service
+
+    documents = {}
+    for path in sorted(docs_dir.glob("*.pdf")):
+        documents[path.name] = get_document_service().process_document(str(path))
+    return documents
+
+
+def legal_chunks(chunker: LegalTextChunker) -> Callable[[List[Dict]], List[str]]:
+    return lambda pages: [c["text"] for c in chunker.split_pages(pages)]
+
+
+def recursive_chunks() -> Callable[[List[Dict]], List[str]]:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
+    return lambda pages: [t for page in pages for t in splitter.split_text(page["text"]) if t.strip()]
+
+
+def time_chunker(split: Callable, pages: List[Dict], repeat: int) -> Tuple[float, List[str]]:
+    chunks = split(pages)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        split(pages)
+    return (time.perf_counter() - start) / repeat * 1000, chunks
+
+
+class TfidfRetriever:
+    """Dependency-free fallback retriever (cosine over TF-IDF vectors)."""
+
+    name = "tf-idf"
+
+    def __init__(self, texts: List[str]):
+        docs = [Counter(TOKEN_RE.findall(t.lower())) for t in texts]
+        df = Counter(term for doc in docs for term in doc)
+        self.idf = {term: math.log(len(docs) / count) + 1 for term, count in df.items()}
+        self.vectors = [self._vector(doc) for doc in docs]
+
+    def _vector(self, counts: Counter) -> Dict[str, float]:
+        vec = {t: c * self.idf.get(t, 0.0) for t, c in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {t: v / norm for t, v in vec.items()}
+
+    def search(self, query: str, k: int) -> List[int]:
+        q = self._vector(Counter(TOKEN_RE.findall(query.lower())))
+        scores = [sum(w * vec.get(t, 0.0) for t, w in q.items()) for vec in self.vectors]
+        return sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:k]
+
+
+class EmbeddingRetriever:
+    """Dense retrieval with the configured sentence-transformers model."""
+
+    def __init__(self, texts: List[str]):
+        import numpy as np
+        from app.services.embeddings import get_embedding_service
+
+        self.name = settings.EMBEDDING_MODEL
+        self.np = np
+        self.service = get_embedding_service()
+        self.matrix = np.asarray(self.service.embed_documents(texts), dtype="float32")
+        self.matrix /= np.linalg.norm(self.matrix, axis=1, keepdims=True) + 1e-12
+
+    def search(self, query: str, k: int) -> List[int]:
+        q = self.np.asarray(self.service.embed_text(query), dtype="float32")
+        scores = self.matrix @ (q / (self.np.linalg.norm(q) + 1e-12))
+        return list(self.np.argsort(-scores)[:k])
+
+
+def make_retriever(texts: List[str]):
+    try:
+        import sentence_transformers  # noqa: F401
+    except ImportError:
+        return TfidfRetriever(texts)
+    return EmbeddingRetriever(texts)
+
+
+def retrieval_quality(chunks: List[str], k: int) -> Tuple[str, float, float]:
+    retriever = make_retriever(chunks)
+    normalized = [normalize(c) for c in chunks]
+    hits, reciprocal = 0, 0.0
+    for question, phrase in PROBES:
+        for rank, idx in enumerate(retriever.search(question, k), start=1):
+            if phrase in normalized[idx]:
+                hits += 1
+                reciprocal += 1 / rank
+                break
+    return retriever.name, hits / len(PROBES), reciprocal / len(PROBES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default=settings.EXISTING_DOCS_DIR, help="folder with PDF documents")
+    parser.add_argument("--repeat", type=int, default=20, help="timing repetitions per document")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    documents = load_pages(Path(args.docs))
+    if not documents:
+        raise SystemExit(f"No PDF documents found in {args.docs}")
+
+    chunkers = {
+        "legal": legal_chunks(LegalTextChunker(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)),
+        "recursive": recursive_chunks(),
+    }
+    corpus: Dict[str, List[str]] = {name: [] for name in chunkers}
+
+    print(f"{'document':<40} {'chunker':<10} {'ms':>8} {'chunks':>7} {'chars':>9} {'max':>6}")
+    for filename, pages in documents.items():
+        for name, split in chunkers.items():
+            ms, chunks = time_chunker(split, pages, args.repeat)
+            corpus[name].extend(chunks)
+            print(f"{filename[:40]:<40} {name:<10} {ms:>8.2f} {len(chunks):>7} {sum(map(len, chunks)):>9} {max(map(len, chunks)):>6}")
+
+    legal, recursive = corpus["legal"], corpus["recursive"]
+    print()
+    print(f"chunk reduction:     {1 - len(legal) / len(recursive):.1%} "
+          f"({len(recursive)} -> {len(legal)})")
+    print(f"embedded characters: {1 - sum(map(len, legal)) / sum(map(len, recursive)):.1%} fewer")
+
+    print()
+    print(f"{'chunker':<10} {'retriever':<20} {'hit@' + str(args.top_k):>7} {'MRR':>6}")
+    for name, chunks in corpus.items():
+        retriever, hit_rate, mrr = retrieval_quality(chunks, args.top_k)
+        print(f"{name:<10} {retriever:<20} {hit_rate:>7.2f} {mrr:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
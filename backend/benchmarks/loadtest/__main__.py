@@ -0,0 +1,148 @@
+"""
+End-to-end load test: the whole API under N concurrent users, against a fake Ollama.
+
+Starts a fake Ollama (streaming, with configurable latency and token rate)
+and the API in a temporary working directory (fresh users.json, Chroma dir,
+uploads). It registers and logs in --users synthetic users, uploads
+--seed-docs, then replays a mix of /chat/query (with and without a
+session), uploads, document listing and status polling at --rate requests
+per second for --duration seconds.
+
+Run from the backend folder (needs httpx: pip install httpx):
+    python -m benchmarks.loadtest
+    python -m benchmarks.loadtest --users 500 --rate 50 --duration 120 --ramp-up 30
+    python -m benchmarks.loadtest --mix chat=80,status=20 --ollama-tokens-per-second 10 --ollama-parallel 2
+    python -m benchmarks.loadtest --env VECTOR_BACKEND=numpy --json report.json
+    python -m benchmarks.loadtest --latency-budget-ms 5000   # chat with a deadline: answer modes in the report
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000      # an already running API
+
+The report has, per endpoint, throughput, error rate and latency
+percentiles. A timeline per --interval seconds shows request rate, p95,
+requests in flight, the fake Ollama's queue and the API's event-loop lag
+(the event_loop_lag_ms gauge of /metrics). Client loop lag is shown too: if
+it grows, the load generator itself is saturated and its numbers are
+pessimistic.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+from benchmarks.loadtest import fake_ollama
+from benchmarks.loadtest.harness import BACKEND_DIR, DEFAULT_MIX, LoadTest, Servers, parse_mix
+
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value:.0f}"
+
+
+def print_report(report: dict):
+    print(
+        f"\n{report['users']} users, target {report['target_rps']} req/s for {report['duration_s']}s "
+        f"(+{report['drain_s']}s to drain): "
+        f"{report['completed']} requests, {report['throughput_rps']} req/s, "
+        f"{report['error_rate']:.1%} errors"
+        + (f", {report['skipped_client_saturated']} not sent (client at --max-in-flight)"
+           if report["skipped_client_saturated"] else "")
+    )
+    for label, stats in report["setup"].items():
+        print(f"  setup {label}: {stats['requests']} in p50 {_ms(stats['p50'])} / p95 {_ms(stats['p95'])} ms")
+    for error, count in report["setup_errors"].items():
+        print(f"  setup error {error}: {count}")
+
+    header = f"{'endpoint':<30} {'reqs':>6} {'err%':>6} {'req/s':>7} {'p50':>7} {'p90':>7} {'p95':>7} {'p99':>7} {'max':>7}"
+    print(f"\n{header}\n{'-' * len(header)}")
+    rows = list(report["endpoints"].items()) + [("all", {
+        "requests": report["completed"], "error_rate": report["error_rate"],
+        "throughput_rps": report["throughput_rps"], "latency_ms": report["latency_ms"],
+    })]
+    for label, stats in rows:
+        latency = stats["latency_ms"]
+        print(
+            f"{label:<30} {stats['requests']:>6} {stats['error_rate'] * 100:>5.1f}% {stats['throughput_rps']:>7} "
+            + " ".join(f"{_ms(latency[k]):>7}" for k in ("p50", "p90", "p95", "p99", "max"))
+        )
+    for label, stats in report["endpoints"].items():
+        failures = {k: v for k, v in stats["outcomes"].items() if not (k.isdigit() and int(k) < 400)}
+        if failures:
+            print(f"  {label} failures: {failures}")
+
+    if report["answer_modes"]:
+        print("  chat answer modes: " + ", ".join(f"{mode} {count}" for mode, count in sorted(report["answer_modes"].items())))
+
+    header = f"{'t(s)':>6} {'sent':>6} {'done':>6} {'err':>5} {'p95 ms':>8} {'inflight':>8} {'llm q':>6} {'loop lag':>9} {'client lag':>10}"
+    print(f"\n{header}\n{'-' * len(header)}")
+    for row in report["timeline"]:
+        print(
+            f"{row['t']:>6} {row['sent']:>6} {row['completed']:>6} {row['errors']:>5} {_ms(row['p95_ms']):>8} "
+            f"{row['in_flight']:>8} {'-' if row['llm_queued'] is None else row['llm_queued']:>6} "
+            f"{_ms(row['server_loop_lag_ms']):>9} {_ms(row['client_loop_lag_ms']):>10}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test the API with synthetic users and a fake Ollama.")
+    parser.add_argument("--users", type=int, default=50, help="synthetic users to register and log in")
+    parser.add_argument("--rate", type=float, default=10.0, help="target requests per second (Poisson arrivals)")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of load")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="seconds to ramp up to --rate")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds per timeline row")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="client-side cap on open requests")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per request")
+    parser.add_argument("--latency-budget-ms", type=int, help="latency budget sent with every chat question")
+    parser.add_argument("--setup-concurrency", type=int, default=8, help="parallel register/login calls")
+    parser.add_argument("--seed-docs", nargs="*", type=Path,
+                        default=sorted((BACKEND_DIR.parent / "data" / "documents").glob("*.pdf")),
+                        help="documents uploaded before the load (default: the bundled Acts)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="setting for the API process (repeatable)")
+    parser.add_argument("--startup-timeout", type=float, default=300.0, help="seconds to wait for GET /ready")
+    parser.add_argument("--url", help="test this running API instead of starting one (and no fake Ollama)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary working directory (logs, data)")
+    parser.add_argument("--json", type=Path, help="also write the report to this file")
+    fake_ollama.add_arguments(parser, prefix="ollama-")
+    args = parser.parse_args()
+
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        print("The load test needs httpx: pip install httpx", file=sys.stderr)
+        return 1
+    try:
+        mix = parse_mix(args.mix)
+        env = dict(item.split("=", 1) for item in args.env)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    def run(url, ollama_url=None):
+        test = LoadTest(
+            url, args.users, args.rate, args.duration, mix, ramp_up=args.ramp_up, interval=args.interval,
+            max_in_flight=args.max_in_flight, timeout=args.timeout, setup_concurrency=args.setup_concurrency,
+            seed_docs=args.seed_docs, ollama_url=ollama_url, latency_budget_ms=args.latency_budget_ms,
+        )
+        return asyncio.run(test.run())
+
+    ollama_args = {name[len("ollama_"):]: value for name, value in vars(args).items() if name.startswith("ollama_")}
+    try:
+        if args.url:
+            report = run(args.url.rstrip("/"))
+        else:
+            with Servers(ollama_args, env, args.startup_timeout, args.keep) as servers:
+                print(f"API at {servers.url}, fake Ollama at {servers.ollama_url}, data in {servers.workdir}")
+                report = run(servers.url, servers.ollama_url)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Fake Ollama server for load tests: canned answers at a configurable speed.
+
+    python -m benchmarks.loadtest.fake_ollama --port 11500
+    python -m benchmarks.loadtest.fake_ollama --tokens-per-second 15 --first-token-ms 800 --parallel 2
+
+Implements what the backend calls: GET /api/tags (model detection),
+POST /api/chat (ChatOllama, NDJSON stream) and POST /api/generate (chat
+sessions and warm-up, streamed or not). A generation waits
+--first-token-ms plus the prompt at --prompt-tokens-per-second, then emits
+--answer-tokens tokens at --tokens-per-second (each +/- --jitter). At most
+--parallel generations run at once, like OLLAMA_NUM_PARALLEL; the rest
+queue. GET /stats reports requests, active and queued generations.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = (
+    "According to the Cooperatives Act 2017, a cooperative must be registered with the Registrar "
+    "before it starts its transactions. The application is submitted with the by-laws, the list of "
+    "members and the share capital collected, and the Registrar decides within thirty days. Members "
+    "elect a board of directors at the general meeting, and the accounts are audited every fiscal "
+    "year by an auditor who is not a member. A cooperative that fails to follow these provisions "
+    "may be dissolved after a hearing."
+).split()
+
+
+class FakeOllama:
+    """Timing model and counters of the fake server."""
+
+    def __init__(self, model: str, tokens_per_second: float, first_token_ms: float, answer_tokens: int,
+                 prompt_tokens_per_second: float, parallel: int, jitter: float):
+        self.model = model
+        self.tokens_per_second = tokens_per_second
+        self.first_token_ms = first_token_ms
+        self.answer_tokens = answer_tokens
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.jitter = jitter
+        self.slots = asyncio.Semaphore(parallel)
+        self.requests = 0
+        self.active = 0
+        self.queued = 0
+        self.tokens = 0
+
+    def _vary(self, seconds: float) -> float:
+        return max(0.0, seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _answer(self, limit: int = None):
+        count = min(limit or self.answer_tokens, self.answer_tokens)
+        return [ANSWER[i % len(ANSWER)] + " " for i in range(count)]
+
+    async def generate(self, prompt_tokens: int, limit: int = None):
+        """Yield the answer tokens with the configured timing, inside a slot."""
+        self.requests += 1
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        try:
+            await asyncio.sleep(self._vary(self.first_token_ms / 1000 + prompt_tokens / self.prompt_tokens_per_second))
+            for i, token in enumerate(self._answer(limit)):
+                if i:
+                    await asyncio.sleep(self._vary(1 / self.tokens_per_second))
+                self.tokens += 1
+                yield token
+        finally:
+            self.active -= 1
+            self.slots.release()
+
+
+def _ndjson(chunks):
+    async def body():
+        async for chunk in chunks:
+            yield json.dumps(chunk) + "\n"
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+def create_app(fake: FakeOllama) -> FastAPI:
+    app = FastAPI(title="Fake Ollama")
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": fake.model, "model": fake.model, "size": 0}]}
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": fake.requests, "active": fake.active, "queued": fake.queued, "tokens": fake.tokens}
+
+    @app.post("/api/chat")
+    @app.post("/api/chat/")
+    async def chat(request: Request):
+        payload = await request.json()
+        prompt = " ".join(m.get("content", "") for m in payload.get("messages", []))
+        limit = (payload.get("options") or {}).get("num_predict")
+        started = time.perf_counter()
+
+        async def chunks():
+            count = 0
+            async for token in fake.generate(len(prompt.split()), limit):
+                count += 1
+                yield {"model": fake.model, "message": {"role": "assistant", "content": token}, "done": False}
+            yield {"model": fake.model, "message": {"role": "assistant", "content": ""}, "done": True,
+                   "prompt_eval_count": len(prompt.split()), "eval_count": count,
+                   "total_duration": int((time.perf_counter() - started) * 1e9)}
+
+        if payload.get("stream", True):
+            return _ndjson(chunks())
+        content = "".join([c["message"]["content"] async for c in chunks()])
+        return {"model": fake.model, "message": {"role": "assistant", "content": content}, "done": True}
+
+    @app.post("/api/generate")
+    @app.post("/api/generate/")
+    async def generate(request: Request):
+        payload = await request.json()
+        prompt = payload.get("prompt", "")
+        context = payload.get("context") or []
+        limit = (payload.get("options") or {}).get("num_predict")
+        prompt_tokens = len(prompt.split()) + len(payload.get("system", "").split())
+
+        async def chunks():
+            tokens = []
+            async for token in fake.generate(prompt_tokens, limit):
+                tokens.append(token)
+                yield {"model": fake.model, "response": token, "done": False}
+            yield {"model": fake.model, "response": "", "done": True,
+                   "context": context + list(range(prompt_tokens + len(tokens))),
+                   "prompt_eval_count": prompt_tokens, "eval_count": len(tokens)}
+
+        if payload.get("stream", True):
+            return _ndjson(chunks())
+        response, final = "", {}
+        async for chunk in chunks():
+            response += chunk["response"]
+            final = chunk
+        return JSONResponse({**final, "response": response})
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser, prefix: str = ""):
+    """Timing options, shared with the load test CLI (which prefixes them with --ollama-)."""
+    parser.add_argument(f"--{prefix}model", default="llama3", help="model name reported by /api/tags")
+    parser.add_argument(f"--{prefix}tokens-per-second", type=float, default=30.0, help="answer token rate")
+    parser.add_argument(f"--{prefix}first-token-ms", type=float, default=300.0, help="latency before the first token")
+    parser.add_argument(f"--{prefix}prompt-tokens-per-second", type=float, default=1000.0,
+                        help="prompt processing rate (adds to the first-token latency)")
+    parser.add_argument(f"--{prefix}answer-tokens", type=int, default=120, help="tokens per answer")
+    parser.add_argument(f"--{prefix}parallel", type=int, default=1, help="generations run at once (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument(f"--{prefix}jitter", type=float, default=0.2, help="relative random variation of every delay")
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Ollama server for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    add_arguments(parser)
+    args = parser.parse_args()
+    fake = FakeOllama(args.model, args.tokens_per_second, args.first_token_ms, args.answer_tokens,
+                      args.prompt_tokens_per_second, args.parallel, args.jitter)
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
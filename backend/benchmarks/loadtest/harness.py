@@ -0,0 +1,477 @@
+"""
+Load test engine: starts the servers, creates users, replays the workload.
+
+Servers starts a fake Ollama (fake_ollama.py) and the API (uvicorn, in a
+temporary working directory, so users.json, the vector store, uploads and
+every other data file are fresh). LoadTest drives an open-loop workload
+against it with httpx: arrivals follow a Poisson process at the target rate,
+whether or not earlier requests have finished, like real users. That way a
+slow server shows up as growing latency instead of a lower request rate.
+"""
+import asyncio
+import io
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+API = "/api/v1"
+OPERATIONS = ("chat", "session_chat", "status", "list", "upload")
+DEFAULT_MIX = "chat=55,session_chat=15,status=15,list=10,upload=5"
+
+QUESTIONS = [
+    "How many members are needed to register a cooperative?",
+    "What documents are required to register a cooperative?",
+    "Who can become a member of a cooperative?",
+    "What are the duties of the board of directors?",
+    "How often must a cooperative hold its general meeting?",
+    "When can the Registrar dissolve a cooperative?",
+    "What is the penalty for operating without registration?",
+    "How is the audit of a cooperative carried out?",
+    "Can a cooperative accept deposits from non-members?",
+    "What does the Electronic Transaction Act say about digital signatures?",
+    "What are the punishments for unauthorized access to a computer system?",
+    "How long must electronic records be retained?",
+    "What is insider risk in a cooperative?",
+    "How should a cooperative protect member data?",
+    "hello",
+    "thanks, that helps",
+]
+FOLLOW_UPS = ["What about the penalty?", "Can you explain that in simpler terms?", "Which section says that?"]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """"chat=55,status=15" -> normalised weights; unknown operations are an error."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r} (expected one of {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("The mix needs at least one operation with a positive weight")
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def latency_summary(values: List[float]) -> Dict:
+    return {f"p{q}": round(percentile(values, q), 1) if values else None for q in (50, 90, 95, 99)} | {
+        "max": round(max(values), 1) if values else None
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _tail(path: Path, lines: int = 20) -> str:
+    try:
+        return "\n".join(path.read_text(errors="replace").splitlines()[-lines:])
+    except OSError:
+        return ""
+
+
+class Servers:
+    """Fake Ollama + the API in a throwaway working directory (a context manager)."""
+
+    def __init__(self, ollama_args: Dict, env: Dict[str, str], startup_timeout: float, keep: bool):
+        self.ollama_args = ollama_args
+        self.extra_env = env
+        self.startup_timeout = startup_timeout
+        self.keep = keep
+        self.workdir = Path(tempfile.mkdtemp(prefix="sahakari-loadtest-"))
+        self.ollama_url = f"http://127.0.0.1:{_free_port()}"
+        self.url = f"http://127.0.0.1:{_free_port()}"
+        self._processes: List[subprocess.Popen] = []
+
+    def _start(self, command: List[str], cwd: Path, env: Dict[str, str], log: str) -> subprocess.Popen:
+        with open(self.workdir / log, "wb") as out:
+            process = subprocess.Popen(command, cwd=cwd, env=env, stdout=out, stderr=subprocess.STDOUT)
+        self._processes.append(process)
+        return process
+
+    def __enter__(self) -> "Servers":
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(BACKEND_DIR), os.environ.get("PYTHONPATH")]))}
+        ollama_command = [sys.executable, "-m", "benchmarks.loadtest.fake_ollama", "--port", self.ollama_url.rsplit(":", 1)[1]]
+        for name, value in self.ollama_args.items():
+            ollama_command += [f"--{name.replace('_', '-')}", str(value)]
+        self._start(ollama_command, BACKEND_DIR, env, "fake_ollama.log")
+
+        data = self.workdir
+        app_env = {
+            **env,
+            "OLLAMA_BASE_URL": self.ollama_url,
+            "OLLAMA_MODEL": self.ollama_args["model"],
+            "CHROMA_DIR": str(data / "chroma_db"),
+            "VECTOR_STORE_DIR": str(data / "vector_store"),
+            "ACTIVE_INDEX_FILE": str(data / "active_index.json"),
+            "UPLOAD_DIR": str(data / "uploads"),
+            "EXISTING_DOCS_DIR": str(data / "documents"),
+            "SNAPSHOT_DIR": "",
+            "EXTRACTION_CACHE_DIR": str(data / "extraction_cache"),
+            "TABLE_DB_PATH": str(data / "tables.db"),
+            "DEDUP_DB_PATH": str(data / "dedup.db"),
+            "CORPUS_VERSION_FILE": str(data / "corpus_version.json"),
+            "PROFILE_DIR": str(data / "profiles"),
+            "LOAD_DOCUMENTS_ON_STARTUP": "false",
+            "VECTOR_SERVICE_URL": "",
+            **self.extra_env,
+        }
+        app = self._start(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", self.url.rsplit(":", 1)[1], "--log-level", "warning"],
+            self.workdir, app_env, "app.log",
+        )
+        try:
+            self._wait_ready(app)
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _wait_ready(self, app: subprocess.Popen):
+        """Until GET /ready answers 200 (the models are warm), or fail with the app's log."""
+        import httpx
+
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if app.poll() is not None:
+                raise RuntimeError(f"The API exited with code {app.returncode}:\n{_tail(self.workdir / 'app.log')}")
+            try:
+                if httpx.get(f"{self.url}/ready", timeout=2).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"The API was not ready after {self.startup_timeout:.0f}s:\n{_tail(self.workdir / 'app.log')}")
+
+    def __exit__(self, *exc):
+        for process in reversed(self._processes):
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        self._processes.clear()
+        if not self.keep:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class _Bucket:
+    """One --interval slice of the timeline."""
+
+    def __init__(self):
+        self.sent = 0
+        self.completed = 0
+        self.errors = 0
+        self.latencies: List[float] = []
+        self.in_flight = 0
+        self.server_lag_ms: Optional[float] = None
+        self.client_lag_ms = 0.0
+        self.llm_queued: Optional[int] = None
+
+
+class LoadTest:
+    """Registers users, seeds documents and replays the request mix at the target rate."""
+
+    def __init__(self, url: str, users: int, rate: float, duration: float, mix: Dict[str, float],
+                 ramp_up: float = 0.0, interval: float = 5.0, max_in_flight: int = 1000,
+                 timeout: float = 120.0, setup_concurrency: int = 8, seed_docs: Optional[List[Path]] = None,
+                 ollama_url: Optional[str] = None, latency_budget_ms: Optional[int] = None):
+        self.url = url
+        self.users = users
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix
+        self.ramp_up = ramp_up
+        self.interval = interval
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.setup_concurrency = setup_concurrency
+        self.seed_docs = seed_docs or []
+        self.ollama_url = ollama_url
+        self.latency_budget_ms = latency_budget_ms
+        self.run_id = uuid.uuid4().hex[:6]
+        self.tokens: List[str] = []
+        self.sessions: Dict[int, str] = {}
+        self.etags: Dict[tuple, str] = {}
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Counter] = defaultdict(Counter)
+        self.answer_modes: Counter = Counter()  # ChatResponse.mode: full, truncated, extractive
+        self.setup: Dict[str, List[float]] = defaultdict(list)
+        self.setup_errors: Counter = Counter()
+        self.timeline: Dict[int, _Bucket] = defaultdict(_Bucket)
+        self.skipped = 0
+        self._in_flight: set = set()
+        self._started = 0.0  # perf_counter at the start of the load phase
+        self._loop_started = 0.0  # The same on the event loop's clock
+        self._load_seconds = 0.0  # Arrivals stop after this; in-flight requests drain afterwards
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+    async def _request(self, client, label: str, method: str, path: str, record: bool = True, **kwargs):
+        """Send one request and record its latency and outcome; returns the response or None."""
+        started = time.perf_counter()
+        response, outcome = None, None
+        try:
+            response = await client.request(method, f"{API}{path}", **kwargs)
+            outcome = response.status_code
+        except Exception as e:
+            outcome = type(e).__name__
+        ms = (time.perf_counter() - started) * 1000
+        ok = isinstance(outcome, int) and outcome < 400
+        if not record:
+            self.setup[label].append(ms)
+            if not ok:
+                self.setup_errors[f"{label} {outcome}"] += 1
+            return response
+        self.latencies[label].append(ms)
+        self.outcomes[label][outcome] += 1
+        bucket = self.timeline[int((time.perf_counter() - self._started) // self.interval)]
+        bucket.completed += 1
+        bucket.errors += not ok
+        bucket.latencies.append(ms)
+        return response
+
+    def _auth(self, user: int) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[user]}"}
+
+    async def _ask(self, client, label: str, user: int, body: Dict):
+        if self.latency_budget_ms:
+            body["latency_budget_ms"] = self.latency_budget_ms
+        response = await self._request(client, label, "POST", "/chat/query", headers=self._auth(user), json=body)
+        if response is not None and response.status_code == 200:
+            self.answer_modes[response.json().get("mode", "full")] += 1
+
+    async def _chat(self, client, user: int):
+        await self._ask(client, "POST /chat/query", user, {"query": random.choice(QUESTIONS), "top_k": 5})
+
+    async def _session_chat(self, client, user: int):
+        if user not in self.sessions:
+            response = await self._request(client, "POST /chat/sessions", "POST", "/chat/sessions", headers=self._auth(user))
+            if response is None or response.status_code >= 400:
+                return
+            self.sessions[user] = response.json()["session_id"]
+            question = random.choice(QUESTIONS)
+        else:
+            question = random.choice(FOLLOW_UPS + QUESTIONS)
+        await self._ask(client, "POST /chat/query (session)", user, {"query": question, "session_id": self.sessions[user]})
+
+    async def _poll(self, client, user: int, path: str):
+        """GET with the user's last ETag, like the frontend's polling (304s count as successes)."""
+        headers = self._auth(user)
+        if (user, path) in self.etags:
+            headers["If-None-Match"] = self.etags[(user, path)]
+        response = await self._request(client, f"GET {path}", "GET", path, headers=headers)
+        if response is not None and response.headers.get("etag"):
+            self.etags[(user, path)] = response.headers["etag"]
+
+    async def _status(self, client, user: int):
+        await self._poll(client, user, "/documents/status")
+
+    async def _list(self, client, user: int):
+        await self._poll(client, user, "/documents/list")
+
+    async def _upload(self, client, user: int):
+        name = f"loadtest-{self.run_id}-{uuid.uuid4().hex[:8]}.xlsx"
+        files = {"file": (name, _workbook(), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+        await self._request(client, "POST /documents/upload", "POST", "/documents/upload",
+                            headers=self._auth(user), files=files)
+
+    # ------------------------------------------------------------------
+    # Phases
+    # ------------------------------------------------------------------
+    async def _setup_users(self, client):
+        """Register and log in the synthetic users (bcrypt makes this the slowest setup step)."""
+        limit = asyncio.Semaphore(self.setup_concurrency)
+        tokens: List[Optional[str]] = [None] * self.users
+
+        async def one(i: int):
+            account = {"email": f"user{i}-{self.run_id}@loadtest.example.org", "password": "load-test-password"}
+            async with limit:
+                await self._request(client, "POST /auth/register", "POST", "/auth/register", record=False,
+                                    json={**account, "username": f"loadtest-{self.run_id}-{i}"})
+                response = await self._request(client, "POST /auth/login", "POST", "/auth/login", record=False,
+                                               json=account)
+            if response is not None and response.status_code == 200:
+                tokens[i] = response.json()["access_token"]
+
+        await asyncio.gather(*(one(i) for i in range(self.users)))
+        self.tokens = [t for t in tokens if t]
+        if not self.tokens:
+            raise RuntimeError(f"No user could log in: {dict(self.setup_errors)}")
+
+    async def _seed(self, client):
+        for path in self.seed_docs:
+            files = {"file": (f"seed-{self.run_id}-{path.name}", path.read_bytes())}
+            await self._request(client, "POST /documents/upload (seed)", "POST", "/documents/upload", record=False,
+                                headers=self._auth(0), files=files)
+
+    async def _drive(self, client):
+        operations = list(self.mix)
+        weights = [self.mix[o] for o in operations]
+        handlers = {name: getattr(self, f"_{name}") for name in operations}
+        loop = asyncio.get_running_loop()
+        next_arrival = loop.time()
+        end = loop.time() + self.duration
+        while True:
+            elapsed = loop.time() - self._loop_started
+            rate = self.rate * min(1.0, elapsed / self.ramp_up) if self.ramp_up else self.rate
+            next_arrival += random.expovariate(max(rate, 0.1))
+            if next_arrival >= end:
+                break
+            delay = next_arrival - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            bucket = self.timeline[int((time.perf_counter() - self._started) // self.interval)]
+            if len(self._in_flight) >= self.max_in_flight:
+                self.skipped += 1
+                continue
+            bucket.sent += 1
+            operation = random.choices(operations, weights)[0]
+            task = asyncio.create_task(handlers[operation](client, random.randrange(len(self.tokens))))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+            bucket.in_flight = max(bucket.in_flight, len(self._in_flight))
+
+    async def _watch(self, client):
+        """Sample the server's event-loop lag, the fake Ollama queue and our own loop lag every second."""
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        async with httpx.AsyncClient(timeout=5) as side:
+            while True:
+                expected = loop.time() + 1.0
+                await asyncio.sleep(1.0)
+                bucket = self.timeline[int((time.perf_counter() - self._started) // self.interval)]
+                bucket.client_lag_ms = max(bucket.client_lag_ms, (loop.time() - expected) * 1000)
+                try:
+                    gauges = (await side.get(f"{self.url}/metrics")).json()["gauges"]
+                    lag = gauges.get("event_loop_lag_ms")
+                    if lag is not None:
+                        bucket.server_lag_ms = max(bucket.server_lag_ms or 0.0, lag)
+                except (httpx.HTTPError, ValueError, KeyError):
+                    pass
+                if self.ollama_url:
+                    try:
+                        queued = (await side.get(f"{self.ollama_url}/stats")).json()["queued"]
+                        bucket.llm_queued = max(bucket.llm_queued or 0, queued)
+                    except (httpx.HTTPError, ValueError, KeyError):
+                        pass
+
+    async def run(self) -> Dict:
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.max_in_flight + self.setup_concurrency,
+                              max_keepalive_connections=self.max_in_flight)
+        async with httpx.AsyncClient(base_url=self.url, timeout=self.timeout, limits=limits) as client:
+            await self._setup_users(client)
+            await self._seed(client)
+            self._started = time.perf_counter()
+            self._loop_started = asyncio.get_running_loop().time()
+            watcher = asyncio.create_task(self._watch(client))
+            try:
+                await self._drive(client)
+                self._load_seconds = time.perf_counter() - self._started
+                if self._in_flight:
+                    await asyncio.wait(set(self._in_flight), timeout=self.timeout)
+            finally:
+                watcher.cancel()
+                for task in list(self._in_flight):
+                    task.cancel()
+            wall = time.perf_counter() - self._started
+        return self.report(wall)
+
+    # ------------------------------------------------------------------
+    # Report
+    # ------------------------------------------------------------------
+    def report(self, wall: float) -> Dict:
+        endpoints = {}
+        for label in sorted(self.latencies):
+            outcomes = self.outcomes[label]
+            errors = sum(n for outcome, n in outcomes.items() if not (isinstance(outcome, int) and outcome < 400))
+            total = sum(outcomes.values())
+            endpoints[label] = {
+                "requests": total,
+                "errors": errors,
+                "error_rate": round(errors / total, 4) if total else 0.0,
+                "throughput_rps": round(total / wall, 2) if wall else None,
+                "latency_ms": latency_summary(self.latencies[label]),
+                "outcomes": {str(k): v for k, v in outcomes.most_common()},
+            }
+        all_latencies = [ms for values in self.latencies.values() for ms in values]
+        completed = len(all_latencies)
+        errors = sum(e["errors"] for e in endpoints.values())
+        timeline = []
+        for index in range(max(self.timeline, default=-1) + 1):
+            bucket = self.timeline[index]
+            timeline.append({
+                "t": round(index * self.interval, 1),
+                "sent": bucket.sent,
+                "completed": bucket.completed,
+                "errors": bucket.errors,
+                "p95_ms": round(percentile(bucket.latencies, 95), 1) if bucket.latencies else None,
+                "in_flight": bucket.in_flight,
+                "server_loop_lag_ms": bucket.server_lag_ms,
+                "client_loop_lag_ms": round(bucket.client_lag_ms, 1),
+                "llm_queued": bucket.llm_queued,
+            })
+        return {
+            "users": len(self.tokens),
+            "target_rps": self.rate,
+            "duration_s": round(self._load_seconds, 1),
+            "drain_s": round(wall - self._load_seconds, 1),
+            "mix": {k: round(v, 3) for k, v in self.mix.items()},
+            "completed": completed,
+            "throughput_rps": round(completed / wall, 2) if wall else None,
+            "errors": errors,
+            "error_rate": round(errors / completed, 4) if completed else 0.0,
+            "skipped_client_saturated": self.skipped,
+            "latency_ms": latency_summary(all_latencies),
+            "setup": {label: {"requests": len(v), **latency_summary(v)} for label, v in self.setup.items()},
+            "setup_errors": dict(self.setup_errors),
+            "endpoints": endpoints,
+            "answer_modes": dict(self.answer_modes),
+            "timeline": timeline,
+        }
+
+
+def _workbook() -> bytes:
+    """A small loan sheet with random values, so every upload is new content to embed."""
+    from openpyxl import Workbook
+
+    book = Workbook()
+    sheet = book.active
+    sheet.title = "Loans"
+    sheet.append(["Branch", "Loan Type", "Amount", "Interest Rate", "Disbursed On"])
+    for _ in range(random.randint(20, 60)):
+        sheet.append([
+            random.choice(["Kathmandu", "Pokhara", "Biratnagar", "Butwal"]),
+            random.choice(["Housing", "Agriculture", "Business", "Education"]),
+            random.randrange(10_000, 2_000_000, 500),
+            round(random.uniform(8, 16), 2),
+            f"2023-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+        ])
+    out = io.BytesIO()
+    book.save(out)
+    return out.getvalue()
@@ -0,0 +1,135 @@
+"""
+Vector store benchmark: Chroma (HNSW in SQLite) vs the NumPy flat index.
+
+Loads the same vectors into each backend and reports, per backend, bulk add
+time, collection.count() and collection.query() latency (p50/p95) and
+recall@k against exact search. Each backend runs in its own temporary
+directory; the configured stores are not touched.
+
+Run from the backend folder:
+    python -m benchmarks.vector_store_benchmark
+    python -m benchmarks.vector_store_benchmark --rows 50000 --queries 500 --top-k 5
+    python -m benchmarks.vector_store_benchmark --snapshot ../data/snapshot
+
+Without --snapshot, random unit vectors of --dim dimensions are used. Backends
+whose dependencies are not installed are skipped (the report says which).
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import uuid
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.database import VectorStore
+
+
+def load_vectors(args) -> Tuple[np.ndarray, np.ndarray]:
+    """(corpus, queries); queries are perturbed corpus rows so neighbours are meaningful."""
+    rng = np.random.default_rng(42)
+    if args.snapshot:
+        from app.services.snapshot import EMBEDDINGS_FILE, read_manifest
+
+        read_manifest(args.snapshot)
+        corpus = np.load(f"{args.snapshot}/{EMBEDDINGS_FILE}").astype(np.float32)
+    else:
+        corpus = rng.standard_normal((args.rows, args.dim), dtype=np.float32)
+        corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    picks = rng.integers(0, len(corpus), args.queries)
+    queries = corpus[picks] + 0.05 * rng.standard_normal((args.queries, corpus.shape[1]), dtype=np.float32)
+    return corpus, queries
+
+
+def numpy_store(path: str) -> VectorStore:
+    from app.core.numpy_store import NumpyVectorStore
+    return NumpyVectorStore(path)
+
+
+def chroma_store(path: str) -> VectorStore:
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+    from app.core.database import ChromaVectorStore
+
+    client = chromadb.PersistentClient(path=path, settings=ChromaSettings(anonymized_telemetry=False))
+    return ChromaVectorStore("benchmark", client=client)
+
+
+BACKENDS: Dict[str, Callable[[str], VectorStore]] = {"numpy": numpy_store, "chroma": chroma_store}
+
+
+def percentile(values: List[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[int(q) - 1] if len(values) > 1 else values[0]
+
+
+def run(name: str, corpus: np.ndarray, queries: np.ndarray, exact: np.ndarray, top_k: int) -> Dict:
+    with tempfile.TemporaryDirectory(prefix=f"vs-{name}-") as path:
+        store = BACKENDS[name](path)
+        ids = [str(uuid.uuid4()) for _ in range(len(corpus))]
+        row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+
+        start = time.perf_counter()
+        for i in range(0, len(corpus), 1000):
+            batch = slice(i, i + 1000)
+            store.add(
+                ids=ids[batch],
+                documents=[f"chunk {j}" for j in range(i, min(i + 1000, len(corpus)))],
+                metadatas=[{"source": "benchmark.pdf", "chunk_index": str(j)} for j in range(i, min(i + 1000, len(corpus)))],
+                embeddings=corpus[batch].tolist(),
+            )
+        add_seconds = time.perf_counter() - start
+
+        count_ms = []
+        for _ in range(50):
+            start = time.perf_counter()
+            store.count()
+            count_ms.append((time.perf_counter() - start) * 1000)
+
+        query_ms, hits = [], 0
+        for query, expected in zip(queries, exact):
+            start = time.perf_counter()
+            result = store.query(query_embeddings=[query.tolist()], n_results=top_k)
+            query_ms.append((time.perf_counter() - start) * 1000)
+            hits += len({row_of[i] for i in result["ids"][0]} & set(expected.tolist()))
+
+        return {
+            "add_s": add_seconds,
+            "count_p50": percentile(count_ms, 50),
+            "query_p50": percentile(query_ms, 50),
+            "query_p95": percentile(query_ms, 95),
+            "recall": hits / (len(queries) * top_k),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--snapshot", help="use the embeddings of a snapshot built by scripts.build_snapshot")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    args = parser.parse_args()
+
+    corpus, queries = load_vectors(args)
+    # Ground truth: exact squared-L2 neighbours.
+    distances = (corpus ** 2).sum(1)[None, :] - 2 * queries @ corpus.T
+    exact = np.argsort(distances, axis=1)[:, :args.top_k]
+
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, top-{args.top_k} "
+          f"(configured backend: {settings.VECTOR_BACKEND})")
+    print(f"{'backend':<8} {'add s':>8} {'count ms':>9} {'query p50':>10} {'query p95':>10} {'recall':>7}")
+    for name in args.backends:
+        try:
+            r = run(name, corpus, queries, exact, args.top_k)
+        except ImportError as e:
+            print(f"{name:<8} skipped ({e})")
+            continue
+        print(f"{name:<8} {r['add_s']:>8.2f} {r['count_p50']:>9.3f} {r['query_p50']:>10.3f} "
+              f"{r['query_p95']:>10.3f} {r['recall']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
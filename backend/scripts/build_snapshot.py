@@ -0,0 +1,53 @@
+"""
+Build a prebuilt index snapshot of the bundled documents.
+
+Ingests every document in --docs into the local ChromaDB collection (files
+already ingested are skipped), then exports the collection with its
+embeddings to --out (see app/services/snapshot.py). Ship the output with the
+deployment and point SNAPSHOT_DIR at it; new nodes then load the index in
+seconds instead of re-embedding the corpus.
+
+Run from the backend folder:
+    python -m scripts.build_snapshot
+    python -m scripts.build_snapshot --docs ../data/documents --out ../data/snapshot
+"""
+import argparse
+import logging
+import sys
+import time
+
+from app.core.config import settings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build a vector-index snapshot of the bundled documents.")
+    parser.add_argument("--docs", default=settings.EXISTING_DOCS_DIR, help="Folder with the PDF/Excel files")
+    parser.add_argument("--out", default=settings.SNAPSHOT_DIR or "./data/snapshot", help="Snapshot output folder")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    settings.EXISTING_DOCS_DIR = args.docs
+    settings.SNAPSHOT_DIR = None  # Build from the documents, never from an older snapshot
+    settings.VECTOR_SERVICE_URL = None
+
+    from app.services.snapshot import SnapshotError, export_snapshot
+    from app.services.startup import load_existing_documents
+
+    started = time.perf_counter()
+    load_existing_documents()
+    try:
+        manifest = export_snapshot(args.out, docs_dir=args.docs)
+    except SnapshotError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(
+        f"Snapshot written to {args.out}: {manifest['count']} chunks, "
+        f"{manifest['dimension']}-d {manifest['embedding_model']} embeddings, "
+        f"{len(manifest['sources'])} source(s) in {time.perf_counter() - started:.1f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
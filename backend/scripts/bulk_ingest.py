@@ -0,0 +1,60 @@
+"""
+Bulk-ingest folders of documents with a pool of embedding processes
+(see app/services/bulk_ingest.py).
+
+    python -m scripts.bulk_ingest                              # EXISTING_DOCS_DIR
+    python -m scripts.bulk_ingest ../data/regulations --workers 16
+    python -m scripts.bulk_ingest --workers 8 --batch-size 128 --threads-per-worker 2
+
+Files whose name is already an ingested source are skipped. Stop the API
+server first (or use POST /api/v1/documents/reload?workers=N instead): the
+script writes to the same vector store.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+from app.core.config import settings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ingest new PDF/Excel files with parallel embedding processes.")
+    parser.add_argument("folders", nargs="*", default=[settings.EXISTING_DOCS_DIR])
+    parser.add_argument("--workers", type=int, default=settings.BULK_INGEST_WORKERS or os.cpu_count() or 1,
+                        help="embedding processes, each with its own model replica (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_INGEST_BATCH_SIZE,
+                        help="chunks per embedding batch")
+    parser.add_argument("--threads-per-worker", type=int, default=settings.BULK_INGEST_THREADS_PER_WORKER,
+                        help="torch threads per process (default: cores / workers)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    from app.services.bulk_ingest import BulkIngester
+    from app.services.startup import find_new_documents, get_ingested_files
+
+    folders = [Path(folder) for folder in args.folders]
+    missing = [str(folder) for folder in folders if not folder.is_dir()]
+    if missing:
+        print(f"Not a folder: {', '.join(missing)}", file=sys.stderr)
+        return 1
+
+    files = find_new_documents(folders, get_ingested_files())
+    if not files:
+        print("Nothing to ingest: every document is already in the index")
+        return 0
+
+    try:
+        summary = BulkIngester(args.workers, args.batch_size, args.threads_per_worker).ingest(files)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Cold-start budget check for the API process.
+
+Imports `app.main` in fresh interpreters and fails (exit code 1) when
+
+  * the import takes longer than --max-seconds (best of --runs),
+  * peak RSS after the import exceeds --max-rss-mb, or
+  * any heavy dependency (langchain, chromadb, torch, ...) was imported.
+
+Heavy dependencies must only be loaded on first use through the service
+factories (get_rag_service(), get_embedding_service(), ...).
+
+Run from the backend folder, e.g. in CI:
+    python -m scripts.check_import_budget
+    python -m scripts.check_import_budget --max-seconds 1.5 --max-rss-mb 120
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = [
+    "chromadb",
+    "langchain",
+    "langchain_community",
+    "pandas",
+    "pdfplumber",
+    "sentence_transformers",
+    "torch",
+]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss_mb, "heavy": heavy}}))
+"""
+
+
+def measure() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-seconds", type=float, default=2.0)
+    parser.add_argument("--max-rss-mb", type=float, default=150.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    seconds = min(r["seconds"] for r in runs)
+    rss_mb = min(r["rss_mb"] for r in runs)
+    heavy = sorted({m for r in runs for m in r["heavy"]})
+
+    print(f"import app.main: {seconds:.3f}s (budget {args.max_seconds}s), "
+          f"peak RSS {rss_mb:.0f}MB (budget {args.max_rss_mb:.0f}MB)")
+
+    failures = []
+    if seconds > args.max_seconds:
+        failures.append(f"cold start {seconds:.3f}s exceeds {args.max_seconds}s")
+    if rss_mb > args.max_rss_mb:
+        failures.append(f"baseline RSS {rss_mb:.0f}MB exceeds {args.max_rss_mb:.0f}MB")
+    if heavy:
+        failures.append(f"heavy modules imported eagerly: {', '.join(heavy)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
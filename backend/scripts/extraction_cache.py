@@ -0,0 +1,75 @@
+"""
+Manage the extraction cache (see app/services/extraction_cache.py).
+
+    python -m scripts.extraction_cache stats
+    python -m scripts.extraction_cache warm                 # EXISTING_DOCS_DIR and UPLOAD_DIR
+    python -m scripts.extraction_cache warm ../data/documents
+    python -m scripts.extraction_cache prune --max-mb 100
+    python -m scripts.extraction_cache clear
+
+`warm` extracts every PDF/Excel file whose content is not cached yet, so a later
+re-index (new chunking or embedding model) skips pdfplumber/pandas entirely.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from app.core.config import settings
+from app.services.extraction_cache import get_extraction_cache
+
+
+def warm(folders) -> int:
+    from app.services.documents import file_sha256, get_document_service
+
+    cache = get_extraction_cache()
+    extracted = cached = failed = 0
+    for folder in folders:
+        for path in sorted(Path(folder).glob("*")):
+            if not path.is_file() or path.suffix.lower() not in settings.ALLOWED_EXTENSIONS:
+                continue
+            if cache.get(file_sha256(path)) is not None:
+                cached += 1
+                continue
+            started = time.perf_counter()
+            try:
+                pages = get_document_service().process_document(str(path))
+            except Exception as e:
+                print(f"✗ {path.name}: {e}", file=sys.stderr)
+                failed += 1
+                continue
+            extracted += 1
+            print(f"✓ {path.name}: {len(pages)} page(s) in {time.perf_counter() - started:.1f}s")
+    print(f"{extracted} extracted, {cached} already cached, {failed} failed")
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Manage the document extraction cache.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm_parser = commands.add_parser("warm", help="extract and cache documents that are not cached yet")
+    warm_parser.add_argument("folders", nargs="*", default=[settings.EXISTING_DOCS_DIR, settings.UPLOAD_DIR])
+    prune_parser = commands.add_parser("prune", help="drop stale and least recently used entries")
+    prune_parser.add_argument("--max-mb", type=float, default=settings.EXTRACTION_CACHE_MAX_MB)
+    commands.add_parser("stats", help="show cache size and entry counts")
+    commands.add_parser("clear", help="remove every entry")
+    args = parser.parse_args()
+
+    if get_extraction_cache() is None:
+        print("Extraction cache is disabled (EXTRACTION_CACHE_DIR is not set)", file=sys.stderr)
+        return 1
+
+    if args.command == "warm":
+        return warm(args.folders)
+    if args.command == "prune":
+        removed = get_extraction_cache().prune(int(args.max_mb * 1024 * 1024))
+        print(f"Removed {removed} entr{'y' if removed == 1 else 'ies'}")
+    elif args.command == "clear":
+        print(f"Removed {get_extraction_cache().clear()} entries")
+    print(json.dumps(get_extraction_cache().stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())